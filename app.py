@@ -1,16 +1,57 @@
-from flask import Flask, render_template, jsonify, request, Response
-from mahabhumi_scraper import MahabhumiScraper
+from flask import Flask, render_template, jsonify, request, Response, stream_with_context
+from requests.adapters import HTTPAdapter
+from mahabhumi_scraper import MahabhumiScraper, VillageCrawl
+from tile_cache import TileCache
+from crawl_jobs import CrawlJobManager, JobStore
+from singleflight import SingleFlight
+import geometry
+import dxf_export
+import map_export
+import mvt
+import reproject
+import topology
+import os
 import json
 import requests
-import ezdxf
 import io
 import zipfile
+import shutil
+import tempfile
 import math
 from PIL import Image
+from collections import OrderedDict
+import threading
+import time
 
 app = Flask(__name__)
 # Global scraper instance
 _scraper = None
+_async_scraper = None
+_wms_session = None
+_tile_cache = None
+_projected_cache = None
+_vector_tile_cache = None
+_tile_sources = OrderedDict()
+_tile_sources_lock = threading.Lock()
+# Concurrent tile requests after a change wait for one rebuild of the source
+_tile_source_builds = SingleFlight()
+_job_manager = None
+
+WMS_URL = "https://mahabhunakasha.mahabhumi.gov.in/WMS"
+# Leaflet requests many tiles at once; keep that many connections to the WMS open
+WMS_POOL_MAXSIZE = 32
+WMS_CHUNK_SIZE = 64 * 1024
+# The cadastral raster rarely changes; keep up to 1 GB of tiles for 30 days
+TILE_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+TILE_CACHE_TTL = 30 * 86400
+EXPORT_DIR = "cache/exports"
+# Transformed plot geometries kept in memory (a few villages' worth per SRS)
+PROJECTED_CACHE_ENTRIES = 50000
+# Generated vector tiles on disk, and how many prefixes' plots stay in memory to cut them from
+VECTOR_TILE_CACHE_FILE = "cache/vector_tiles.db"
+VECTOR_TILE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+TILE_SOURCES_MAX = 8
+JOBS_FILE = "cache/jobs.db"
 
 def get_scraper():
     """Initializes and returns a singleton instance of the MahabhumiScraper."""
@@ -22,6 +63,120 @@ def get_scraper():
         print("Scraper Initialized.", flush=True)
     return _scraper
 
+def get_async_scraper():
+    """Returns the asyncio fetch engine, sharing the singleton scraper's cache."""
+    global _async_scraper
+    if _async_scraper is None:
+        # Imported lazily so aiohttp is only needed when the async engine is used
+        from async_scraper import AsyncMahabhumiScraper
+        _async_scraper = AsyncMahabhumiScraper(get_scraper())
+    return _async_scraper
+
+def get_wms_session():
+    """Returns the shared, connection-pooled session used for WMS requests."""
+    global _wms_session
+    if _wms_session is None:
+        session = requests.Session()
+        session.headers.update({
+            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+            "Referer": "https://mahabhunakasha.mahabhumi.gov.in/27/index.html"
+        })
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=WMS_POOL_MAXSIZE)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _wms_session = session
+    return _wms_session
+
+def get_tile_cache():
+    """Returns the shared on-disk WMS tile cache."""
+    global _tile_cache
+    if _tile_cache is None:
+        _tile_cache = TileCache(max_bytes=TILE_CACHE_MAX_BYTES, ttl=TILE_CACHE_TTL)
+    return _tile_cache
+
+def get_projected_cache():
+    """Returns the shared cache of plot geometries transformed to other SRS."""
+    global _projected_cache
+    if _projected_cache is None:
+        _projected_cache = reproject.ProjectedCache(PROJECTED_CACHE_ENTRIES)
+    return _projected_cache
+
+def get_vector_tile_cache():
+    """Returns the on-disk cache of generated plot vector tiles."""
+    global _vector_tile_cache
+    if _vector_tile_cache is None:
+        _vector_tile_cache = TileCache(VECTOR_TILE_CACHE_FILE, max_bytes=VECTOR_TILE_CACHE_MAX_BYTES,
+                                       key=mvt.cache_key)
+    return _vector_tile_cache
+
+def get_job_manager():
+    """
+    Returns the background crawl job manager. Every server process runs
+    one; a job runs in the process holding its lease, and jobs whose lease
+    expired (their process stopped) are resumed by whichever polls first.
+    """
+    global _job_manager
+    if _job_manager is None:
+        _job_manager = CrawlJobManager(get_scraper(), JobStore(JOBS_FILE))
+    return _job_manager
+
+def get_plot_tile_source(prefix, src, version):
+    """
+    Returns the mvt.PlotTileSource of the cached plots under a GIS code
+    prefix, rebuilt when the store's version for that prefix has changed.
+    Concurrent requests for the same version share one rebuild. The most
+    recently used TILE_SOURCES_MAX sources are kept.
+    """
+    key = (prefix, src)
+    with _tile_sources_lock:
+        entry = _tile_sources.get(key)
+        if entry is not None and entry[0] == version:
+            _tile_sources.move_to_end(key)
+            return entry[1]
+    return _tile_source_builds.do((prefix, src, version), _build_plot_tile_source, prefix, src, version)
+
+def _build_plot_tile_source(prefix, src, version):
+    key = (prefix, src)
+    source = mvt.PlotTileSource(get_scraper().iter_cached_plots(prefix), src)
+    print(f"Vector tile source {prefix} ({src}): {len(source)} plots", flush=True)
+    with _tile_sources_lock:
+        _tile_sources[key] = (version, source)
+        _tile_sources.move_to_end(key)
+        while len(_tile_sources) > TILE_SOURCES_MAX:
+            _tile_sources.popitem(last=False)
+    return source
+
+def stream_upstream(resp, extra_headers=None, on_complete=None):
+    """
+    Relays an upstream (stream=True) response to the client chunk by chunk.
+    The body is passed through still encoded, so Content-Encoding and
+    Content-Length stay valid; the connection returns to the pool once the
+    client has the last chunk. If given, on_complete(body) is called after
+    the whole body was relayed.
+    """
+    passthrough = ['content-type', 'content-length', 'content-encoding', 'cache-control',
+                   'expires', 'last-modified', 'etag']
+    headers = [(name, value) for (name, value) in resp.raw.headers.items()
+               if name.lower() in passthrough]
+    headers.extend((extra_headers or {}).items())
+
+    def generate():
+        chunks = [] if on_complete else None
+        try:
+            for chunk in resp.raw.stream(WMS_CHUNK_SIZE, decode_content=False):
+                if chunks is not None:
+                    chunks.append(chunk)
+                yield chunk
+        finally:
+            resp.close()
+        if chunks is not None:
+            try:
+                on_complete(b"".join(chunks))
+            except Exception as e:
+                print(f"Error after streaming upstream response: {e}", flush=True)
+
+    return Response(stream_with_context(generate()), resp.status_code, headers)
+
 @app.route('/')
 def index():
     """Renders the main dashboard page."""
@@ -69,15 +224,9 @@ def get_plot_list(district_code, taluka_code, village_code):
 def proxy_wms():
     """Proxies WMS requests to avoid CORS"""
     print("API: WMS Proxy", flush=True)
-    wms_url = "https://mahabhunakasha.mahabhumi.gov.in/WMS"
     params = request.args.to_dict()
     
     try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            "Referer": "https://mahabhunakasha.mahabhumi.gov.in/27/index.html"
-        }
-        
         # Ensure we request PNG and Transparency
         if 'FORMAT' not in params:
              params['FORMAT'] = 'image/png'
@@ -86,14 +235,26 @@ def proxy_wms():
         params['TRANSPARENT'] = 'TRUE'
         params['transparent'] = 'true' # sending both to be safe
              
-        resp = requests.get(wms_url, params=params, headers=headers, stream=True)
-        # We don't raise for status immediately to pass through error images if any
-        
-        excluded_headers = ['content-encoding', 'content-length', 'transfer-encoding', 'connection']
-        headers = [(name, value) for (name, value) in resp.raw.headers.items()
-                   if name.lower() not in excluded_headers]
+        tiles = get_tile_cache()
+        # Only map images are cached; legends and feature info always go upstream
+        cacheable = {k.upper(): v for k, v in params.items()}.get('REQUEST', 'GetMap').lower() == 'getmap'
+        cached = tiles.get(params) if cacheable else None
+        if cached is not None:
+            data, content_type, content_encoding = cached
+            headers = {'X-Tile-Cache': 'HIT'}
+            if content_encoding:
+                headers['Content-Encoding'] = content_encoding
+            return Response(data, 200, headers, content_type=content_type or 'image/png')
 
-        return Response(resp.content, resp.status_code, headers)
+        resp = get_wms_session().get(WMS_URL, params=params, stream=True, timeout=30)
+        # We don't raise for status immediately to pass through error images if any
+        content_type = resp.headers.get('Content-Type', '')
+        on_complete = None
+        # Only real images are cached; the WMS reports errors as XML with status 200
+        if cacheable and resp.status_code == 200 and content_type.startswith('image/'):
+            content_encoding = resp.headers.get('Content-Encoding')
+            on_complete = lambda body: tiles.put(params, body, content_type, content_encoding)
+        return stream_upstream(resp, {'X-Tile-Cache': 'MISS'}, on_complete)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -129,19 +290,140 @@ def proxy_report():
 
 @app.route('/api/village_boundaries/<giscode>')
 def get_village_boundaries(giscode):
-    """Fetches all plot boundaries for a village"""
+    """
+    Fetches all plot boundaries for a village. Pass ?engine=async to use the asyncio engine
+    and ?force=1 to retry plots held in the negative cache.
+    """
     print(f"API: Village Boundaries for {giscode}", flush=True)
     try:
-        boundaries = get_scraper().fetch_village_boundaries(giscode, max_plots=9999)
+        engine = get_async_scraper() if request.args.get('engine') == 'async' else get_scraper()
+        force = request.args.get('force') == '1'
+        boundaries = engine.fetch_village_boundaries(giscode, max_plots=9999, force=force)
         return jsonify(boundaries)
     except Exception as e:
         print(f"Error fetching village boundaries: {e}", flush=True)
         return jsonify({"error": str(e)}), 500
 
+def geojson_options():
+    """Reads the ?from=, ?srs=, ?details= and ?source= options of the GeoJSON endpoints (ValueError if bad)."""
+    return {
+        'src': reproject.normalize_srs(request.args.get('from', 'EPSG:32643')),
+        'dst': reproject.normalize_srs(request.args.get('srs', reproject.WGS84)),
+        'details': request.args.get('details') == '1',
+        'source': request.args.get('source') == '1',
+    }
+
+def requested_plot_nos():
+    """?plots=1,2,3 as a list, or None for the whole village."""
+    plot_nos = request.args.get('plots')
+    if plot_nos is None:
+        return None
+    return [p.strip() for p in plot_nos.split(',') if p.strip()]
+
+def plot_features(giscode, plots, src, dst, details=False, source=False):
+    """GeoJSON Features of [(plot_no, plot_record)], transformed from src to dst in one batch."""
+    geoms = get_projected_cache().geometries([plot_data for _, plot_data in plots], src, dst)
+    # About 1 cm either way
+    decimals = 7 if dst == reproject.WGS84 else 2
+    features = []
+    for (plot_no, plot_data), geom in zip(plots, geoms):
+        properties = {'plot_no': plot_no, 'giscode': giscode}
+        if details and 'parsed_records' in plot_data:
+            properties['parsed_records'] = plot_data['parsed_records']
+        if source:
+            properties['source_geometry'] = reproject.to_geojson(geometry.plot_geometry(plot_data))
+        features.append({'type': 'Feature', 'properties': properties,
+                         'geometry': reproject.to_geojson(geom, decimals)})
+    return features
+
+@app.route('/api/village/<giscode>/geojson')
+def village_geojson(giscode):
+    """
+    Returns a village's plots, or only ?plots=1,2,3, as a GeoJSON
+    FeatureCollection transformed server-side from ?from= (the SRS of the
+    stored coordinates, default EPSG:32643) to ?srs= (default EPSG:4326).
+    ?limit= caps the number of plots, ?details=1 adds the parsed 7/12
+    records and ?source=1 the untransformed geometry to each feature.
+    """
+    print(f"API: Village GeoJSON {giscode}", flush=True)
+    try:
+        try:
+            options = geojson_options()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        limit = int(request.args.get('limit', 9999))
+
+        plots = get_scraper().fetch_village_plots(giscode, max_plots=limit, plot_nos=requested_plot_nos(),
+                                                  force=request.args.get('force') == '1')
+        return jsonify({
+            'type': 'FeatureCollection',
+            'crs': {'type': 'name', 'properties': {'name': options['dst']}},
+            'features': plot_features(giscode, plots, **options),
+        })
+    except Exception as e:
+        print(f"Village GeoJSON Error: {e}", flush=True)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/village/<giscode>/stream')
+def village_stream(giscode):
+    """
+    Streams the features of /api/village/<giscode>/geojson (same options)
+    over one connection as they become available: cached plots at once,
+    the others as their upstream fetch completes. ?format=ndjson (default)
+    writes one JSON object per line, ?format=sse Server-Sent Events. Each
+    message is a GeoJSON Feature; the last one is {"type": "done", ...}
+    with the crawl summary.
+    """
+    print(f"API: Village Stream {giscode}", flush=True)
+    try:
+        options = geojson_options()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in ('ndjson', 'sse'):
+        return jsonify({"error": "format must be ndjson or sse"}), 400
+    limit = int(request.args.get('limit', 9999))
+    force = request.args.get('force') == '1'
+    plot_nos = requested_plot_nos()
+
+    def message(obj):
+        text = json.dumps(obj, separators=(',', ':'))
+        if fmt == 'sse':
+            return f"event: {obj['type'].lower()}\ndata: {text}\n\n"
+        return text + "\n"
+
+    def generate():
+        scraper = get_scraper()
+        try:
+            to_fetch = scraper.village_plot_list(giscode, limit, plot_nos)
+            sent = 0
+            crawl = VillageCrawl(scraper.iter_village_plots(giscode, to_fetch, force=force))
+            for batch in crawl:
+                yield "".join(message(f) for f in plot_features(giscode, batch, **options))
+                sent += len(batch)
+            done = {'type': 'done', 'plots': sent, 'requested': len(to_fetch)}
+            if crawl.summary:
+                done['summary'] = crawl.summary
+            yield message(done)
+        except Exception as e:
+            print(f"Village Stream Error: {e}", flush=True)
+            yield message({'type': 'error', 'error': str(e)})
+
+    mimetype = 'text/event-stream' if fmt == 'sse' else 'application/x-ndjson'
+    # Keep proxies from buffering the progressive response
+    return Response(stream_with_context(generate()), mimetype=mimetype,
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/download_village_map/<giscode>')
 def download_village_map(giscode):
-    """Downloads the complete village map from government WMS as an image"""
+    """
+    Downloads the complete village map from government WMS as an image.
+    ?mode=tiled builds a high-resolution georeferenced mosaic instead (see
+    download_tiled_village_map).
+    """
     print(f"API: Download Village Map for {giscode}", flush=True)
+    if request.args.get('mode') == 'tiled':
+        return download_tiled_village_map(giscode)
     
     try:
         # First, get a sample of plot boundaries to calculate the bounding box
@@ -152,20 +434,11 @@ def download_village_map(giscode):
             return jsonify({"error": "No plot data found for this village"}), 404
         
         # Calculate bounding box from the sample plots
-        import re
-        min_x, min_y, max_x, max_y = float('inf'), float('inf'), float('-inf'), float('-inf')
-        
-        for plot in boundaries:
-            # Extract coordinates from WKT geometry
-            geom = plot['geometry']
-            # Parse coordinates from MULTIPOLYGON or POLYGON
-            coords = re.findall(r'([\d.]+)\s+([\d.]+)', geom)
-            for x_str, y_str in coords:
-                x, y = float(x_str), float(y_str)
-                min_x = min(min_x, x)
-                min_y = min(min_y, y)
-                max_x = max(max_x, x)
-                max_y = max(max_y, y)
+        extent = geometry.union_bounds(
+            geometry.parse_wkt_cached(plot['geometry']) for plot in boundaries)
+        if extent is None:
+            return jsonify({"error": "No plot geometry found for this village"}), 404
+        min_x, min_y, max_x, max_y = extent
         
         # Add 10% padding to the bounding box
         padding_x = (max_x - min_x) * 0.1
@@ -174,8 +447,6 @@ def download_village_map(giscode):
         
         print(f"Calculated BBOX: {bbox}", flush=True)
         
-        wms_url = "https://mahabhunakasha.mahabhumi.gov.in/WMS"
-        
         # WMS GetMap request parameters for village map
         params = {
             'SERVICE': 'WMS',
@@ -193,23 +464,15 @@ def download_village_map(giscode):
             'state': '27'
         }
         
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36",
-            "Referer": "https://mahabhunakasha.mahabhumi.gov.in/27/index.html"
-        }
-        
-        # Get the map image
-        resp = requests.get(wms_url, params=params, headers=headers, timeout=30)
-        resp.raise_for_status()
+        # Get the map image and stream it through as a download
+        resp = get_wms_session().get(WMS_URL, params=params, stream=True, timeout=30)
+        if not resp.ok:
+            resp.close()
+            resp.raise_for_status()
         
-        # Return as downloadable file
-        return Response(
-            resp.content,
-            mimetype='image/png',
-            headers={
-                'Content-Disposition': f'attachment; filename="village_map_{giscode}.png"'
-            }
-        )
+        return stream_upstream(resp, {
+            'Content-Disposition': f'attachment; filename="village_map_{giscode}.png"'
+        })
         
     except Exception as e:
         print(f"Error downloading village map: {e}", flush=True)
@@ -217,6 +480,97 @@ def download_village_map(giscode):
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
+def download_tiled_village_map(giscode):
+    """
+    Builds the village map from a grid of WMS tiles at ?resolution= metres
+    per pixel (default 0.5) over the true village extent, and returns a ZIP
+    with the PNG and its .pgw world file. The extent comes from the cached
+    plots; a village with nothing cached is crawled first.
+    """
+    try:
+        resolution = float(request.args.get('resolution', 0.5))
+        if resolution <= 0:
+            return jsonify({"error": "resolution must be positive"}), 400
+        workers = int(request.args.get('workers', 8))
+
+        scraper = get_scraper()
+        extent = map_export.cached_extent(scraper.store, giscode)
+        if extent is None:
+            scraper.fetch_village_boundaries(giscode)
+            extent = map_export.cached_extent(scraper.store, giscode)
+        if extent is None:
+            return jsonify({"error": "No plot geometry found for this village"}), 404
+
+        # Every request builds its mosaic in a directory of its own, removed
+        # once the response is sent, so identical requests don't share files
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        work_dir = tempfile.mkdtemp(prefix="village_map_", dir=EXPORT_DIR)
+        try:
+            name = f"village_map_{giscode}_{resolution:g}m"
+            try:
+                summary = map_export.export_village_map(
+                    get_wms_session(), giscode, extent, os.path.join(work_dir, name + ".png"),
+                    resolution=resolution, max_workers=max(1, min(workers, 32)), tile_cache=get_tile_cache(),
+                    wms_url=WMS_URL)
+            except ValueError as e:
+                shutil.rmtree(work_dir, ignore_errors=True)
+                return jsonify({"error": str(e)}), 400
+
+            # The PNG is already deflated, so it is stored rather than compressed again
+            members = [
+                (name + ".png", file_chunks(summary['path']), zipfile.ZIP_STORED),
+                (name + ".pgw", file_chunks(summary['world_file']), zipfile.ZIP_DEFLATED),
+            ]
+            response = Response(dxf_export.stream_zip(members), mimetype='application/zip', headers={
+                'Content-Disposition': f'attachment; filename="{name}.zip"',
+                'X-Failed-Tiles': str(summary['failed_tiles']),
+            })
+        except BaseException:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise
+        response.call_on_close(lambda: shutil.rmtree(work_dir, ignore_errors=True))
+        return response
+
+    except Exception as e:
+        print(f"Error exporting tiled village map: {e}", flush=True)
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+def file_chunks(path, size=1024 * 1024):
+    """Yields the bytes of a file in chunks of up to size bytes."""
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(size)
+            if not chunk:
+                return
+            yield chunk
+
+def fetch_dxf_backdrop(bbox, img_w, img_h, layers, epsg='EPSG:32643'):
+    """Fetches the WMS image shipped with a DXF export; returns PNG bytes or None."""
+    wms_params = {
+        "SERVICE": "WMS",
+        "VERSION": "1.1.1",
+        "REQUEST": "GetMap",
+        "FORMAT": "image/png",
+        "TRANSPARENT": "TRUE",
+        "LAYERS": layers,
+        "SRS": epsg,
+        "STYLES": "",
+        "WIDTH": str(img_w),
+        "HEIGHT": str(img_h),
+        "BBOX": f"{bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]}"
+    }
+    try:
+        print(f"Fetching WMS Image for DXF: {wms_params}", flush=True)
+        resp = get_wms_session().get(WMS_URL, params=wms_params, timeout=60)
+        if resp.status_code == 200:
+            return resp.content
+        print(f"WMS Fetch Failed: {resp.status_code}", flush=True)
+    except Exception as e:
+        print(f"WMS Error: {e}", flush=True)
+    return None
+
 @app.route('/api/download_dxf', methods=['POST'])
 def download_dxf():
     """Generates and returns an AutoCAD DXF file from plot geometries."""
@@ -226,28 +580,8 @@ def download_dxf():
         if not data or 'plots' not in data:
             return jsonify({"error": "No plot data provided"}), 400
         
-        # Create a new DXF document
-        doc = ezdxf.new('R2010')
-        msp = doc.modelspace()
-        
-        # Set PDMODE to make points visible (34 = Circle with X, 3 = X, 2 = +)
-        # 34 is good for visibility
-        doc.header['$PDMODE'] = 34
-        # Set PDSIZE (0 = 5% of screen, >0 = absolute size, <0 = % of viewport)
-        # We'll leave it 0 or set a small absolute size if needed, but 0 is usually fine for "screen relative"
-        # or we can try setting it to a small fixed value if we knew the scale.
-        # Let's stick to PDMODE for now.
-        
-        # Set Point Style to Circle with Cross (35)
-        doc.header['$PDMODE'] = 35
-        doc.header['$PDSIZE'] = 1.0 # 1 meter size
-        
-        # Setup layers
-        doc.layers.new(name='PLOT_BOUNDARIES', dxfattribs={'color': 1}) # Red
-        doc.layers.new(name='COORDINATE_LABELS', dxfattribs={'color': 2}) # Yellow
-        doc.layers.new(name='PLOT_NUMBERS', dxfattribs={'color': 3}) # Green
-        doc.layers.new(name='METADATA', dxfattribs={'color': 4}) # Cyan
-        
+        # Create a new DXF document with the export header settings and layers
+        doc = dxf_export.new_document()
         msp = doc.modelspace()
         
         all_x = []
@@ -352,115 +686,18 @@ def download_dxf():
                 add_labels(coords, label, plot.get('owner_info', []))
 
         # --- WMS Image Embedding Logic ---
-        # 1. Calculate Bounding Box
+        # The frontend sends the selected village code and the projection of
+        # the coordinates, so the WMS image can be placed under the plots
+        wms_image_data = None
         if all_x and all_y:
-            min_x, max_x = min(all_x), max(all_x)
-            min_y, max_y = min(all_y), max(all_y)
-            
-            # Add some padding (5%)
-            width = max_x - min_x
-            height = max_y - min_y
-            pad_x = width * 0.05
-            pad_y = height * 0.05
-            
-            bbox = [min_x - pad_x, min_y - pad_y, max_x + pad_x, max_y + pad_y]
-            
-            # 2. Fetch WMS Image
-            # We need the village code. We can get it from the first plot's GIS code if available,
-            # or pass it from frontend. The frontend passes 'plots' list.
-            # Let's try to extract it from the first plot's owner info or just use the one from the request if we had it.
-            # But the /download_dxf endpoint only gets the list of coords.
-            # However, we can infer the village code from the layer name if we had it, but we don't.
-            # Actually, the user selects a village, so all plots are from one village.
-            # We can try to guess the village code or just ask the user to pass it.
-            # For now, let's try to find a GIS code in the plot data.
-            village_code = None
-            for p in data['plots']:
-                # Check if we have giscode in the plot object (we might not if it's just coords)
-                # The frontend sends: label, coordinates, owner_info.
-                # It does NOT send giscode directly in the simplified object.
-                # But wait, the frontend `plottedCoordinates` push does NOT include giscode.
-                # We might need to update frontend to send village code.
-                # OR we can just use the WMS bounds to fetch the image without layer filter?
-                # No, Mahabhumi WMS usually requires a layer.
-                # Actually, we can use the "VillageMap" layer or similar if generic.
-                # But better to use the specific village code if possible.
-                pass
-
-            # Update: We will try to fetch the image using the bounding box.
-            # The WMS URL: https://mahabhunakasha.mahabhumi.gov.in/WMS
-            # Layers: We need the village code. 
-            # Let's assume for now we can't get the village code easily without frontend change.
-            # BUT, we can try to fetch without a specific layer or use a wildcard? Unlikely.
-            # Let's look at the frontend code again. `plottedCoordinates` has `label`.
-            # We really need the village code.
-            # Let's Modify the frontend to send `village_code` in the request body.
-            
-            # Assuming we will update frontend to send 'village_code'
+            extent = (min(all_x), min(all_y), max(all_x), max(all_y))
             village_code = request.json.get('village_code')
-            
-            wms_image_data = None
             if village_code:
-                try:
-                    # Calculate image size (max 2048px)
-                    img_w = 2048
-                    img_h = int(img_w * (height / width))
-                    if img_h > 2048:
-                        img_h = 2048
-                        img_w = int(img_h * (width / height))
-                        
-                    wms_params = {
-                        "SERVICE": "WMS",
-                        "VERSION": "1.1.1",
-                        "REQUEST": "GetMap",
-                        "FORMAT": "image/png",
-                        "TRANSPARENT": "TRUE",
-                        "LAYERS": village_code,
-                        "SRS": "EPSG:32643", # Assuming Zone 43N, need to be careful if it's 44N
-                        # We need to know the projection. The frontend sends coords in a specific projection.
-                        # `currentProj` in frontend decides this.
-                        # We should probably ask frontend for the EPSG code too.
-                        "STYLES": "",
-                        "WIDTH": str(img_w),
-                        "HEIGHT": str(img_h),
-                        "BBOX": f"{bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]}"
-                    }
-                    
-                    # Check projection from request or default
-                    epsg = request.json.get('epsg', 'EPSG:32643')
-                    wms_params['SRS'] = epsg
-                    
-                    print(f"Fetching WMS Image for DXF: {wms_params}", flush=True)
-                    resp = requests.get("https://mahabhunakasha.mahabhumi.gov.in/WMS", params=wms_params, stream=True)
-                    if resp.status_code == 200:
-                        wms_image_data = resp.content
-                    else:
-                        print(f"WMS Fetch Failed: {resp.status_code}", flush=True)
-                except Exception as e:
-                    print(f"WMS Error: {e}", flush=True)
-
-            if wms_image_data:
-                # Embed in DXF
-                # 1. Add Image Definition
-                image_def = msp.add_image_def(filename='village_map.png', size_in_pixel=(img_w, img_h))
-                
-                # 2. Add Image Entity
-                # Position: Bottom-Left corner of BBOX
-                # Size: Width and Height in map units
-                msp.add_image(
-                    insert=(bbox[0], bbox[1]),
-                    size_in_units=(bbox[2]-bbox[0], bbox[3]-bbox[1]),
-                    image_def=image_def,
-                    rotation=0,
-                    dxfattribs={'layer': 'MAP_IMAGE'}
-                )
-                
-                # Move image to bottom (draw order) - ezdxf doesn't strictly support draw order manipulation easily in all viewers
-                # but adding it first or last might help. We added it last here.
-                # Actually, usually background should be added first? 
-                # DXF draw order is usually order of entities.
-                # Let's try to move it to the beginning of the modelspace if possible, or just rely on CAD layer management.
-                # For now, we append it.
+                bbox, img_w, img_h = dxf_export.backdrop_bbox(extent)
+                wms_image_data = fetch_dxf_backdrop(bbox, img_w, img_h, village_code,
+                                                    request.json.get('epsg', 'EPSG:32643'))
+                if wms_image_data:
+                    dxf_export.add_backdrop(msp, bbox, img_w, img_h)
 
         # Save DXF
         out_stream = io.StringIO()
@@ -493,6 +730,115 @@ def download_dxf():
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
+def dxf_zip_response(name, plots, extent, backdrop=None, wms_image_data=None, headers=None, topo=None):
+    """
+    Streams a DXF export as a ZIP: the DXF text is generated plot by plot
+    (dxf_export.stream_document) and compressed into the response as it is
+    produced. plots is a zero-argument callable returning a fresh iterable
+    of (label, Geometry). With a topology.Topology as topo the shared arcs
+    are written instead, plus a topology.json to rebuild plot outlines.
+    """
+    if topo is not None:
+        members = [
+            (f"{name}.dxf", dxf_export.stream_topology_document(topo, extent, backdrop), zipfile.ZIP_DEFLATED),
+            ("topology.json", [json.dumps(topology.to_json(topo))], zipfile.ZIP_DEFLATED),
+        ]
+    else:
+        members = [(f"{name}.dxf", dxf_export.stream_document(plots(), extent, backdrop), zipfile.ZIP_DEFLATED)]
+    if wms_image_data:
+        members.append(("village_map.png", [wms_image_data], zipfile.ZIP_STORED))
+    response_headers = {'Content-Disposition': f'attachment; filename="mahabhumi_{name}.zip"'}
+    response_headers.update(headers or {})
+    return Response(stream_with_context(dxf_export.stream_zip(members)),
+                    mimetype='application/zip', headers=response_headers)
+
+@app.route('/api/village/<giscode>/dxf')
+def village_dxf(giscode):
+    """
+    Builds the DXF export of a village's cached plots server-side from the
+    plot store: its first ?limit= plots, or only ?plots=1,2,3. Plots that
+    are not cached are left out unless ?fetch=1, which requests them
+    upstream first. Same layers and ZIP layout as /api/download_dxf,
+    streamed as it is generated; ?image=0 leaves out the WMS backdrop and
+    ?epsg= sets the projection of the backdrop request. ?topology=1 writes
+    every boundary shared by neighbouring plots once (vertices within
+    ?tolerance= map units are merged, see topology.py).
+    """
+    print(f"API: Village DXF {giscode}", flush=True)
+    try:
+        scraper = get_scraper()
+        limit = int(request.args.get('limit', 9999))
+        if request.args.get('fetch') == '1':
+            plots = scraper.fetch_village_plots(giscode, max_plots=limit, plot_nos=requested_plot_nos(),
+                                                force=request.args.get('force') == '1')
+        else:
+            plot_nos = scraper.village_plot_list(giscode, limit, requested_plot_nos())
+            cached = scraper.plot_cache.get_many(f"{giscode}_{p}" for p in plot_nos)
+            plots = [(p, cached[f"{giscode}_{p}"]) for p in plot_nos if f"{giscode}_{p}" in cached]
+        if not plots:
+            return jsonify({"error": "No cached plots for this village (?fetch=1 requests them upstream)"}), 404
+
+        def plot_geometries():
+            return ((plot_no, geometry.plot_geometry(plot_data)) for plot_no, plot_data in plots)
+
+        extent = dxf_export.plots_extent(geom for _, geom in plot_geometries())
+        backdrop = None
+        wms_image_data = None
+        if extent is not None and request.args.get('image', '1') != '0':
+            bbox, img_w, img_h = dxf_export.backdrop_bbox(extent)
+            village_code = scraper.split_giscode(giscode)[2]
+            wms_image_data = fetch_dxf_backdrop(bbox, img_w, img_h, village_code,
+                                                request.args.get('epsg', 'EPSG:32643'))
+            if wms_image_data:
+                backdrop = (bbox, img_w, img_h)
+
+        headers = {'X-Plot-Count': str(len(plots))}
+        topo = None
+        if request.args.get('topology') == '1':
+            tolerance = float(request.args.get('tolerance', topology.DEFAULT_TOLERANCE))
+            if tolerance <= 0:
+                return jsonify({"error": "tolerance must be positive"}), 400
+            topo = topology.build_topology(plot_geometries(), tolerance)
+            summary = topology.stats(topo, list(plot_geometries()))
+            print(f"Topology {giscode}: {summary}", flush=True)
+            headers['X-Unique-Edges'] = str(summary['unique_edges'])
+            headers['X-Unique-Vertices'] = str(summary['unique_vertices'])
+
+        return dxf_zip_response(giscode, plot_geometries, extent, backdrop, wms_image_data, headers, topo)
+
+    except Exception as e:
+        print(f"Village DXF Error: {e}", flush=True)
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/taluka/<district_code>/<taluka_code>/dxf')
+def taluka_dxf(district_code, taluka_code):
+    """
+    Streams one DXF of every cached plot in a taluka (no upstream fetches).
+    Built in bounded memory, so large talukas can be exported in one go.
+    """
+    category = request.args.get('category', 'R')
+    prefix = f"{'RVM' if category == 'R' else 'UVM'}{district_code}{taluka_code}"
+    print(f"API: Taluka DXF {prefix}", flush=True)
+    try:
+        scraper = get_scraper()
+
+        def plot_geometries():
+            return ((record['plotno'], geometry.plot_geometry(record))
+                    for record in scraper.iter_cached_plots(prefix))
+
+        extent = dxf_export.plots_extent(geom for _, geom in plot_geometries())
+        if extent is None:
+            return jsonify({"error": "No cached plots for this taluka"}), 404
+        return dxf_zip_response(prefix, plot_geometries, extent)
+
+    except Exception as e:
+        print(f"Taluka DXF Error: {e}", flush=True)
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/plot')
 def get_plot():
     """API endpoint to fetch detailed information and geometry for a specific plot."""
@@ -515,13 +861,199 @@ def get_plot():
     # Construct GIS Code
     full_gis_code = f"{prefix}{dist}{tal}{vil_code}"
     
-    data = get_scraper().get_plot_coordinates(full_gis_code, plot_no)
+    force = request.args.get('force') == '1'
+    data = get_scraper().get_plot_coordinates(full_gis_code, plot_no, force=force)
     
     if data:
         return jsonify(data)
     else:
         return jsonify({"error": "Plot not found or API error"}), 404
 
+@app.route('/api/upstream/stats')
+def get_upstream_stats():
+    """Reports the adaptive upstream limiter's current concurrency limit and observed latency."""
+    return jsonify(get_scraper().limiter.stats())
+
+@app.route('/api/tiles/stats')
+def get_tile_stats():
+    """Reports the WMS tile cache's size and hit/miss counters."""
+    return jsonify(get_tile_cache().stats())
+
+@app.route('/tiles/<int:z>/<int:x>/<int:y>.mvt')
+def vector_tile(z, x, y):
+    """
+    Serves cached plots as a Mapbox Vector Tile: one 'plots' layer with
+    plot_no and giscode attributes, simplified for the zoom level.
+    ?giscode= is a village GIS code or a prefix of one (at least a taluka,
+    e.g. RVM0527); ?from= is the SRS of the stored coordinates.
+    Tiles are cached on disk until plots under the prefix change.
+    """
+    prefix = request.args.get('giscode', '')
+    if len(prefix) < 7:
+        return jsonify({"error": "giscode must be a village GIS code or a taluka prefix such as RVM0527"}), 400
+    try:
+        src = reproject.normalize_srs(request.args.get('from', 'EPSG:32643'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not (mvt.MIN_ZOOM <= z <= mvt.MAX_ZOOM and 0 <= x < (1 << z) and 0 <= y < (1 << z)):
+        return Response(b"", mimetype=mvt.MIMETYPE)
+
+    try:
+        version = get_scraper().store.version(prefix)
+        params = {'giscode': prefix, 'srs': src, 'tile': f"{z}/{x}/{y}", 'version': f"{version[0]}-{version[1]}"}
+        cache = get_vector_tile_cache()
+        cached = cache.get(params)
+        if cached is not None:
+            data, status = cached[0], 'HIT'
+        else:
+            data, status = get_plot_tile_source(prefix, src, version).render(z, x, y), 'MISS'
+            cache.put(params, data, mvt.MIMETYPE)
+        return Response(data, mimetype=mvt.MIMETYPE, headers={'X-Tile-Cache': status})
+    except Exception as e:
+        print(f"Vector Tile Error: {e}", flush=True)
+        return jsonify({"error": str(e)}), 500
+
+def plot_summary(record):
+    return {'giscode': record['giscode'], 'plot_no': str(record['plotno'])}
+
+@app.route('/api/plots/at')
+def get_plots_at():
+    """
+    Returns the cached plots containing the point ?x=&y=, given in ?srs=
+    (default EPSG:4326, i.e. x=longitude, y=latitude). ?from= is the SRS of
+    the stored coordinates (default EPSG:32643). ?geometry=1 adds each
+    plot's GeoJSON geometry in ?srs=.
+    """
+    try:
+        srs = reproject.normalize_srs(request.args.get('srs', reproject.WGS84))
+        src = reproject.normalize_srs(request.args.get('from', 'EPSG:32643'))
+        point = [float(request.args['x']), float(request.args['y'])]
+    except (KeyError, ValueError) as e:
+        return jsonify({"error": f"x, y and a supported srs are required ({e})"}), 400
+
+    try:
+        x, y = reproject.transform([point], srs, src)[0]
+        records = get_scraper().plots_at(float(x), float(y))
+        plots = [plot_summary(r) for r in records]
+        if request.args.get('geometry') == '1':
+            geoms = get_projected_cache().geometries(records, src, srs)
+            for plot, geom in zip(plots, geoms):
+                plot['geometry'] = reproject.to_geojson(geom)
+        return jsonify({'x': point[0], 'y': point[1], 'srs': srs, 'plots': plots})
+    except Exception as e:
+        print(f"Plots At Error: {e}", flush=True)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/plots/in_bbox')
+def get_plots_in_bbox():
+    """
+    Lists the cached plots whose bounding box intersects
+    ?bbox=min_x,min_y,max_x,max_y (in ?srs=, default EPSG:4326), e.g. the
+    map viewport. At most ?limit= plots (default 5000) are returned.
+    """
+    try:
+        srs = reproject.normalize_srs(request.args.get('srs', reproject.WGS84))
+        src = reproject.normalize_srs(request.args.get('from', 'EPSG:32643'))
+        min_x, min_y, max_x, max_y = [float(v) for v in request.args['bbox'].split(',')]
+        limit = int(request.args.get('limit', 5000))
+    except (KeyError, ValueError) as e:
+        return jsonify({"error": f"bbox=min_x,min_y,max_x,max_y and a supported srs are required ({e})"}), 400
+
+    try:
+        # The box's corners and edge midpoints in the store's SRS, enclosed in a new box
+        xs = [min_x, (min_x + max_x) / 2, max_x]
+        ys = [min_y, (min_y + max_y) / 2, max_y]
+        outline = reproject.transform([(x, y) for x in xs for y in ys], srs, src)
+        bbox = (*outline.min(axis=0).tolist(), *outline.max(axis=0).tolist())
+        records = get_scraper().plots_in_bbox(bbox)
+        return jsonify({
+            'count': len(records),
+            'truncated': len(records) > limit,
+            'plots': [plot_summary(r) for r in records[:limit]],
+        })
+    except Exception as e:
+        print(f"Plots In BBox Error: {e}", flush=True)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/plots/index/stats')
+def get_spatial_index_stats():
+    """Reports the spatial index's size and rebuild count."""
+    return jsonify(get_scraper().spatial_index().stats())
+
+@app.route('/api/jobs', methods=['GET', 'POST'])
+def crawl_jobs():
+    """
+    GET lists all crawl jobs with their progress. POST queues a job:
+    {"targets": ["RVM25", "RVM2502", "RVM2502272500020303690000"], "force": false}
+    where targets are district, taluka or village GIS codes.
+    """
+    manager = get_job_manager()
+    if request.method == 'GET':
+        return jsonify(manager.jobs())
+    req_data = request.get_json(silent=True) or {}
+    try:
+        job = manager.submit(req_data.get('targets') or [], bool(req_data.get('force')))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(job), 201
+
+@app.route('/api/jobs/<int:job_id>')
+def crawl_job(job_id):
+    """Status, rate, ETA and errors of one crawl job, with its villages."""
+    job = get_job_manager().job(job_id, villages=True)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<int:job_id>/<action>', methods=['POST'])
+def control_crawl_job(job_id, action):
+    """Pauses, resumes or cancels a crawl job."""
+    if action not in ('pause', 'resume', 'cancel'):
+        return jsonify({"error": "action must be pause, resume or cancel"}), 400
+    job = getattr(get_job_manager(), action)(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+@app.route('/api/search')
+def search_plots():
+    """
+    Finds cached plots by survey number or owner record text (Marathi or
+    Latin): ?q= matches every word exactly, by prefix or with one typo.
+    ?giscode= limits the search to villages starting with that prefix and
+    ?limit= (default 50) caps the results.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "q is required"}), 400
+    try:
+        limit = min(int(request.args.get('limit', 50)), 500)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+
+    try:
+        start = time.time()
+        results = []
+        for record, hit in get_scraper().search(query, request.args.get('giscode', ''), limit):
+            result = plot_summary(record)
+            result.update(score=hit['score'], fields=hit['fields'],
+                          parsed_records=record.get('parsed_records', []))
+            results.append(result)
+        return jsonify({'query': query, 'results': results, 'took_ms': round((time.time() - start) * 1000, 1)})
+    except Exception as e:
+        print(f"Search Error: {e}", flush=True)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/search/stats')
+def get_search_stats():
+    """Reports the search index's plot, token and posting counts."""
+    return jsonify(get_scraper().search_index.stats())
+
+@app.route('/api/geojson/stats')
+def get_geojson_stats():
+    """Reports the transformed geometry cache's size and hit/miss counters."""
+    return jsonify(get_projected_cache().stats())
+
 @app.route('/api/plots/batch', methods=['POST'])
 def get_plots_batch():
     """Batch API to check cache for multiple plots."""
@@ -533,25 +1065,8 @@ def get_plots_batch():
     if not village_code or not plot_nos:
         return jsonify({"error": "Missing parameters"}), 400
         
-    # Construct GIS codes and check cache
-    # We need to know the prefix (RVM/UVM) and district/taluka from somewhere.
-    # Actually, the cache key is just the GIS code.
-    # But we only have village_code (which is usually full 18 digit or similar?)
-    # Wait, the village code in the dropdown is just the village ID part?
-    # Let's check how `get_plot` constructs it.
-    # `get_plot` takes: cat, dist, tal, vil_code.
-    # Full GIS = Prefix + Dist + Tal + VilCode.
-    # The frontend `els.vil.value` seems to be the village code.
-    # But we need the full GIS code prefix to check the cache efficiently if we don't have it.
-    # However, the `scraper.get_plot_coordinates` uses `full_gis_code`.
-    # The cache `all_plots.json` is a list of plot objects.
-    # We can search the cache by `giscode` + `plotno`.
-    # Or simpler: The frontend sends the FULL GIS CODE if it has it?
-    # No, the frontend only has the village code selected in the dropdown.
-    # And the `get_plot` endpoint constructs the full code.
-    # We need the same logic here.
-    # We can accept `category`, `district`, `taluka` in the batch request too.
-    
+    # The cache is keyed by the full GIS code, which the frontend does not
+    # send directly. Rebuild it the same way `get_plot` does.
     cat = req_data.get('category', 'R')
     dist = req_data.get('district')
     tal = req_data.get('taluka')
@@ -562,37 +1077,8 @@ def get_plots_batch():
     prefix = "RVM" if cat == 'R' else "UVM"
     full_gis_code_base = f"{prefix}{dist}{tal}{village_code}"
     
-    found_plots = []
-    missing_plots = []
-    
-    scraper = get_scraper()
-    
-    # We can optimize this by loading the cache once (it's already loaded in scraper)
-    # Scraper has `all_plots` list.
-    # We need to filter by giscode and plotno.
-    # Indexing would be better, but iterating is okay for now if not too huge.
-    # Actually, `scraper.get_plot_coordinates` checks cache.
-    # But it also fetches if missing. We only want to CHECK cache.
-    
-    # Let's peek into scraper's cache directly or add a method to scraper.
-    # Since I can't easily modify the scraper class instance method without reloading,
-    # I will access `scraper.all_plots` directly if possible.
-    # `all_plots` is a list of dicts.
-    
-    # Create a lookup for the requested village to speed up
-    # This might be slow if `all_plots` is huge.
-    # But `all_plots` is in memory.
-    
-    # Filter cache for this village first
-    village_cache = [p for p in scraper.all_plots if p.get('giscode') == full_gis_code_base]
-    village_map = {p['plotno']: p for p in village_cache}
-    
-    for plot_no in plot_nos:
-        if plot_no in village_map:
-            found_plots.append(village_map[plot_no])
-        else:
-            missing_plots.append(plot_no)
-            
+    found_plots, missing_plots = get_scraper().lookup_cached(full_gis_code_base, plot_nos)
+
     return jsonify({
         "found": found_plots,
         "missing": missing_plots
@@ -0,0 +1,244 @@
+import asyncio
+import json
+import time
+
+import aiohttp
+
+import rate_control
+import ttl_cache
+from mahabhumi_scraper import MahabhumiScraper
+
+
+class AsyncMahabhumiScraper:
+    """
+    asyncio fetch engine for whole-village crawls.
+
+    All getPlotInfo POSTs share one aiohttp connection pool, so hundreds of
+    requests can be in flight on a single thread. Caching, response parsing
+    and persistence are delegated to the wrapped MahabhumiScraper, so both
+    engines read and write the same plot store and return the same dicts.
+    """
+
+    def __init__(self, scraper=None, max_in_flight=200):
+        self.scraper = scraper or MahabhumiScraper()
+        # Hard ceiling; the shared adaptive limiter decides the actual concurrency
+        self.max_in_flight = max_in_flight
+        self.limiter = self.scraper.limiter
+
+    def _new_session(self):
+        # One bounded pool for the whole crawl; requests beyond the limit
+        # wait for a free connection instead of opening new ones.
+        connector = aiohttp.TCPConnector(limit=self.max_in_flight, limit_per_host=self.max_in_flight)
+        session = aiohttp.ClientSession(
+            connector=connector,
+            headers=dict(self.scraper.session.headers),
+            # unsafe=True also keeps cookies set by IP-addressed hosts
+            cookie_jar=aiohttp.CookieJar(unsafe=True),
+        )
+        # Reuse cookies the sync session already earned to skip the 302 challenge
+        for cookie in self.scraper.session.cookies:
+            session.cookie_jar.update_cookies({cookie.name: cookie.value})
+        return session
+
+    async def _post(self, session, url, data, headers=None, timeout=15):
+        """
+        Async counterpart of MahabhumiScraper._post, including the 302 cookie dance.
+        Returns the decoded JSON body.
+        """
+        client_timeout = aiohttp.ClientTimeout(total=timeout)
+        # Waits in the shared limiter's priority queues alongside sync callers
+        priority = rate_control.current_priority()
+        await self.limiter.acquire_async(priority)
+        start = time.monotonic()
+        outcome = rate_control.SERVER_ERROR
+        try:
+            async with session.post(url, data=data, headers=headers, timeout=client_timeout,
+                                    allow_redirects=False) as response:
+                challenged = response.status == 302
+                if not challenged:
+                    outcome = rate_control.classify_status(response.status)
+                    response.raise_for_status()
+                    return json.loads(await response.text())
+
+            # The 302 response sets the session cookie; the retry then succeeds
+            print(f"Cookie challenge (302) on {url.split('/')[-1]} detected, retrying...", flush=True)
+            async with session.post(url, data=data, headers=headers, timeout=client_timeout) as response:
+                outcome = rate_control.classify_status(response.status, challenged)
+                response.raise_for_status()
+                return json.loads(await response.text())
+        except asyncio.TimeoutError as e:
+            outcome = rate_control.TIMEOUT
+            print(f"POST Error to {url}: {e!r}", flush=True)
+            raise
+        except Exception as e:
+            print(f"POST Error to {url}: {e!r}", flush=True)
+            raise
+        finally:
+            self.limiter.release(outcome, time.monotonic() - start, priority)
+
+    async def _coalesced(self, key, make_coro):
+        """
+        Joins the scraper's single-flight table, so a sync caller and this
+        engine asking for the same thing share one upstream request.
+        """
+        call, is_leader = self.scraper.inflight.begin(key)
+        if not is_leader:
+            return await asyncio.to_thread(call.wait)
+        try:
+            result = await make_coro()
+        except BaseException as e:
+            self.scraper.inflight.finish(key, call, error=e)
+            raise
+        self.scraper.inflight.finish(key, call, result=result)
+        return result
+
+    async def fetch_plot_list(self, session, district_code, taluka_code, village_code, category='R'):
+        """Fetches the list of available plot numbers for a village."""
+        prefix = "RVM" if category == 'R' else "UVM"
+        gis_code = f"{prefix}{district_code}{taluka_code}{village_code}"
+        key = f"plots:{gis_code}"
+
+        # Shares the sync scraper's persistent list cache
+        plots, state = await asyncio.to_thread(self.scraper.list_cache.lookup, key)
+        if state == ttl_cache.FRESH:
+            return list(plots)
+        if state == ttl_cache.STALE:
+            # Refreshed like the sync engine's stale lists, on the scraper's own
+            # session: this crawl's session may be closed before it finishes
+            self.scraper._revalidate_in_background(key, lambda: self.scraper._request_plot_list(gis_code))
+            return list(plots)
+
+        fresh = await self._coalesced(key, lambda: self._request_plot_list(session, gis_code))
+        if fresh:
+            await asyncio.to_thread(self.scraper.list_cache.set, key, fresh)
+            return list(fresh)
+        return list(plots or [])
+
+    async def _request_plot_list(self, session, gis_code):
+        url = f"{self.scraper.BASE_URL}/VillageMapService/kidelistFromGisCodeMH"
+        params = {
+            "state": "27",
+            "logedLevels": gis_code
+        }
+        headers = {"Referer": f"https://mahabhunakasha.mahabhumi.gov.in/27/index.html?giscode={gis_code}"}
+
+        print(f"Fetching Plot List for GIS Code: {gis_code}...", flush=True)
+        try:
+            plots = await self._post(session, url, params, headers=headers, timeout=15)
+            print(f"Success: Plot List Fetched ({len(plots)} plots)", flush=True)
+            return plots
+        except Exception as e:
+            print(f"Error fetching plot list: {e!r}", flush=True)
+            return []
+
+    async def get_plot_coordinates(self, session, giscode, plot_number, force=False):
+        """Fetches geometry for a plot, serving it from the shared cache when possible."""
+        # Store lookups are blocking SQLite reads; keep them off the event loop
+        cache_key = f"{giscode}_{plot_number}"
+        cached = await asyncio.to_thread(self.scraper.plot_cache.get, cache_key)
+        if cached is not None:
+            return cached
+        if not force and await asyncio.to_thread(self.scraper._known_missing, giscode, plot_number):
+            return None
+        return await self._fetch_plot(session, giscode, plot_number)
+
+    def _fetch_plot(self, session, giscode, plot_number):
+        return self._coalesced(f"plot:{giscode}_{plot_number}",
+                               lambda: self._request_plot(session, giscode, plot_number))
+
+    async def _request_plot(self, session, giscode, plot_number):
+        # Another caller may have stored it while this request was being set up
+        cached = await asyncio.to_thread(self.scraper.plot_cache.get, f"{giscode}_{plot_number}")
+        if cached is not None:
+            return cached
+
+        url = f"{self.scraper.BASE_URL}/MapInfo/getPlotInfo"
+        params = {
+            "giscode": giscode,
+            "plotno": plot_number,
+            "state": "27"
+        }
+
+        max_retries = 3
+        last_error = None
+        for attempt in range(max_retries):
+            try:
+                data = await self._post(session, url, params, timeout=30)
+                self.scraper._process_plot_response(data)
+                # Store writes are blocking SQLite calls; keep them off the event loop
+                if data and "the_geom" in data:
+                    await asyncio.to_thread(self.scraper._cache_plot, giscode, plot_number, data)
+                else:
+                    await asyncio.to_thread(self.scraper._record_missing, giscode, plot_number, 'not_found')
+                return data
+            except asyncio.TimeoutError as e:
+                print(f"Timeout fetching plot {plot_number} (Attempt {attempt+1}/{max_retries})", flush=True)
+                last_error = e
+                await asyncio.sleep(self.limiter.backoff_delay(attempt))
+            except Exception as e:
+                print(f"Error fetching plot {plot_number} (Attempt {attempt+1}/{max_retries}): {e!r}", flush=True)
+                last_error = e
+                await asyncio.sleep(self.limiter.backoff_delay(attempt))
+
+        print(f"Failed to fetch plot {plot_number} after {max_retries} attempts.", flush=True)
+        await asyncio.to_thread(self.scraper._record_missing, giscode, plot_number, 'failed', repr(last_error))
+        return None
+
+    async def fetch_village_boundaries_async(self, giscode, max_plots=9999, force=False):
+        """Coroutine version of fetch_village_boundaries."""
+        print(f"Fetching village boundaries for {giscode} (async engine)...", flush=True)
+        async with self._new_session() as session:
+            plot_list = await self.fetch_plot_list(session, *self.scraper.split_giscode(giscode))
+            if not plot_list:
+                print("No plots found in village", flush=True)
+                return []
+
+            plots_to_fetch = plot_list[:max_plots]
+            # One batch of store lookups up front (as iter_village_plots does),
+            # in a thread, instead of one per plot on the event loop
+            skipped = await asyncio.to_thread(self.scraper._skipped_missing, giscode, plots_to_fetch, force)
+            records = await asyncio.to_thread(
+                self.scraper.plot_cache.get_many, (f"{giscode}_{p}" for p in plots_to_fetch if p not in skipped))
+            results = {p: self.scraper.boundary_from_plot(p, records[f"{giscode}_{p}"])
+                       for p in plots_to_fetch if f"{giscode}_{p}" in records}
+            to_request = [p for p in plots_to_fetch if p not in skipped and p not in results]
+            print(f"Fetching geometries for {len(to_request)} plots "
+                  f"(Max in flight: {self.max_in_flight}, {len(results)} cached, "
+                  f"skipping {len(skipped)} known missing)...", flush=True)
+
+            async def fetch_single_plot(plot_no):
+                try:
+                    plot_data = await self._fetch_plot(session, giscode, plot_no)
+                    return self.scraper.boundary_from_plot(plot_no, plot_data)
+                except Exception as e:
+                    print(f"Error fetching plot {plot_no}: {e!r}", flush=True)
+                    return None
+
+            # A fixed set of workers pulls from one iterator, so at most
+            # max_in_flight coroutines ever wait on the limiter
+            pending = iter(to_request)
+
+            # Crawl requests yield to interactive lookups (see iter_village_plots)
+            crawl_priority = rate_control.less_urgent(rate_control.current_priority(), rate_control.PREFETCH)
+
+            async def worker():
+                rate_control.set_priority(crawl_priority)
+                for plot_no in pending:
+                    results[plot_no] = await fetch_single_plot(plot_no)
+
+            await asyncio.gather(*(worker() for _ in range(min(self.max_in_flight, len(to_request)))))
+
+        boundaries = [results[p] for p in plots_to_fetch if results.get(p)]
+        print(f"Successfully fetched {len(boundaries)} plot boundaries", flush=True)
+        # Like fetch_village_plots, for callers that run one crawl at a time
+        self.scraper.last_crawl_summary = await asyncio.to_thread(
+            self.scraper._crawl_summary, giscode, plots_to_fetch, [b['plot_no'] for b in boundaries], skipped)
+        print(f"Upstream limiter: {self.limiter.stats()}", flush=True)
+        return boundaries
+
+    def fetch_village_boundaries(self, giscode, max_plots=9999, force=False):
+        """
+        Drop-in replacement for MahabhumiScraper.fetch_village_boundaries.
+        Runs the crawl on a private event loop in the calling thread.
+        """
+        return asyncio.run(self.fetch_village_boundaries_async(giscode, max_plots, force))
@@ -5,6 +5,11 @@ def batch_fetch():
     # Disable auto-save for performance
     scraper = MahabhumiScraper(auto_save=False)
     
+    # Pass --async to crawl with the asyncio engine instead of the thread pool
+    use_async = "--async" in sys.argv[1:]
+    # Pass --force to retry plots held in the negative cache (not found / failed)
+    force = "--force" in sys.argv[1:]
+    
     # Default: Sakore Village (from previous logs)
     # RVM2502272500020303690000
     # District: 25 (Pune), Taluka: 02 (Ambegaon), Village: 272500020303690000
@@ -19,20 +24,37 @@ def batch_fetch():
     if not gis_code:
         gis_code = default_gis_code
         
-    try:
-        workers = int(input("Enter number of threads (default: 20): ").strip() or "20")
-    except:
-        workers = 20
+    if use_async:
+        from async_scraper import AsyncMahabhumiScraper
+        try:
+            in_flight = int(input("Enter max requests in flight (default: 200): ").strip() or "200")
+        except:
+            in_flight = 200
         
-    print(f"Starting batch fetch for {gis_code} with {workers} workers...")
-    
-    boundaries = scraper.fetch_village_boundaries(gis_code, max_plots=9999, max_workers=workers)
+        print(f"Starting async batch fetch for {gis_code} with {in_flight} requests in flight...")
+        engine = AsyncMahabhumiScraper(scraper, max_in_flight=in_flight)
+        boundaries = engine.fetch_village_boundaries(gis_code, max_plots=9999, force=force)
+    else:
+        # Concurrency is tuned automatically by the scraper's adaptive limiter;
+        # a number here only caps the thread count
+        try:
+            workers = int(input("Enter max number of threads (default: auto): ").strip())
+        except:
+            workers = None
+            
+        print(f"Starting batch fetch for {gis_code} with {workers or 'auto'} workers...")
+        
+        boundaries = scraper.fetch_village_boundaries(gis_code, max_plots=9999, max_workers=workers, force=force)
     
     print("Saving cache to disk...")
     scraper.save_cache()
     
     print(f"Done! Fetched {len(boundaries)} plots.")
-    print(f"Cache is populated in {scraper.CACHE_FILE}")
+    summary = scraper.last_crawl_summary
+    if summary:
+        print(f"Not found: {summary['not_found']}, failed: {summary['failed']}, "
+              f"skipped (negative cache): {summary['skipped_not_found'] + summary['skipped_failed']}")
+    print(f"Cache is populated in {scraper.STORE_FILE}")
 
 if __name__ == "__main__":
     batch_fetch()
@@ -0,0 +1,96 @@
+"""
+Benchmark: on-disk size and startup load time of the plot cache.
+
+Compares the legacy pretty-printed all_plots.json, a plot store holding WKT
+inside its JSON column, and the packed-geometry plot store that
+MahabhumiScraper loads at startup. Uses a synthetic village from
+bench_wkt_parse.
+
+    python benchmarks/bench_cache_load.py [--plots 3000]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plot_store import PlotStore  # noqa: E402
+from bench_wkt_parse import synthetic_village  # noqa: E402
+
+INFO = ("Survey No. : {p}\nTotal Area : 1.01\nOwner Name : Sample Owner\n"
+        "---------------------------------\nSurvey No. : {p}\nOwner Name : Second Owner\n")
+
+
+def make_plots(n_plots):
+    plots = []
+    for i, wkt in enumerate(synthetic_village(n_plots)):
+        plotno = str(i + 1)
+        info = INFO.format(p=plotno)
+        plots.append({
+            'the_geom': wkt,
+            'info': info,
+            'parsed_records': [{'Survey No.': plotno, 'Owner Name': 'Sample Owner'}],
+            'giscode': "RVM0502270500020047510000",
+            'plotno': plotno,
+        })
+    return plots
+
+
+def timed(label, fn, size):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {size / 1e6:8.1f} MB {elapsed * 1000:9.1f} ms")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--plots", type=int, default=3000)
+    args = parser.parse_args()
+
+    plots = make_plots(args.plots)
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = os.path.join(tmp, "all_plots.json")
+        with open(legacy, 'w', encoding='utf-8') as f:
+            json.dump(plots, f, indent=2)
+
+        # Plot store layout before geometries were packed: WKT inside the JSON column
+        wkt_store = os.path.join(tmp, "wkt.db")
+        conn = sqlite3.connect(wkt_store)
+        conn.execute("CREATE TABLE plots (key TEXT PRIMARY KEY, giscode TEXT, plotno TEXT, data TEXT)")
+        conn.executemany("INSERT INTO plots VALUES (?, ?, ?, ?)",
+                         [(f"{p['giscode']}_{p['plotno']}", p['giscode'], p['plotno'],
+                           json.dumps(p, separators=(',', ':'))) for p in plots])
+        conn.commit()
+        conn.close()
+
+        packed_store = os.path.join(tmp, "plots.db")
+        PlotStore(packed_store).upsert_many(plots)
+
+        print(f"{len(plots)} plots\n")
+        print(f"{'':<32} {'on disk':>11} {'load':>12}")
+
+        def load_legacy():
+            with open(legacy, 'r', encoding='utf-8') as f:
+                return {f"{p['giscode']}_{p['plotno']}": p for p in json.load(f)}
+
+        def load_wkt_store():
+            rows = sqlite3.connect(wkt_store).execute("SELECT data FROM plots")
+            return {f"{p['giscode']}_{p['plotno']}": p for p in (json.loads(d) for (d,) in rows)}
+
+        t_legacy = timed("all_plots.json (indent=2)", load_legacy, os.path.getsize(legacy))
+        timed("plot store, WKT in JSON", load_wkt_store, os.path.getsize(wkt_store))
+        t_packed = timed("plot store, packed geometry",
+                         lambda: PlotStore(packed_store).load_all(), os.path.getsize(packed_store))
+
+        print(f"\nsize:  {os.path.getsize(legacy) / os.path.getsize(packed_store):5.1f}x smaller than all_plots.json")
+        print(f"load:  {t_legacy / t_packed:5.1f}x faster than all_plots.json")
+
+
+if __name__ == "__main__":
+    main()
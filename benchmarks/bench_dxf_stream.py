@@ -0,0 +1,80 @@
+"""
+Benchmark: peak memory and time of a large DXF export.
+
+Builds the ZIP for a synthetic taluka once the old way (ezdxf document in
+memory, written to StringIO, zipped into BytesIO) and once with
+dxf_export.stream_document + stream_zip, consuming the stream like an HTTP
+response would. Peak memory is measured with tracemalloc.
+
+    python benchmarks/bench_dxf_stream.py [--plots 5000] [--skip-in-memory]
+
+The in-memory path is slow under tracemalloc; use --skip-in-memory for
+taluka-sized runs (--plots 50000).
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import tracemalloc
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dxf_export  # noqa: E402
+import geometry  # noqa: E402
+from bench_wkt_parse import synthetic_village  # noqa: E402
+
+
+def make_blobs(n_plots):
+    # Packed like the plot store keeps them; decoded one plot at a time
+    return [geometry.pack(geometry.parse_wkt(w)) for w in synthetic_village(n_plots)]
+
+
+def plot_geometries(blobs):
+    return ((str(i + 1), geometry.unpack(b)) for i, b in enumerate(blobs))
+
+
+def in_memory(blobs):
+    doc, _ = dxf_export.build_document(plot_geometries(blobs))
+    out_stream = io.StringIO()
+    doc.write(out_stream)
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        zip_file.writestr("export.dxf", out_stream.getvalue())
+    return len(zip_buffer.getvalue())
+
+
+def streamed(blobs):
+    extent = dxf_export.plots_extent(g for _, g in plot_geometries(blobs))
+    document = dxf_export.stream_document(plot_geometries(blobs), extent)
+    return sum(len(chunk) for chunk in dxf_export.stream_zip([("export.dxf", document, zipfile.ZIP_DEFLATED)]))
+
+
+def measure(label, fn, blobs):
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = fn(blobs)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<12} {elapsed:8.1f} s {peak / 1e6:10.1f} MB peak {size / 1e6:8.1f} MB zip")
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--plots", type=int, default=5000)
+    parser.add_argument("--skip-in-memory", action="store_true", help="Only run the streaming export")
+    args = parser.parse_args()
+
+    blobs = make_blobs(args.plots)
+    print(f"{len(blobs)} plots, {sum(map(len, blobs)) / 1e6:.1f} MB packed geometry\n")
+    peak_stream = measure("streamed", streamed, blobs)
+    if not args.skip_in_memory:
+        peak_memory = measure("in memory", in_memory, blobs)
+        print(f"\npeak memory: {peak_memory / peak_stream:.0f}x lower when streamed")
+
+
+if __name__ == "__main__":
+    main()
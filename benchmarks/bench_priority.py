@@ -0,0 +1,77 @@
+"""
+Benchmark: interactive lookup latency while a crawl saturates the upstream.
+
+A simulated upstream answers every call in --latency seconds. Crawl
+threads keep it saturated through one AdaptiveLimiter (capped at --limit)
+while a single user thread issues plot lookups one after another. Each
+lookup's time spent waiting for a slot is reported, first with every call
+in one class (the old behaviour) and then with the crawl at BULK priority.
+
+    python benchmarks/bench_priority.py [--crawlers 64] [--limit 16] [--lookups 100]
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rate_control  # noqa: E402
+from rate_control import AdaptiveLimiter  # noqa: E402
+
+
+def call(limiter, latency):
+    start = time.monotonic()
+    limiter.acquire()
+    waited = time.monotonic() - start
+    time.sleep(latency)
+    limiter.release(rate_control.OK, latency)
+    return waited
+
+
+def run(args, crawl_priority):
+    limiter = AdaptiveLimiter(initial=args.limit, max_limit=args.limit)
+    stop = threading.Event()
+    crawled = [0]
+
+    def crawler():
+        rate_control.set_priority(crawl_priority)
+        while not stop.is_set():
+            call(limiter, args.latency)
+            crawled[0] += 1
+
+    threads = [threading.Thread(target=crawler, daemon=True) for _ in range(args.crawlers)]
+    for t in threads:
+        t.start()
+    time.sleep(args.latency * 5)
+
+    start = time.monotonic()
+    waits = [call(limiter, args.latency) for _ in range(args.lookups)]
+    elapsed = time.monotonic() - start
+    stop.set()
+    for t in threads:
+        t.join()
+
+    waits.sort()
+    p99 = waits[min(len(waits) - 1, int(len(waits) * 0.99))]
+    print(f"crawl at {crawl_priority:<12} lookup wait p50 {statistics.median(waits) * 1000:7.1f} ms, "
+          f"p99 {p99 * 1000:7.1f} ms; crawl {crawled[0] / elapsed:6.0f} calls/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--crawlers", type=int, default=64, help="Crawl threads (the scraper's pool size)")
+    parser.add_argument("--limit", type=int, default=16, help="Upstream concurrency limit")
+    parser.add_argument("--latency", type=float, default=0.05, help="Upstream response time in seconds")
+    parser.add_argument("--lookups", type=int, default=100)
+    args = parser.parse_args()
+
+    # Same class as the lookups: they queue behind the crawl threads
+    run(args, rate_control.INTERACTIVE)
+    run(args, rate_control.BULK)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark: memory held by plot records kept in process.
+
+Builds a synthetic cache (village geometries from bench_wkt_parse, two or
+three owner records per plot) and measures with tracemalloc what holding
+every plot costs as:
+
+  - the upstream JSON dicts the cache used to hold (WKT, info, parsed_records)
+  - dicts with the geometry packed, as PlotRecord held them before
+  - compact PlotRecords (slots, interned keys, parsed_records from info)
+
+and checks that PlotRecords still serialize to the same JSON.
+
+    python benchmarks/bench_record_memory.py [--plots 100000]
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import geometry  # noqa: E402
+from plot_store import INFO_SEPARATOR, PlotRecord, parse_info  # noqa: E402
+from bench_wkt_parse import synthetic_village  # noqa: E402
+
+NAMES = ["ज्ञानेश्वर रामचंद्र पाटील", "सुनीता विठ्ठल पवार", "शांताबाई जाधव", "Ramesh Shinde", "Anita Kulkarni"]
+VILLAGE_PLOTS = 3000
+
+
+def make_plots(n_plots, seed=0):
+    rng = random.Random(seed)
+    wkts = synthetic_village(min(n_plots, VILLAGE_PLOTS))
+    plots = []
+    for i in range(n_plots):
+        village, plotno = divmod(i, VILLAGE_PLOTS)
+        giscode = f"RVM0527{village:018d}"
+        info = f"\n{INFO_SEPARATOR}\n".join(
+            f"Survey No. : {plotno + 1}\nTotal Area : {rng.randint(1, 900) / 100}\nOwner Name : {rng.choice(NAMES)}"
+            for _ in range(rng.randint(2, 3))
+        )
+        # Each plot gets its own string objects, as json.loads would give it
+        plots.append(json.loads(json.dumps({
+            'the_geom': wkts[plotno % len(wkts)],
+            'info': info,
+            'parsed_records': parse_info(info),
+            'report_url': f"/api/report?state=27&giscode={giscode}&plotno={plotno + 1}",
+            'giscode': giscode,
+            'plotno': str(plotno + 1),
+        })))
+    return plots
+
+
+def held(label, build, baseline=None):
+    gc.collect()
+    tracemalloc.start()
+    records = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    ratio = f"{baseline / size:5.1f}x smaller" if baseline else ""
+    print(f"{label:<34} {size / 1e6:8.1f} MB {size / len(records):7.0f} B/plot  {ratio}")
+    return records, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--plots", type=int, default=100000)
+    parser.add_argument("--check-every", type=int, default=50, help="Compare the JSON of every Nth record")
+    args = parser.parse_args()
+
+    source = json.dumps(make_plots(args.plots))
+    print(f"{args.plots} plots\n")
+
+    _, upstream = held("upstream JSON dicts", lambda: json.loads(source))
+
+    def packed_dicts():
+        plots = json.loads(source)
+        for plot in plots:
+            plot['geom_blob'] = geometry.pack(geometry.parse_wkt(plot.pop('the_geom')))
+        return plots
+    held("dicts, packed geometry", packed_dicts, upstream)
+
+    records, _ = held("compact PlotRecord", lambda: [PlotRecord(plot) for plot in json.loads(source)], upstream)
+
+    # Same /api/plot JSON, WKT aside (re-serialized from the packed coordinates)
+    start = time.perf_counter()
+    checked = list(zip(records, json.loads(source)))[::args.check_every]
+    for record, plot in checked:
+        served = json.loads(json.dumps(record))
+        assert geometry.parse_wkt(served.pop('the_geom')).coords.tolist() == \
+            geometry.parse_wkt(plot.pop('the_geom')).coords.tolist()
+        assert served == plot
+    print(f"\nJSON of {len(checked)} records checked, {(time.perf_counter() - start) / len(checked) * 1e6:.0f} us/plot")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark: finding plots by owner name across a district's cached plots.
+
+Compares scanning every cached plot's parsed_records for a substring (the
+only option before) against the persistent SearchIndex, for exact, prefix
+and one-typo queries in Marathi and Latin script. Owner names are drawn
+from small synthetic name lists.
+
+    python benchmarks/bench_search_index.py [--plots 200000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_index import SearchIndex  # noqa: E402
+
+GIVEN = ["ज्ञानेश्वर", "रामचंद्र", "सुनीता", "विठ्ठल", "शांताबाई", "Ramesh", "Sunil", "Anita", "Prakash", "Vijay"]
+SURNAMES = ["पाटील", "पवार", "जाधव", "शिंदे", "कुलकर्णी", "Patil", "Pawar", "Jadhav", "Shinde", "Kulkarni"]
+QUERIES = [
+    ("exact, Marathi", "विठ्ठल पवार"),
+    ("exact, Latin", "prakash kulkarni"),
+    ("prefix", "kulk"),
+    ("one typo", "shindhe"),
+    ("survey number", "1234"),
+]
+
+
+def make_plots(n_plots, seed=0):
+    rng = random.Random(seed)
+    plots = []
+    for i in range(n_plots):
+        village, plotno = divmod(i, 3000)
+        owners = [f"{rng.choice(GIVEN)} {rng.choice(GIVEN)} {rng.choice(SURNAMES)}"
+                  for _ in range(rng.randint(1, 4))]
+        plots.append({
+            'giscode': f"RVM05270000000000000{village:05d}",
+            'plotno': str(plotno + 1),
+            'parsed_records': [{'Survey No.': str(plotno + 1), 'Total Area': "1.01", 'Owner Name': owner}
+                               for owner in owners],
+        })
+    return plots
+
+
+def scan(plots, text):
+    text = text.casefold()
+    return [p for p in plots if any(text in str(v).casefold() for r in p['parsed_records'] for v in r.values())]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--plots", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    plots = make_plots(args.plots)
+    with tempfile.TemporaryDirectory() as tmp:
+        index = SearchIndex(os.path.join(tmp, "search.db"))
+        start = time.perf_counter()
+        for i in range(0, len(plots), 5000):
+            index.add_many(plots[i:i + 5000])
+        build = time.perf_counter() - start
+        stats = index.stats()
+        size = os.path.getsize(os.path.join(tmp, "search.db"))
+        print(f"{len(plots)} plots: index built in {build:.1f} s, {size / 1e6:.0f} MB, "
+              f"{stats['tokens']} tokens, {stats['postings']} postings\n")
+
+        start = time.perf_counter()
+        scan(plots, "kulkarni")
+        print(f"{'substring scan of parsed_records':<34} {(time.perf_counter() - start) * 1000:9.1f} ms\n")
+
+        for label, query in QUERIES:
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                hits = index.search(query, limit=50)
+            elapsed = (time.perf_counter() - start) / args.repeat
+            print(f"{label + ': ' + query:<34} {elapsed * 1000:9.1f} ms ({len(hits)} shown)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark: point and viewport queries over a district-sized plot cache.
+
+Compares a linear scan of every plot's WKT (what answering "which plot is
+here?" took before) against the STR-tree spatial index plus an exact
+point-in-polygon test on its candidates. Uses synthetic villages from
+bench_wkt_parse.
+
+    python benchmarks/bench_spatial_index.py [--plots 200000] [--queries 200]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import geometry  # noqa: E402
+from spatial_index import SpatialIndex  # noqa: E402
+from bench_wkt_parse import synthetic_village  # noqa: E402
+
+
+def district(n_plots, village_size=3000):
+    """n_plots synthetic plots: villages of village_size laid out side by side."""
+    plots = {}
+    template = [geometry.parse_wkt(wkt) for wkt in synthetic_village(village_size)]
+    for v in range((n_plots + village_size - 1) // village_size):
+        offset = ((v % 20) * 8000.0, (v // 20) * 8000.0)
+        for i, geom in enumerate(template[:n_plots - v * village_size]):
+            plots[f"RVM05270000000000000{v:05d}_{i + 1}"] = geom._replace(coords=geom.coords + offset)
+    return plots
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--plots", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--scan-queries", type=int, default=3, help="Linear-scan queries (slow)")
+    args = parser.parse_args()
+
+    plots = district(args.plots)
+    wkts = {key: geometry.to_wkt(geom) for key, geom in plots.items()}
+    extent = geometry.union_bounds(plots.values())
+    rng = random.Random(0)
+    points = [(rng.uniform(extent[0], extent[2]), rng.uniform(extent[1], extent[3])) for _ in range(args.queries)]
+    print(f"{len(plots)} plots over {(extent[2] - extent[0]) / 1000:.0f} x {(extent[3] - extent[1]) / 1000:.0f} km\n")
+
+    start = time.perf_counter()
+    index = SpatialIndex()
+    index.bulk_insert((key, geometry.bounds(geom)) for key, geom in plots.items())
+    print(f"{'index build':<36} {(time.perf_counter() - start) * 1000:9.1f} ms")
+
+    def scan(x, y):
+        return [key for key, wkt in wkts.items() if geometry.contains_point(geometry.parse_wkt(wkt), x, y)]
+
+    def lookup(x, y):
+        return [key for key in index.query_point(x, y) if geometry.contains_point(plots[key], x, y)]
+
+    start = time.perf_counter()
+    for x, y in points[:args.scan_queries]:
+        expected = scan(x, y)
+        assert sorted(lookup(x, y)) == sorted(expected)
+    t_scan = (time.perf_counter() - start) / args.scan_queries
+    print(f"{'point, scan all WKT':<36} {t_scan * 1000:9.1f} ms/query")
+
+    start = time.perf_counter()
+    hits = sum(len(lookup(x, y)) for x, y in points)
+    t_index = (time.perf_counter() - start) / len(points)
+    print(f"{'point, index + point-in-polygon':<36} {t_index * 1000:9.3f} ms/query ({hits} hits)")
+
+    start = time.perf_counter()
+    found = sum(len(index.query((x, y, x + 1000, y + 600))) for x, y in points)
+    t_box = (time.perf_counter() - start) / len(points)
+    print(f"{'1 x 0.6 km viewport, index':<36} {t_box * 1000:9.3f} ms/query ({found / len(points):.0f} plots avg)")
+
+    print(f"\npoint query: {t_scan / t_index:,.0f}x faster than scanning")
+
+
+if __name__ == "__main__":
+    main()
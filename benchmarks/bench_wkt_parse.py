@@ -0,0 +1,117 @@
+"""
+Microbenchmark: WKT parsing of a full village.
+
+Compares the old regex paths (download_village_map's findall over the
+whole string, and generate_sample_dxf's comma-splitting loop) against
+geometry.parse_wkt. Uses a cached village from the plot store when
+--giscode is given, otherwise a synthetic 3,000-plot village.
+
+    python benchmarks/bench_wkt_parse.py [--giscode RVM...] [--plots 3000]
+"""
+import argparse
+import math
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import geometry  # noqa: E402
+from plot_store import PlotStore, DEFAULT_STORE_FILE  # noqa: E402
+
+
+def synthetic_village(n_plots, seed=1):
+    """Irregular polygons in UTM metres, 20-150 vertices each, some multipart."""
+    rng = random.Random(seed)
+    wkts = []
+    for i in range(n_plots):
+        cx = 370000 + (i % 60) * 120.0
+        cy = 2060000 + (i // 60) * 120.0
+        polygons = []
+        for part in range(2 if i % 10 == 0 else 1):
+            n = rng.randint(20, 150)
+            pts = []
+            for k in range(n):
+                a = 2 * math.pi * k / n
+                r = rng.uniform(30, 55)
+                pts.append(f"{cx + part * 5 + r * math.cos(a):.3f} {cy + r * math.sin(a):.3f}")
+            pts.append(pts[0])
+            polygons.append("((" + ",".join(pts) + "))")
+        wkts.append("MULTIPOLYGON(" + ",".join(polygons) + ")")
+    return wkts
+
+
+def legacy_findall_bounds(wkts):
+    # Old download_village_map path
+    min_x, min_y, max_x, max_y = float('inf'), float('inf'), float('-inf'), float('-inf')
+    for geom in wkts:
+        for x_str, y_str in re.findall(r'([\d.]+)\s+([\d.]+)', geom):
+            x, y = float(x_str), float(y_str)
+            min_x = min(min_x, x)
+            min_y = min(min_y, y)
+            max_x = max(max_x, x)
+            max_y = max(max_y, y)
+    return min_x, min_y, max_x, max_y
+
+
+def legacy_parse_wkt_rings(wkt):
+    # Old generate_sample_dxf.parse_wkt_rings
+    rings = []
+    for m in re.findall(r'\(([\d\.\s,]+)\)', wkt):
+        ring_coords = []
+        for pair in m.strip().split(','):
+            parts = pair.strip().split()
+            if len(parts) >= 2:
+                ring_coords.append((float(parts[0]), float(parts[1])))
+        if ring_coords:
+            rings.append(ring_coords)
+    return rings
+
+
+def timed(label, fn, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<45} {best * 1000:9.1f} ms")
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--giscode", help="Benchmark a village from the plot store")
+    parser.add_argument("--plots", type=int, default=3000, help="Synthetic village size")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.giscode:
+        wkts = [p['the_geom'] for p in PlotStore(DEFAULT_STORE_FILE).iter_plots(args.giscode) if p.get('the_geom')]
+    else:
+        wkts = synthetic_village(args.plots)
+    vertices = sum(w.count(',') + 1 for w in wkts)
+    print(f"{len(wkts)} plots, ~{vertices} vertices, {sum(map(len, wkts)) / 1e6:.1f} MB of WKT\n")
+
+    legacy_bbox, t_findall = timed("regex findall bbox (download_village_map)",
+                                   lambda: legacy_findall_bounds(wkts), args.repeat)
+    _, t_rings = timed("regex rings (generate_sample_dxf)",
+                       lambda: [legacy_parse_wkt_rings(w) for w in wkts], args.repeat)
+    geoms, t_numpy = timed("geometry.parse_wkt",
+                           lambda: [geometry.parse_wkt(w) for w in wkts], args.repeat)
+    new_bbox, t_bbox = timed("geometry.union_bounds (already parsed)",
+                             lambda: geometry.union_bounds(geoms), args.repeat)
+    [geometry.parse_wkt_cached(w) for w in wkts]
+    _, t_cached = timed("geometry.parse_wkt_cached (warm)",
+                        lambda: [geometry.parse_wkt_cached(w) for w in wkts], args.repeat)
+
+    assert all(abs(a - b) < 1e-6 for a, b in zip(legacy_bbox, new_bbox))
+    print(f"\nparse speedup vs regex rings:  {t_rings / t_numpy:5.1f}x")
+    print(f"bbox speedup vs regex findall: {t_findall / (t_numpy + t_bbox):5.1f}x (cold), "
+          f"{t_findall / (t_cached + t_bbox):5.1f}x (warm cache)")
+
+
+if __name__ == "__main__":
+    main()
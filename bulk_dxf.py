@@ -0,0 +1,174 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import dxf_export
+import geometry
+import topology
+from plot_store import PlotStore, DEFAULT_STORE_FILE
+
+# Handles each village may use in the merged DXF
+VILLAGE_HANDLE_BLOCK = 0x100000000
+
+_store = None
+
+
+def _init_worker(store_path):
+    global _store
+    _store = PlotStore(store_path)
+
+
+def plot_sort_key(record):
+    plotno = str(record['plotno'])
+    return (0, int(plotno), plotno) if plotno.isdigit() else (1, 0, plotno)
+
+
+def export_village(giscode, out_dir, coordinate_labels, merge_slot, tolerance=None):
+    """
+    Writes <out_dir>/<giscode>.dxf from the plot store. With a merge_slot
+    (owner, first_handle) also writes the village's entities, with handles
+    from that slot, to a fragment file for the merged DXF. With a tolerance
+    shared boundaries are written once (topology.py) and the plot outlines
+    go to <giscode>.topology.json.
+    Runs in a worker process; returns a summary dict.
+    """
+    start = time.time()
+    records = sorted(_store.iter_plots(giscode), key=plot_sort_key)
+    plots = [(r['plotno'], geometry.plot_geometry(r)) for r in records if 'the_geom' in r]
+    extent = dxf_export.plots_extent(geom for _, geom in plots)
+    topo = None
+    if tolerance is not None:
+        topo = topology.build_topology(plots, tolerance)
+        with open(os.path.join(out_dir, f"{giscode}.topology.json"), 'w', encoding='utf-8') as f:
+            json.dump(topology.to_json(topo), f)
+
+    path = os.path.join(out_dir, f"{giscode}.dxf")
+    with open(path, 'w', encoding='utf-8') as f:
+        if topo is not None:
+            chunks = dxf_export.stream_topology_document(topo, extent, coordinate_labels=coordinate_labels)
+        else:
+            chunks = dxf_export.stream_document(plots, extent, coordinate_labels=coordinate_labels)
+        for chunk in chunks:
+            f.write(chunk)
+
+    fragment = None
+    if merge_slot is not None:
+        owner, first_handle = merge_slot
+        fragment = os.path.join(out_dir, f".{giscode}.entities")
+        text_h = dxf_export.text_height(extent)
+        if topo is not None:
+            chunks = dxf_export.topology_chunks(topo, text_h, owner, first_handle, coordinate_labels)
+        else:
+            chunks = dxf_export.entity_chunks(plots, text_h, owner, first_handle, coordinate_labels,
+                                              limit=VILLAGE_HANDLE_BLOCK)
+        with open(fragment, 'w', encoding='utf-8') as f:
+            for chunk in chunks:
+                f.write(chunk)
+
+    return {
+        'giscode': giscode,
+        'plots': len(plots),
+        'vertices': sum(len(g.coords) for _, g in plots),
+        'topology': topology.stats(topo, plots) if topo is not None else None,
+        'path': path,
+        'fragment': fragment,
+        'seconds': time.time() - start,
+    }
+
+
+def write_merged(path, head, tail, fragments):
+    """Concatenates the per-village entity fragments into one DXF and removes them."""
+    with open(path, 'w', encoding='utf-8') as out:
+        out.write(head)
+        for fragment in fragments:
+            with open(fragment, 'r', encoding='utf-8') as f:
+                while True:
+                    chunk = f.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    out.write(chunk)
+            os.remove(fragment)
+        out.write(tail)
+
+
+def read_giscodes(args, store):
+    giscodes = list(args.giscodes)
+    if args.file:
+        with open(args.file, 'r', encoding='utf-8') as f:
+            giscodes.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+    if args.prefix:
+        giscodes.extend(store.giscodes(args.prefix))
+    # Keep the given order, drop duplicates
+    return list(dict.fromkeys(giscodes))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate DXF files for many villages from the local plot store, one process per core.")
+    parser.add_argument("giscodes", nargs="*", help="Village GIS codes, e.g. RVM2502272500020303690000")
+    parser.add_argument("--file", help="Text file with one GIS code per line")
+    parser.add_argument("--prefix", help="All cached villages whose GIS code starts with this (e.g. a taluka: RVM2502)")
+    parser.add_argument("--out", default="dxf_out", help="Output directory. Default: dxf_out")
+    parser.add_argument("--merge", action="store_true", help="Also write all villages into one merged.dxf")
+    parser.add_argument("--labels", action="store_true",
+                        help="Add an x,y text label at every vertex (many more entities)")
+    parser.add_argument("--topology", action="store_true",
+                        help="Write boundaries shared by neighbouring plots once, plus <giscode>.topology.json")
+    parser.add_argument("--tolerance", type=float, default=topology.DEFAULT_TOLERANCE,
+                        help=f"Vertex snapping distance for --topology. Default: {topology.DEFAULT_TOLERANCE}")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes. Default: CPU count")
+    parser.add_argument("--store", default=DEFAULT_STORE_FILE, help=f"Plot store. Default: {DEFAULT_STORE_FILE}")
+    args = parser.parse_args()
+
+    store = PlotStore(args.store)
+    giscodes = read_giscodes(args, store)
+    if not giscodes:
+        parser.error("no villages given (pass GIS codes, --file or --prefix)")
+    os.makedirs(args.out, exist_ok=True)
+
+    head = tail = None
+    slots = [None] * len(giscodes)
+    if args.merge:
+        head, tail, owner, first = dxf_export.document_parts(reserve=VILLAGE_HANDLE_BLOCK * len(giscodes))
+        slots = [(owner, first + i * VILLAGE_HANDLE_BLOCK) for i in range(len(giscodes))]
+
+    print(f"Generating DXF for {len(giscodes)} villages with {args.workers} workers...", flush=True)
+    start = time.time()
+    results = {}
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(args.store,)) as pool:
+        tolerance = args.tolerance if args.topology else None
+        futures = {pool.submit(export_village, giscode, args.out, args.labels, slot, tolerance): giscode
+                   for giscode, slot in zip(giscodes, slots)}
+        for done, future in enumerate(as_completed(futures), 1):
+            giscode = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"[{done}/{len(giscodes)}] {giscode}: failed: {e}", flush=True)
+                continue
+            results[giscode] = result
+            print(f"[{done}/{len(giscodes)}] {giscode}: {result['plots']} plots, "
+                  f"{result['vertices']} vertices in {result['seconds']:.1f}s "
+                  f"(elapsed {time.time() - start:.1f}s)", flush=True)
+            if result['topology']:
+                t = result['topology']
+                print(f"    topology: {t['unique_edges']}/{t['edges']} edges, "
+                      f"{t['unique_vertices']}/{t['vertices']} vertices", flush=True)
+
+    if args.merge:
+        # Villages that failed are left out; their handle blocks stay unused
+        fragments = [results[g]['fragment'] for g in giscodes if g in results]
+        merged = os.path.join(args.out, "merged.dxf")
+        write_merged(merged, head, tail, fragments)
+        print(f"Merged {len(fragments)} villages into {merged}", flush=True)
+
+    elapsed = time.time() - start
+    plots = sum(r['plots'] for r in results.values())
+    print(f"Done! {len(results)}/{len(giscodes)} villages, {plots} plots in {elapsed:.1f}s "
+          f"({plots / elapsed if elapsed else 0:.0f} plots/s). Output in {os.path.abspath(args.out)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,559 @@
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import rate_control
+
+DEFAULT_JOBS_FILE = "cache/jobs.db"
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+PAUSED = 'paused'
+CANCELLED = 'cancelled'
+DONE = 'done'
+FAILED = 'failed'
+FINISHED = (CANCELLED, DONE, FAILED)
+# Village states (plus RUNNING, DONE and FAILED)
+PENDING = 'pending'
+
+# A district (RVM25), a taluka (RVM2502) or a village (RVM2502272500020303690000)
+_TARGET = re.compile(r"^(RVM|UVM)(\d{2})(\d{2})?(\d{18})?$")
+
+
+def parse_target(target):
+    """
+    (category, district, taluka, village) of a crawl target given as a GIS
+    code or GIS code prefix; taluka and village are None for coarser
+    targets. Raises ValueError for anything else.
+    """
+    match = _TARGET.match(str(target).strip().upper())
+    if not match:
+        raise ValueError(f"{target!r} is not a district, taluka or village GIS code (e.g. RVM25, RVM2502)")
+    prefix, district, taluka, village = match.groups()
+    return ('R' if prefix == 'RVM' else 'U'), district, taluka, village
+
+
+class JobStore:
+    """
+    Crawl jobs and their per-village progress, in SQLite.
+
+    A job's targets are expanded into villages once, when it first runs;
+    each village row carries its plot count and found / not found / failed /
+    skipped counters, checkpointed while the village is crawled. The plots
+    themselves are checkpointed one by one by the plot store and the
+    negative cache, so a restarted village only requests what is left.
+    """
+
+    def __init__(self, path=DEFAULT_JOBS_FILE):
+        self.path = path
+        jobs_dir = os.path.dirname(path)
+        if jobs_dir and not os.path.exists(jobs_dir):
+            os.makedirs(jobs_dir, exist_ok=True)
+
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY,
+                    targets TEXT NOT NULL,
+                    force INTEGER NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    owner TEXT,
+                    heartbeat REAL,
+                    stop_requested TEXT
+                )
+            """)
+            # Job databases created before jobs were leased lack the lease columns
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(jobs)")]
+            for column, kind in (('owner', 'TEXT'), ('heartbeat', 'REAL'), ('stop_requested', 'TEXT')):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS job_villages (
+                    job_id INTEGER NOT NULL,
+                    seq INTEGER NOT NULL,
+                    giscode TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    total INTEGER,
+                    found INTEGER NOT NULL DEFAULT 0,
+                    not_found INTEGER NOT NULL DEFAULT 0,
+                    failed INTEGER NOT NULL DEFAULT 0,
+                    skipped INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    updated_at REAL,
+                    PRIMARY KEY (job_id, giscode)
+                )
+            """)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def create(self, targets, force=False):
+        """Queues a job and returns its id."""
+        with self._conn() as conn:
+            return conn.execute(
+                "INSERT INTO jobs (targets, force, status, created_at) VALUES (?, ?, ?, ?)",
+                (json.dumps(list(targets)), int(bool(force)), QUEUED, time.time()),
+            ).lastrowid
+
+    def get(self, job_id):
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['targets'] = json.loads(job['targets'])
+        job['force'] = bool(job['force'])
+        return job
+
+    def ids(self, status=None):
+        """Job ids, oldest first, optionally only those in one state."""
+        if status is None:
+            rows = self._conn().execute("SELECT id FROM jobs ORDER BY id")
+        else:
+            rows = self._conn().execute("SELECT id FROM jobs WHERE status = ? ORDER BY id", (status,))
+        return [row[0] for row in rows]
+
+    def set_status(self, job_id, status, error=None, current=None):
+        """
+        Moves a job that is not running to status, only from one of the
+        `current` states if given. Returns whether the job changed.
+        """
+        now = time.time()
+        query = "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?"
+        params = [status, error, now if status in FINISHED else None, job_id]
+        if current:
+            query += f" AND status IN ({', '.join('?' * len(current))})"
+            params.extend(current)
+        with self._conn() as conn:
+            return conn.execute(query, params).rowcount == 1
+
+    # Running jobs are leased: the process running one holds it under its
+    # owner id and renews the heartbeat; other processes leave it alone
+    # until the heartbeat is older than the lease.
+
+    def claim(self, job_id, owner):
+        """Starts a queued job under owner's lease. Returns False if another process claimed it first."""
+        now = time.time()
+        with self._conn() as conn:
+            return conn.execute(
+                "UPDATE jobs SET status = ?, owner = ?, heartbeat = ?, stop_requested = NULL, error = NULL, "
+                "started_at = COALESCE(started_at, ?), finished_at = NULL WHERE id = ? AND status = ?",
+                (RUNNING, owner, now, now, job_id, QUEUED),
+            ).rowcount == 1
+
+    def renew(self, job_id, owner):
+        """
+        Renews owner's lease on a running job. Returns (held, stop_requested):
+        whether owner still holds it, and the state another process asked
+        it to stop in (PAUSED or CANCELLED), if any.
+        """
+        with self._conn() as conn:
+            held = conn.execute("UPDATE jobs SET heartbeat = ? WHERE id = ? AND owner = ? AND status = ?",
+                                (time.time(), job_id, owner, RUNNING)).rowcount == 1
+            row = conn.execute("SELECT stop_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return held, row[0] if row else None
+
+    def release(self, job_id, owner, status, error=None):
+        """Ends owner's run of a job in status; does nothing if the lease has passed to another process."""
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ?, owner = NULL, heartbeat = NULL, "
+                "stop_requested = NULL WHERE id = ? AND owner = ? AND status = ?",
+                (status, error, now if status in FINISHED else None, job_id, owner, RUNNING),
+            )
+
+    def request_stop(self, job_id, status):
+        """Asks the process running a job to stop it in status. Returns False if the job is not running."""
+        with self._conn() as conn:
+            return conn.execute("UPDATE jobs SET stop_requested = ? WHERE id = ? AND status = ?",
+                                (status, job_id, RUNNING)).rowcount == 1
+
+    def requeue_expired(self, lease):
+        """Queues running jobs whose heartbeat is older than lease seconds. Returns how many."""
+        with self._conn() as conn:
+            return conn.execute(
+                "UPDATE jobs SET status = ?, owner = NULL, heartbeat = NULL WHERE status = ? "
+                "AND (heartbeat IS NULL OR heartbeat < ?)",
+                (QUEUED, RUNNING, time.time() - lease),
+            ).rowcount
+
+    def add_villages(self, job_id, giscodes):
+        with self._conn() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO job_villages (job_id, seq, giscode, status) VALUES (?, ?, ?, ?)",
+                [(job_id, seq, giscode, PENDING) for seq, giscode in enumerate(giscodes)],
+            )
+
+    def retry_failed_villages(self, job_id):
+        with self._conn() as conn:
+            conn.execute("UPDATE job_villages SET status = ? WHERE job_id = ? AND status = ?",
+                         (PENDING, job_id, FAILED))
+
+    def villages(self, job_id):
+        rows = self._conn().execute("SELECT * FROM job_villages WHERE job_id = ? ORDER BY seq", (job_id,))
+        return [dict(row) for row in rows]
+
+    def update_village(self, job_id, giscode, **fields):
+        fields['updated_at'] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._conn() as conn:
+            conn.execute(f"UPDATE job_villages SET {assignments} WHERE job_id = ? AND giscode = ?",
+                         (*fields.values(), job_id, giscode))
+
+
+class CrawlJobManager:
+    """
+    Runs crawl jobs one at a time on a background thread, village by
+    village through MahabhumiScraper.iter_village_plots (so the adaptive
+    limiter and the negative cache apply as for any crawl), at the
+    limiter's BULK priority.
+
+    Several processes (server workers, the CLI) may share one job
+    database: a job runs under a lease held by the process that claimed
+    it, and is only queued again once that process stops renewing it, to
+    continue with the villages it had not finished. The worker re-polls the
+    database, so jobs queued, paused or cancelled from another process are
+    noticed too. Running jobs can be paused (resumable) or cancelled; both
+    take effect when the next plot arrives.
+    """
+
+    # Seconds between progress checkpoints of the village being crawled
+    CHECKPOINT_INTERVAL = 2.0
+    # Seconds between lease renewals of the running job, and how old its
+    # last renewal may get before other processes take the job over
+    HEARTBEAT_INTERVAL = 5.0
+    LEASE_TTL = 60.0
+    # Seconds the worker waits before looking for jobs queued by other processes
+    POLL_INTERVAL = 5.0
+
+    def __init__(self, scraper, store=None, autostart=True):
+        self.scraper = scraper
+        self.store = store or JobStore()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._current = None  # id of the running job
+        self._stop = None  # state the running job should stop in (PAUSED or CANCELLED)
+        self._live = {}  # job id -> (start time, plots processed at start) of its current run
+        self._closed = threading.Event()
+        # Lease owner id of this manager; the pid shows which process runs a job
+        self.owner = f"{os.getpid()}:{id(self):x}"
+        if autostart:
+            self.start()
+
+    def resume_interrupted(self):
+        """Queues running jobs whose lease expired because the process running them stopped."""
+        interrupted = self.store.requeue_expired(self.LEASE_TTL)
+        if interrupted:
+            print(f"Crawl jobs: resuming {interrupted} interrupted jobs", flush=True)
+
+    def start(self):
+        """Starts the background worker (once)."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._worker, name="crawl-jobs", daemon=True)
+                self._thread.start()
+
+    def close(self):
+        """Stops the background worker once the job it is running, if any, stops."""
+        self._closed.set()
+        self._wake.set()
+
+    def _worker(self):
+        while not self._closed.is_set():
+            try:
+                self.run_pending()
+            except Exception as e:
+                print(f"Crawl jobs: {e!r}", flush=True)
+            # Woken at once by this process's submit/resume; jobs queued
+            # elsewhere are picked up at the next poll
+            self._wake.wait(self.POLL_INTERVAL)
+            self._wake.clear()
+
+    def _heartbeat(self, job_id, done):
+        """Renews the running job's lease until done, passing on stop requests made by other processes."""
+        while not done.wait(self.HEARTBEAT_INTERVAL):
+            held, stop = self.store.renew(job_id, self.owner)
+            if not held:
+                print(f"Crawl job {job_id}: lease taken over by another process, stopping", flush=True)
+                stop = QUEUED
+            if stop:
+                with self._lock:
+                    if self._current == job_id:
+                        self._stop = stop
+
+    def submit(self, targets, force=False):
+        """Validates targets (see parse_target), queues a job and returns its status dict."""
+        targets = [str(t).strip().upper() for t in targets]
+        if not targets:
+            raise ValueError("at least one target is required")
+        for target in targets:
+            parse_target(target)
+        job_id = self.store.create(targets, force)
+        print(f"Crawl job {job_id} queued: {', '.join(targets)}", flush=True)
+        self._wake.set()
+        return self.job(job_id)
+
+    def pause(self, job_id):
+        return self._stop_job(job_id, PAUSED)
+
+    def cancel(self, job_id):
+        return self._stop_job(job_id, CANCELLED)
+
+    def _stop_job(self, job_id, status):
+        with self._lock:
+            job = self.store.get(job_id)
+            if job is None:
+                return None
+            if job_id == self._current:
+                self._stop = status
+            elif job['status'] == RUNNING:
+                # Running in another process, which sees the request at its next heartbeat
+                self.store.request_stop(job_id, status)
+            else:
+                self.store.set_status(job_id, status, current=(QUEUED, PAUSED) if status == CANCELLED else (QUEUED,))
+        return self.job(job_id)
+
+    def resume(self, job_id):
+        """Queues a paused or failed job again; its finished villages are not crawled again."""
+        with self._lock:
+            job = self.store.get(job_id)
+            if job is None:
+                return None
+            if job['status'] in (PAUSED, FAILED):
+                self.store.retry_failed_villages(job_id)
+                self.store.set_status(job_id, QUEUED, current=(PAUSED, FAILED))
+        self._wake.set()
+        return self.job(job_id)
+
+    def run_pending(self):
+        """
+        Runs queued jobs in order until none are left, each under this
+        manager's lease; jobs whose lease expired are queued again first.
+        """
+        self.resume_interrupted()
+        while True:
+            with self._lock:
+                job_id = next((j for j in self.store.ids(QUEUED) if self.store.claim(j, self.owner)), None)
+                if job_id is None:
+                    return
+                self._current, self._stop = job_id, None
+            done = threading.Event()
+            threading.Thread(target=self._heartbeat, args=(job_id, done), daemon=True).start()
+            # Interrupted runs (Ctrl-C) give the job back to the queue to resume at once
+            status, error = QUEUED, None
+            try:
+                with rate_control.priority(rate_control.BULK):
+                    status, error = self._run(job_id)
+            except Exception as e:
+                print(f"Crawl job {job_id} failed: {e}", flush=True)
+                status, error = FAILED, str(e)
+            finally:
+                done.set()
+                with self._lock:
+                    self.store.release(job_id, self.owner, status, error)
+                    self._current = self._stop = None
+                    self._live.pop(job_id, None)
+            print(f"Crawl job {job_id} {status}", flush=True)
+
+    def _run(self, job_id):
+        job = self.store.get(job_id)
+        villages = self.store.villages(job_id)
+        if not villages:
+            giscodes = self._expand(job['targets'])
+            if not giscodes:
+                return FAILED, "no villages found for the targets"
+            self.store.add_villages(job_id, giscodes)
+            villages = self.store.villages(job_id)
+        self._live[job_id] = (time.time(), sum(self._processed(v) for v in villages))
+
+        for village in villages:
+            if village['status'] in (DONE, FAILED):
+                continue
+            self._crawl_village(job_id, village['giscode'], job['force'])
+            if self._stop:
+                return self._stop, None
+        return DONE, None
+
+    def _expand(self, targets):
+        """Village GIS codes of the targets, in order, without duplicates."""
+        giscodes = []
+        for target in targets:
+            category, district, taluka, village = parse_target(target)
+            if village:
+                giscodes.append(target)
+                continue
+            prefix = "RVM" if category == 'R' else "UVM"
+            talukas = [taluka] if taluka else [t['code'] for t in self.scraper.fetch_talukas(district, category)]
+            for taluka_code in talukas:
+                for v in self.scraper.fetch_villages(district, taluka_code, category):
+                    giscodes.append(f"{prefix}{district}{taluka_code}{v['code']}")
+        return list(dict.fromkeys(giscodes))
+
+    def _crawl_village(self, job_id, giscode, force):
+        from mahabhumi_scraper import VillageCrawl
+        plot_nos = self.scraper.village_plot_list(giscode)
+        if not plot_nos:
+            self.store.update_village(job_id, giscode, status=FAILED, error="no plot list")
+            return
+        self.store.update_village(job_id, giscode, status=RUNNING, total=len(plot_nos), error=None)
+
+        # Until the village's crawl summary splits them, plots without
+        # geometry count as failed
+        counts = {'found': 0, 'missed': 0}
+        checkpointed = time.time()
+
+        def on_complete(plot_no, record):
+            if record is None:
+                counts['missed'] += 1
+
+        crawl = VillageCrawl(self.scraper.iter_village_plots(giscode, plot_nos, force=force,
+                                                             on_complete=on_complete))
+        try:
+            for batch in crawl:
+                counts['found'] += len(batch)
+                if time.time() - checkpointed >= self.CHECKPOINT_INTERVAL:
+                    self.store.update_village(job_id, giscode, found=counts['found'], failed=counts['missed'])
+                    checkpointed = time.time()
+                if self._stop:
+                    self.store.update_village(job_id, giscode, status=PENDING, found=counts['found'],
+                                              failed=counts['missed'])
+                    return
+        finally:
+            crawl.close()
+
+        summary = crawl.summary
+        if summary:
+            self.store.update_village(
+                job_id, giscode, status=DONE, found=summary['found'], not_found=summary['not_found'],
+                failed=summary['failed'], skipped=summary['skipped_not_found'] + summary['skipped_failed'],
+            )
+        else:
+            self.store.update_village(job_id, giscode, status=DONE, found=counts['found'], failed=counts['missed'])
+
+    @staticmethod
+    def _processed(village):
+        if village['status'] == DONE:
+            return village['total'] or 0
+        return village['found'] + village['not_found'] + village['failed'] + village['skipped']
+
+    def job(self, job_id, villages=False):
+        """
+        Status of a job: its state, plot counters, rate (plots per second
+        in the current run), ETA in seconds, the village being crawled and
+        the villages that reported errors. With villages, every village's
+        row is included.
+        """
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+        rows = self.store.villages(job_id)
+        listed = [v for v in rows if v['total'] is not None]
+        plots = {
+            'total': sum(v['total'] for v in listed),
+            'processed': sum(self._processed(v) for v in rows),
+        }
+        for name in ('found', 'not_found', 'failed', 'skipped'):
+            plots[name] = sum(v[name] for v in rows)
+        job['villages'] = {
+            'total': len(rows),
+            'done': sum(1 for v in rows if v['status'] == DONE),
+            'failed': sum(1 for v in rows if v['status'] == FAILED),
+        }
+        job['plots'] = plots
+        job['current'] = next((v['giscode'] for v in rows if v['status'] == RUNNING), None)
+        job['errors'] = [{'giscode': v['giscode'], 'error': v['error']} for v in rows if v['error']]
+
+        job['rate'] = job['eta'] = None
+        live = self._live.get(job_id)
+        if job['status'] == RUNNING and live:
+            elapsed = time.time() - live[0]
+            if elapsed > 0:
+                job['rate'] = round((plots['processed'] - live[1]) / elapsed, 2)
+            if job['rate'] and listed:
+                # Villages whose plot list is not fetched yet count as average-sized
+                expected = plots['total'] + (len(rows) - len(listed)) * plots['total'] / len(listed)
+                job['eta'] = round(max(0, expected - plots['processed']) / job['rate'])
+        if villages:
+            job['village_list'] = rows
+        return job
+
+    def jobs(self):
+        return [self.job(job_id) for job_id in self.store.ids()]
+
+
+def print_job(job):
+    plots = job['plots']
+    line = (f"Job {job['id']} [{job['status']}] {', '.join(job['targets'])}: "
+            f"villages {job['villages']['done']}/{job['villages']['total']}, "
+            f"plots {plots['processed']}/{plots['total']} ({plots['found']} found, "
+            f"{plots['not_found']} not found, {plots['failed']} failed, {plots['skipped']} skipped)")
+    if job['rate'] is not None:
+        line += f", {job['rate']} plots/s"
+    if job['eta'] is not None:
+        line += f", ETA {job['eta'] // 60} min"
+    print(line, flush=True)
+    for error in job['errors']:
+        print(f"  {error['giscode']}: {error['error']}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Queue and run resumable plot crawls of villages, talukas and districts.")
+    parser.add_argument("--jobs", default=DEFAULT_JOBS_FILE, help=f"Job database. Default: {DEFAULT_JOBS_FILE}")
+    commands = parser.add_subparsers(dest="command", required=True)
+    submit = commands.add_parser("submit", help="Queue a job")
+    submit.add_argument("targets", nargs="+",
+                        help="District (RVM25), taluka (RVM2502) or village (RVM2502272500020303690000) GIS codes")
+    submit.add_argument("--force", action="store_true", help="Retry plots held in the negative cache")
+    commands.add_parser("run", help="Run queued and interrupted jobs in the foreground (Ctrl-C stops, run again to resume)")
+    commands.add_parser("list", help="Show all jobs")
+    for name in ("pause", "resume", "cancel"):
+        commands.add_parser(name, help=f"{name.capitalize()} a job").add_argument("id", type=int)
+    args = parser.parse_args()
+
+    store = JobStore(args.jobs)
+    if args.command == "list":
+        for job_id in store.ids():
+            print_job(CrawlJobManager(None, store, autostart=False).job(job_id))
+        return
+    if args.command in ("pause", "resume", "cancel"):
+        # A running job stops at the next heartbeat of the process running it
+        job = getattr(CrawlJobManager(None, store, autostart=False), args.command)(args.id)
+        if job:
+            print_job(job)
+        else:
+            print(f"No job {args.id}")
+        return
+
+    from mahabhumi_scraper import MahabhumiScraper
+    manager = CrawlJobManager(MahabhumiScraper(), store, autostart=False)
+    if args.command == "submit":
+        print_job(manager.submit(args.targets, args.force))
+        return
+    try:
+        manager.run_pending()
+    except KeyboardInterrupt:
+        print("\nInterrupted; progress is saved. Run again to resume.", flush=True)
+    for job_id in store.ids():
+        print_job(manager.job(job_id))
+
+
+if __name__ == "__main__":
+    main()
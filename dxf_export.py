@@ -0,0 +1,323 @@
+import io
+import time
+import zipfile
+
+import ezdxf
+import numpy as np
+
+import geometry
+import topology
+
+# Same layer layout as /api/download_dxf
+LAYERS = [
+    ('PLOT_BOUNDARIES', 1),    # Red
+    ('COORDINATE_LABELS', 2),  # Yellow
+    ('PLOT_NUMBERS', 3),       # Green
+    ('METADATA', 4),           # Cyan
+]
+# Backdrop image size limit, in pixels along the longer side
+BACKDROP_MAX_PX = 2048
+
+
+def new_document():
+    """Creates an R2010 document with the export header settings and layers."""
+    doc = ezdxf.new('R2010')
+    # Point style: circle with cross, 1 map unit (metre) across
+    doc.header['$PDMODE'] = 35
+    doc.header['$PDSIZE'] = 1.0
+    for name, color in LAYERS:
+        doc.layers.new(name=name, dxfattribs={'color': color})
+    return doc
+
+
+def text_height(extent):
+    """Plot number text height: 0.2% of the larger side of the drawing extent."""
+    if extent is None:
+        return 0.1
+    min_x, min_y, max_x, max_y = extent
+    size = max(max_x - min_x, max_y - min_y)
+    return size * 0.002 if size > 0 else 0.1
+
+
+def add_plot(msp, label, geom, text_h):
+    """
+    Adds one plot: a boundary polyline per ring, the plot number at the ring's
+    vertex centroid and a POINT at every vertex, as download_dxf does.
+    """
+    for ring in geometry.rings(geom):
+        if len(ring) < 2:
+            continue
+        pts = [tuple(p) for p in ring.tolist()]
+        closed = pts if pts[0] == pts[-1] else pts + [pts[0]]
+        msp.add_lwpolyline(closed, format='xy', dxfattribs={'layer': 'PLOT_BOUNDARIES'})
+
+        cx, cy = ring.mean(axis=0)
+        msp.add_text(label, dxfattribs={
+            'height': text_h * 0.8,
+            'insert': (float(cx), float(cy)),
+            'layer': 'PLOT_NUMBERS',
+            'color': 3
+        })
+        for x, y in pts:
+            msp.add_point((x, y), dxfattribs={'layer': 'COORDINATE_LABELS'})
+
+
+def backdrop_bbox(extent, padding=0.05):
+    """Padded bbox and pixel size of the WMS image placed under the plots."""
+    min_x, min_y, max_x, max_y = extent
+    width = max_x - min_x
+    height = max_y - min_y
+    bbox = [min_x - width * padding, min_y - height * padding, max_x + width * padding, max_y + height * padding]
+    img_w = BACKDROP_MAX_PX
+    img_h = int(img_w * (height / width)) if width else BACKDROP_MAX_PX
+    if img_h > BACKDROP_MAX_PX:
+        img_h = BACKDROP_MAX_PX
+        img_w = int(img_h * (width / height))
+    return bbox, max(img_w, 1), max(img_h, 1)
+
+
+def add_backdrop(msp, bbox, img_w, img_h, filename='village_map.png'):
+    """References the WMS image (shipped next to the DXF) on the MAP_IMAGE layer."""
+    image_def = msp.doc.add_image_def(filename=filename, size_in_pixel=(img_w, img_h))
+    msp.add_image(
+        insert=(bbox[0], bbox[1]),
+        size_in_units=(bbox[2] - bbox[0], bbox[3] - bbox[1]),
+        image_def=image_def,
+        rotation=0,
+        dxfattribs={'layer': 'MAP_IMAGE'}
+    )
+
+
+def build_document(plots):
+    """
+    Builds the export document from [(label, Geometry)]. Returns (doc, extent),
+    extent being None if no plot had any coordinates.
+    """
+    plots = [(label, geom) for label, geom in plots if len(geom.coords)]
+    extent = geometry.union_bounds(geom for _, geom in plots)
+    doc = new_document()
+    msp = doc.modelspace()
+    text_h = text_height(extent)
+    for label, geom in plots:
+        add_plot(msp, label, geom, text_h)
+    return doc, extent
+
+
+# Streaming export (stream_document): the document is written by ezdxf
+# without plots, then split at the end of its ENTITIES section and the plot
+# entities are emitted as raw DXF tags in between. Entity handles come from
+# a block reserved by advancing the document's handle seed before writing.
+HANDLE_RESERVE = 0x100000000
+CHUNK_CHARS = 256 * 1024
+
+
+def plots_extent(geoms):
+    """Bounding box of several geometries without concatenating their coordinates."""
+    extent = None
+    for geom in geoms:
+        b = geometry.bounds(geom)
+        if b is None:
+            continue
+        if extent is None:
+            extent = b
+        else:
+            extent = (min(extent[0], b[0]), min(extent[1], b[1]), max(extent[2], b[2]), max(extent[3], b[3]))
+    return extent
+
+
+def _split_template(doc):
+    """Writes doc and returns (text before ENTITIES' ENDSEC, text from it on)."""
+    stream = io.StringIO()
+    doc.write(stream)
+    text = stream.getvalue()
+    start = text.index("  2\nENTITIES\n")
+    end = text.index("  0\nENDSEC\n", start)
+    return text[:end], text[end:]
+
+
+def _polyline_tags(pts, owner, handles):
+    return (f"  0\nLWPOLYLINE\n  5\n{next(handles):X}\n330\n{owner}\n100\nAcDbEntity\n"
+            f"  8\nPLOT_BOUNDARIES\n100\nAcDbPolyline\n 90\n{len(pts)}\n 70\n0\n"
+            + "".join(f" 10\n{x!r}\n 20\n{y!r}\n" for x, y in pts))
+
+
+def _label_tags(label, x, y, text_h, owner, handles):
+    return (f"  0\nTEXT\n  5\n{next(handles):X}\n330\n{owner}\n100\nAcDbEntity\n"
+            f"  8\nPLOT_NUMBERS\n 62\n3\n100\nAcDbText\n"
+            f" 10\n{x!r}\n 20\n{y!r}\n 30\n0.0\n 40\n{text_h * 0.8!r}\n"
+            f"  1\n{label}\n100\nAcDbText\n")
+
+
+def _vertex_tags(pts, owner, handles, coordinate_labels):
+    out = "".join(
+        f"  0\nPOINT\n  5\n{next(handles):X}\n330\n{owner}\n100\nAcDbEntity\n"
+        f"  8\nCOORDINATE_LABELS\n100\nAcDbPoint\n 10\n{x!r}\n 20\n{y!r}\n 30\n0.0\n"
+        for x, y in pts)
+    if coordinate_labels:
+        # Small, faint labels offset from the vertex, as in generate_sample_dxf
+        out += "".join(
+            f"  0\nTEXT\n  5\n{next(handles):X}\n330\n{owner}\n100\nAcDbEntity\n"
+            f"  8\nCOORDINATE_LABELS\n 62\n252\n100\nAcDbText\n"
+            f" 10\n{x + 0.2!r}\n 20\n{y + 0.2!r}\n 30\n0.0\n 40\n0.2\n"
+            f"  1\n{x:.2f},{y:.2f}\n100\nAcDbText\n"
+            for x, y in pts)
+    return out
+
+
+def _clean_label(label):
+    return str(label).replace("\n", " ")
+
+
+def _plot_tags(label, geom, text_h, owner, handles, coordinate_labels=False):
+    """
+    Raw DXF tags of one plot, the same entities add_plot creates, plus an
+    "x,y" TEXT next to every vertex when coordinate_labels is set.
+    """
+    out = []
+    for ring in geometry.rings(geom):
+        if len(ring) < 2:
+            continue
+        pts = ring.tolist()
+        out.append(_polyline_tags(pts if pts[0] == pts[-1] else pts + [pts[0]], owner, handles))
+        cx, cy = ring.mean(axis=0)
+        out.append(_label_tags(label, float(cx), float(cy), text_h, owner, handles))
+        out.append(_vertex_tags(pts, owner, handles, coordinate_labels))
+    return "".join(out)
+
+
+def document_parts(backdrop=None, reserve=HANDLE_RESERVE):
+    """
+    Returns (head, tail, owner, first_handle) for a streamed document: plot
+    entities go between head and tail, owned by `owner` (the modelspace),
+    with handles from first_handle up to first_handle + reserve.
+    """
+    doc = new_document()
+    msp = doc.modelspace()
+    if backdrop is not None:
+        add_backdrop(msp, *backdrop)
+    owner = msp.block_record.dxf.handle
+    first = int(doc.entitydb.handles.next(), 16)
+    doc.entitydb.handles.reset(f"{first + reserve:X}")
+    head, tail = _split_template(doc)
+    return head, tail, owner, first
+
+
+def _handles(first_handle, limit):
+    """
+    Entity handles from first_handle on. Asking for more than `limit` raises
+    ValueError, before the entity that would overflow is written.
+    """
+    yield from range(first_handle, first_handle + limit)
+    raise ValueError("too many entities for one DXF export")
+
+
+def entity_chunks(plots, text_h, owner, first_handle, coordinate_labels=False, limit=HANDLE_RESERVE):
+    """
+    Yields the plot entities of `plots` ([(label, Geometry)], any iterable)
+    as DXF text in chunks of about CHUNK_CHARS, using handles from
+    first_handle on. At most `limit` handles are used.
+    """
+    handles = _handles(first_handle, limit)
+    pending = []
+    size = 0
+    for label, geom in plots:
+        tags = _plot_tags(_clean_label(label), geom, text_h, owner, handles, coordinate_labels)
+        pending.append(tags)
+        size += len(tags)
+        if size >= CHUNK_CHARS:
+            yield "".join(pending)
+            pending = []
+            size = 0
+    yield "".join(pending)
+
+
+def stream_document(plots, extent, backdrop=None, coordinate_labels=False):
+    """
+    Yields the DXF text of an export in chunks, emitting plot entities as
+    `plots` ([(label, Geometry)], any iterable) is consumed, so memory does
+    not grow with the number of plots. extent sizes the plot number text;
+    backdrop is an optional (bbox, img_w, img_h) for add_backdrop.
+    """
+    head, tail, owner, first = document_parts(backdrop)
+    yield head
+    yield from entity_chunks(plots, text_height(extent), owner, first, coordinate_labels)
+    yield tail
+
+
+def topology_chunks(topo, text_h, owner, first_handle, coordinate_labels=False, limit=HANDLE_RESERVE):
+    """
+    Yields the entities of a topology.Topology as DXF text: one polyline per
+    shared arc, one POINT per unique vertex and one plot number per ring,
+    so boundaries shared by neighbouring plots are drawn once. At most
+    `limit` handles are used.
+    """
+    handles = _handles(first_handle, limit)
+    out = []
+    for arc in topo.arcs:
+        out.append(_polyline_tags(topo.vertices[arc].tolist(), owner, handles))
+    yield "".join(out)
+
+    used = np.unique(topo.edges) if len(topo.edges) else np.empty(0, dtype=np.int64)
+    pts = topo.vertices[used].tolist()
+    for i in range(0, len(pts), 10000):
+        yield _vertex_tags(pts[i:i + 10000], owner, handles, coordinate_labels)
+
+    out = []
+    for label, rings in topo.plots:
+        for arc_refs in rings:
+            cx, cy = topology.ring_coords(topo, arc_refs)[:-1].mean(axis=0)
+            out.append(_label_tags(_clean_label(label), float(cx), float(cy), text_h, owner, handles))
+    yield "".join(out)
+
+
+def stream_topology_document(topo, extent, backdrop=None, coordinate_labels=False):
+    """stream_document for a topology-aware export (see topology_chunks)."""
+    head, tail, owner, first = document_parts(backdrop)
+    yield head
+    yield from topology_chunks(topo, text_height(extent), owner, first, coordinate_labels)
+    yield tail
+
+
+class _ZipSink(io.RawIOBase):
+    """Write-only, non-seekable target that hands zipfile's output to a generator."""
+
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(members):
+    """
+    Yields a ZIP archive as it is produced. members is an iterable of
+    (name, chunks, compress_type); chunks is an iterable of str or bytes,
+    consumed lazily. Entries use data descriptors and ZIP64, so no sizes
+    are needed up front.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, 'w') as zf:
+        for name, chunks, compress_type in members:
+            info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+            info.compress_type = compress_type
+            with zf.open(info, 'w', force_zip64=True) as f:
+                for chunk in chunks:
+                    f.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+    yield sink.drain()
@@ -1,8 +1,9 @@
 import os
 import json
 import ezdxf
-import re
 import math
+import geometry
+from plot_store import PlotStore, DEFAULT_STORE_FILE, LEGACY_CACHE_FILE
 
 OUTPUT_FILE = "mahabhumi_all_plots.dxf"
 
@@ -11,24 +12,7 @@ def parse_wkt_rings(wkt):
     Parses WKT (MULTIPOLYGON/POLYGON) and returns a list of rings.
     Each ring is a list of (x, y) tuples.
     """
-    matches = re.findall(r'\(([\d\.\s,]+)\)', wkt)
-    
-    rings = []
-    for m in matches:
-        pairs = m.strip().split(',')
-        ring_coords = []
-        for pair in pairs:
-            parts = pair.strip().split()
-            if len(parts) >= 2:
-                try:
-                    x = float(parts[0])
-                    y = float(parts[1])
-                    ring_coords.append((x, y))
-                except:
-                    pass
-        if ring_coords:
-            rings.append(ring_coords)
-    return rings
+    return [[tuple(pt) for pt in ring.tolist()] for ring in geometry.rings(geometry.parse_wkt_cached(wkt))]
 
 def calculate_polygon_properties(coords):
     """
@@ -77,17 +61,18 @@ def calculate_polygon_properties(coords):
     return (cx, cy), width, height
 
 def generate_dxf():
-    # Get all plots from single cache file
-    cache_file = "cache/all_plots.json"
-    if not os.path.exists(cache_file):
-        print(f"Cache file {cache_file} not found.")
-        return
-
+    # Get all plots from the plot store
     try:
-        with open(cache_file, 'r') as f:
-            plots_data = json.load(f)
+        store = PlotStore(DEFAULT_STORE_FILE)
+        # Pick up an old all_plots.json that was never migrated
+        store.migrate_json(LEGACY_CACHE_FILE)
+        plots_data = list(store.iter_plots())
     except Exception as e:
-        print(f"Error reading cache file: {e}")
+        print(f"Error reading plot store: {e}")
+        return
+
+    if not plots_data:
+        print(f"Plot store {DEFAULT_STORE_FILE} is empty.")
         return
 
     print(f"Processing {len(plots_data)} plots from cache...")
@@ -108,12 +93,12 @@ def generate_dxf():
     for data in plots_data:
         try:
             plot_no = data.get('plotno', 'Unknown')
-            wkt = data.get('the_geom', '')
-            
-            if not wkt:
+            if 'the_geom' not in data:
                 continue
                 
-            rings = parse_wkt_rings(wkt)
+            # Decoded straight from the store's packed geometry, no WKT round trip
+            rings = [[tuple(pt) for pt in ring.tolist()]
+                     for ring in geometry.rings(geometry.plot_geometry(data))]
             
             if not rings:
                 continue
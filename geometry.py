@@ -0,0 +1,258 @@
+import re
+import struct
+import warnings
+import zlib
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+# One parsed POLYGON/MULTIPOLYGON:
+#   coords        (N, 2) float64 array of every vertex, ring after ring
+#   ring_offsets  (R + 1,) indices into coords where each ring starts (last = N)
+#   part_offsets  (P + 1,) indices into rings where each polygon starts (last = R)
+#   multi         True if it was a MULTIPOLYGON (even one with a single part)
+Geometry = namedtuple('Geometry', ['coords', 'ring_offsets', 'part_offsets', 'multi'], defaults=(False,))
+
+# Innermost parentheses hold one ring's coordinate list
+_RING_RE = re.compile(r'\(([^()]*)\)')
+
+# np.fromstring only warns when it hits a bad token; _parse_numbers checks the length instead
+warnings.filterwarnings("ignore", message="string or file could not be read to its end",
+                        category=DeprecationWarning)
+
+
+def _frozen(array):
+    array.flags.writeable = False
+    return array
+
+
+EMPTY = Geometry(
+    _frozen(np.empty((0, 2), dtype=np.float64)),
+    _frozen(np.zeros(1, dtype=np.int64)),
+    _frozen(np.zeros(1, dtype=np.int64)),
+)
+
+
+def _parse_numbers(text, expected_points):
+    """Converts whitespace-separated numbers to a float64 array in one C-level pass."""
+    values = np.fromstring(text, dtype=np.float64, sep=' ')
+    if len(values) < 2 * expected_points or len(values) % expected_points:
+        # fromstring stops silently at a bad token; this path raises a clear ValueError
+        values = np.array(text.split(), dtype=np.float64)
+    return values
+
+
+def parse_wkt(wkt):
+    """
+    Parses a WKT POLYGON or MULTIPOLYGON into a Geometry of contiguous arrays.
+    Z/M ordinates, if any, are dropped.
+    """
+    if not wkt:
+        return EMPTY
+
+    ring_texts = []
+    part_starts = []
+    prev_end = None
+    for match in _RING_RE.finditer(wkt):
+        # Consecutive rings of one polygon are separated by ", "; a new
+        # polygon of a MULTIPOLYGON starts after a closing ")" instead
+        if prev_end is None or ')' in wkt[prev_end:match.start()]:
+            part_starts.append(len(ring_texts))
+        ring_texts.append(match.group(1))
+        prev_end = match.end()
+
+    if not ring_texts:
+        return EMPTY
+
+    counts = np.fromiter((t.count(',') + 1 for t in ring_texts), dtype=np.int64, count=len(ring_texts))
+    total = int(counts.sum())
+    values = _parse_numbers(','.join(ring_texts).replace(',', ' '), total)
+    dims = len(values) // total
+    coords = values.reshape(-1, dims)[:, :2] if dims > 2 else values.reshape(-1, 2)
+
+    ring_offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=ring_offsets[1:])
+    part_offsets = np.array(part_starts + [len(ring_texts)], dtype=np.int64)
+
+    return Geometry(
+        _frozen(np.ascontiguousarray(coords)),
+        _frozen(ring_offsets),
+        _frozen(part_offsets),
+        wkt.lstrip()[:5].upper() == "MULTI",
+    )
+
+
+@lru_cache(maxsize=16384)
+def parse_wkt_cached(wkt):
+    """parse_wkt with the result cached by geometry string, i.e. once per plot."""
+    return parse_wkt(wkt)
+
+
+def plot_geometry(plot):
+    """
+    Returns the (cached) parsed geometry of a cached plot record. Records
+    loaded from the plot store are decoded from their packed blob without
+    going through WKT.
+    """
+    blob = getattr(plot, 'geom_blob', None)
+    if blob is not None:
+        return unpack_cached(blob)
+    return parse_wkt_cached(plot.get('the_geom') or '')
+
+
+def rings(geom):
+    """Splits a Geometry into a list of (n, 2) arrays, one per ring (views, no copies)."""
+    offsets = geom.ring_offsets
+    return [geom.coords[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+
+
+def bounds(geom):
+    """Returns (min_x, min_y, max_x, max_y), or None for an empty geometry."""
+    if len(geom.coords) == 0:
+        return None
+    min_x, min_y = geom.coords.min(axis=0)
+    max_x, max_y = geom.coords.max(axis=0)
+    return float(min_x), float(min_y), float(max_x), float(max_y)
+
+
+def contains_point(geom, x, y):
+    """
+    True if (x, y) lies inside the geometry, by the even-odd rule over all
+    rings at once (so holes are excluded). Points on an edge may go either way.
+    """
+    coords = geom.coords
+    if len(coords) < 2:
+        return False
+    a, b = coords[:-1], coords[1:]
+    # Segments joining the last vertex of one ring to the first of the next
+    valid = np.ones(len(a), dtype=bool)
+    valid[np.asarray(geom.ring_offsets[1:-1]) - 1] = False
+    ay, by = a[:, 1], b[:, 1]
+    crosses = valid & ((ay > y) != (by > y))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_cross = a[:, 0] + (y - ay) * (b[:, 0] - a[:, 0]) / (by - ay)
+    return bool(np.count_nonzero(crosses & (x < x_cross)) % 2)
+
+
+def union_bounds(geoms):
+    """Returns the bounding box of several geometries, or None if all are empty."""
+    coords = [g.coords for g in geoms if len(g.coords)]
+    if not coords:
+        return None
+    return bounds(Geometry(np.concatenate(coords), None, None))
+
+
+def _number(value):
+    """Shortest text that parses back to the same float, without a trailing ".0"."""
+    text = repr(value)
+    return text[:-2] if text.endswith(".0") else text
+
+
+def to_wkt(geom):
+    """
+    Serializes a Geometry back to WKT, as the POLYGON or MULTIPOLYGON it was
+    parsed from. Coordinates keep every digit of the float; separators are
+    written without spaces ("x y,x y"), so WKT that had spaces after its
+    commas comes back with the same numbers but not byte for byte.
+    """
+    if len(geom.coords) == 0:
+        return "POLYGON EMPTY"
+    ring_list = rings(geom)
+    polygons = []
+    for p in range(len(geom.part_offsets) - 1):
+        parts = ring_list[geom.part_offsets[p]:geom.part_offsets[p + 1]]
+        polygons.append(",".join(
+            "(" + ",".join(f"{_number(x)} {_number(y)}" for x, y in ring.tolist()) + ")" for ring in parts))
+    if len(polygons) == 1 and not geom.multi:
+        return f"POLYGON({polygons[0]})"
+    return "MULTIPOLYGON(" + ",".join(f"({p})" for p in polygons) + ")"
+
+
+# Binary form used by the plot store (see pack/unpack):
+#   header  <BBIII  flags, decimals, parts, rings, coordinates
+#   body    zlib of int32 part offsets, int32 ring offsets, then coordinates
+#           either as delta-encoded fixed-point integers (exact for the
+#           decimals the survey data actually has) or as raw float64
+_HEADER = struct.Struct('<BBIII')
+_QUANTIZED = 0x01
+_DELTA32 = 0x02
+_MULTI = 0x04
+_MAX_DECIMALS = 9
+
+
+def _decimals_for(coords):
+    """Smallest number of decimals that reproduces coords exactly, or None."""
+    if len(coords) == 0:
+        return 0
+    magnitude = float(np.abs(coords).max())
+    for decimals in range(_MAX_DECIMALS + 1):
+        scale = 10.0 ** decimals
+        if magnitude * scale >= 2 ** 53:
+            return None
+        if np.array_equal(np.round(coords * scale) / scale, coords):
+            return decimals
+    return None
+
+
+def pack(geom):
+    """
+    Encodes a Geometry as compact bytes. Lossless: unpack() returns the
+    same float64 values.
+    """
+    coords = geom.coords
+    flags = _MULTI if geom.multi else 0
+    decimals = _decimals_for(coords)
+    if decimals is None:
+        payload = np.ascontiguousarray(coords, dtype='<f8').tobytes()
+        decimals = 0
+    else:
+        flags |= _QUANTIZED
+        fixed = np.round(coords * 10.0 ** decimals).astype(np.int64)
+        # First vertex absolute, every other one relative to its predecessor
+        origin = fixed[:1] if len(fixed) else np.zeros((1, 2), dtype=np.int64)
+        deltas = np.diff(fixed, axis=0)
+        if np.abs(deltas).max(initial=0) < 2 ** 31:
+            flags |= _DELTA32
+            payload = origin.astype('<i8').tobytes() + deltas.astype('<i4').tobytes()
+        else:
+            payload = origin.astype('<i8').tobytes() + deltas.astype('<i8').tobytes()
+
+    body = (np.asarray(geom.part_offsets, dtype='<i4').tobytes()
+            + np.asarray(geom.ring_offsets, dtype='<i4').tobytes()
+            + payload)
+    header = _HEADER.pack(flags, decimals, len(geom.part_offsets) - 1,
+                          len(geom.ring_offsets) - 1, len(coords))
+    return header + zlib.compress(body, 6)
+
+
+def unpack(blob):
+    """Decodes bytes produced by pack() back into a Geometry."""
+    flags, decimals, n_parts, n_rings, n_coords = _HEADER.unpack_from(blob)
+    body = zlib.decompress(blob[_HEADER.size:])
+    part_offsets = np.frombuffer(body, dtype='<i4', count=n_parts + 1).astype(np.int64)
+    offset = 4 * (n_parts + 1)
+    ring_offsets = np.frombuffer(body, dtype='<i4', count=n_rings + 1, offset=offset).astype(np.int64)
+    offset += 4 * (n_rings + 1)
+
+    if flags & _QUANTIZED:
+        origin = np.frombuffer(body, dtype='<i8', count=2, offset=offset)
+        dtype = '<i4' if flags & _DELTA32 else '<i8'
+        deltas = np.frombuffer(body, dtype=dtype, count=2 * max(n_coords - 1, 0), offset=offset + 16)
+        fixed = np.empty((n_coords, 2), dtype=np.int64)
+        if n_coords:
+            fixed[0] = origin
+            np.cumsum(deltas.reshape(-1, 2), axis=0, out=fixed[1:])
+            fixed[1:] += origin
+        coords = fixed / 10.0 ** decimals
+    else:
+        coords = np.frombuffer(body, dtype='<f8', count=2 * n_coords, offset=offset).astype(np.float64)
+        coords = coords.reshape(-1, 2)
+
+    return Geometry(_frozen(coords), _frozen(ring_offsets), _frozen(part_offsets), bool(flags & _MULTI))
+
+
+@lru_cache(maxsize=16384)
+def unpack_cached(blob):
+    """unpack with the result cached by blob, i.e. once per stored plot."""
+    return unpack(blob)
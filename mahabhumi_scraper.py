@@ -1,14 +1,41 @@
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import time
 import os
 import hashlib
+import re
 import threading
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from plot_store import PlotStore, PlotCache, DEFAULT_STORE_FILE, LEGACY_CACHE_FILE, parse_info
+import rate_control
+from rate_control import AdaptiveLimiter
+from singleflight import SingleFlight
+from spatial_index import SpatialIndex
+from search_index import SearchIndex, DEFAULT_SEARCH_FILE
+import geometry
+import ttl_cache
+from ttl_cache import TTLCache, DEFAULT_LISTS_FILE
 
 class MahabhumiScraper:
     BASE_URL = "https://mahabhunakasha.mahabhumi.gov.in/rest"
-    CACHE_FILE = "cache/all_plots.json"
+    CACHE_FILE = LEGACY_CACHE_FILE
+    STORE_FILE = DEFAULT_STORE_FILE
+    POOL_MAXSIZE = 64
+    # District/taluka/village lists and plot lists rarely change
+    LISTS_FILE = DEFAULT_LISTS_FILE
+    LIST_TTL = 7 * 86400
+    LIST_STALE_TTL = 90 * 86400
+    # Inverted index over plot numbers and owner records
+    SEARCH_FILE = DEFAULT_SEARCH_FILE
+    # Negative cache: how long to skip plots that returned no geometry,
+    # and plots whose fetch failed after all retries
+    NOT_FOUND_TTL = 30 * 86400
+    FAILURE_TTL = 3600
+    
+    # Shared by all scrapers (and the async engine) in the process so every
+    # upstream call feeds one controller
+    limiter = AdaptiveLimiter(initial=8, max_limit=256)
     
     def __init__(self, auto_save=True):
         self.auto_save = auto_save
@@ -20,70 +47,267 @@ class MahabhumiScraper:
             "Referer": "https://mahabhunakasha.mahabhumi.gov.in/27/index.html",
             "X-Requested-With": "XMLHttpRequest"
         })
-        # Ensure cache directory exists for the single file
-        cache_dir = os.path.dirname(self.CACHE_FILE)
-        if not os.path.exists(cache_dir):
-            os.makedirs(cache_dir, exist_ok=True)
-            
+        # urllib3 keeps only 10 connections per host by default, fewer than the
+        # crawl thread pool; size it so workers don't discard connections
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.POOL_MAXSIZE)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # Persistent plot store (SQLite); creates the cache directory if needed
+        self.store = PlotStore(self.STORE_FILE)
+
         # Initialize Cache
         self.cache_lock = threading.Lock()
         self.plot_cache = self._load_cache()
 
+        # Coalesces concurrent identical upstream requests
+        self.inflight = SingleFlight()
+        self.last_crawl_summary = None
+
+        # Persistent cache for hierarchy dropdowns and plot lists
+        self.list_cache = TTLCache(self.LISTS_FILE, ttl=self.LIST_TTL, stale_ttl=self.LIST_STALE_TTL)
+
+        # Bounding-box index over all cached plots, built on first spatial
+        # query and caught up with the store's writes since _spatial_mark
+        self._spatial_index = None
+        self._spatial_mark = 0
+
+        # Persistent text index; brought up to date with plot_cache on the
+        # first search, then with the store's writes since _search_mark and
+        # the unsaved plots cached here (None = not synced yet)
+        self.search_index = SearchIndex(self.SEARCH_FILE)
+        self._search_lock = threading.Lock()
+        self._search_mark = None
+        self._unsearchable_keys = set()
+
     def _load_cache(self):
-        """Loads the single cache file into a dictionary for O(1) access."""
-        if os.path.exists(self.CACHE_FILE):
-            try:
-                with open(self.CACHE_FILE, 'r') as f:
-                    data = json.load(f)
-                    # Convert list to dict keyed by unique ID
-                    cache_dict = {}
-                    for plot in data:
-                        # Assuming 'giscode' and 'plotno' are in the saved data
-                        # If not (legacy), we might need to reconstruct or skip
-                        # For now, we'll use a composite key if available, or just skip
-                        if 'giscode' in plot and 'plotno' in plot:
-                            key = f"{plot['giscode']}_{plot['plotno']}"
-                            cache_dict[key] = plot
-                    return cache_dict
-            except Exception as e:
-                print(f"Error loading cache: {e}")
-                return {}
-        return {}
+        """
+        Opens the plot cache. It reads through to the plot store rather than
+        loading it, so every process sharing the store sees the same plots.
+        """
+        try:
+            # One-time import of the old single-file JSON cache
+            self.store.migrate_json(self.CACHE_FILE)
+            # Stores written before geometries were packed are converted once
+            self.store.pack_geometries()
+        except Exception as e:
+            print(f"Error loading cache: {e}")
+        return PlotCache(self.store)
 
-    def save_cache(self):
-        """Saves the cache dictionary as a JSON array."""
+    def _index_plot(self, record):
+        """Adds a cached plot to the spatial index once built."""
+        if self._spatial_index is not None:
+            extent = self._plot_bounds(record)
+            if extent is not None:
+                self._spatial_index.insert(f"{record['giscode']}_{record['plotno']}", extent)
+
+    @staticmethod
+    def _plot_bounds(record):
+        try:
+            return geometry.bounds(geometry.plot_geometry(record)) if 'the_geom' in record else None
+        except Exception as e:
+            print(f"Skipping plot {record.get('plotno')} in spatial index: {e}", flush=True)
+            return None
+
+    def spatial_index(self):
+        """
+        The SpatialIndex of every cached plot's bounding box, keyed like
+        plot_cache. Built on first use; plots cached afterwards, by this or
+        any other process sharing the store, are added on the next call.
+        """
         with self.cache_lock:
-            try:
-                # Convert dict values to list
-                plot_list = list(self.plot_cache.values())
-                with open(self.CACHE_FILE, 'w', encoding='utf-8') as f:
-                    json.dump(plot_list, f, indent=2, ensure_ascii=False)
-            except Exception as e:
-                print(f"Error saving cache: {e}")
+            if self._spatial_index is None:
+                start = time.time()
+                index = SpatialIndex()
+                self._spatial_mark = self.store.last_change()
+                items = ((key, self._plot_bounds(record)) for key, record in self.plot_cache.items())
+                index.bulk_insert((key, extent) for key, extent in items if extent is not None)
+                print(f"Spatial index: {len(index)} plots in {time.time() - start:.2f}s", flush=True)
+                self._spatial_index = index
+            else:
+                for rowid, record in self.store.iter_changed(self._spatial_mark):
+                    self._spatial_mark = rowid
+                    self._index_plot(record)
+            return self._spatial_index
+
+    def plots_in_bbox(self, bbox):
+        """Cached plot records whose bounding box intersects bbox (min_x, min_y, max_x, max_y)."""
+        keys = self.spatial_index().query(bbox)
+        records = self.plot_cache.get_many(keys)
+        return [records[key] for key in keys if key in records]
+
+    def plots_at(self, x, y):
+        """Cached plot records whose geometry contains the point (x, y)."""
+        keys = self.spatial_index().query_point(x, y)
+        records = self.plot_cache.get_many(keys)
+        found = []
+        for key in keys:
+            record = records.get(key)
+            if record is not None and geometry.contains_point(geometry.plot_geometry(record), x, y):
+                found.append(record)
+        return found
+
+    def _sync_search_index(self):
+        """
+        Indexes cached plots the search index lacks and drops plots no longer
+        cached. After the first full pass only the plots written to the store
+        since (by any process) and this process's unsaved plots are indexed.
+        """
+        with self._search_lock:
+            with self.cache_lock:
+                keys, self._unsearchable_keys = self._unsearchable_keys, set()
+            full = self._search_mark is None
+            if full:
+                self._search_mark = self.store.last_change()
+                cached = set(self.plot_cache)
+                indexed = self.search_index.keys()
+                self.search_index.remove(indexed - cached)
+                keys |= cached - indexed
+            else:
+                batch = []
+                for rowid, record in self.store.iter_changed(self._search_mark):
+                    self._search_mark = rowid
+                    batch.append(record)
+                    if len(batch) == 5000:
+                        self.search_index.add_many(batch)
+                        batch = []
+                self.search_index.add_many(batch)
+            if not keys:
+                return
+            start = time.time()
+            keys = sorted(keys)
+            for i in range(0, len(keys), 5000):
+                self.search_index.add_many(self.plot_cache.get_many(keys[i:i + 5000]).values())
+            if full:
+                print(f"Search index: added {len(keys)} plots in {time.time() - start:.2f}s", flush=True)
+
+    def search(self, query, giscode_prefix="", limit=50):
+        """
+        Cached plots whose plot number or owner records match query (see
+        SearchIndex.search), best first, as (record, hit) pairs.
+        """
+        self._sync_search_index()
+        results = []
+        for hit in self.search_index.search(query, giscode_prefix, limit):
+            record = self.plot_cache.get(hit['key'])
+            if record is not None:
+                results.append((record, hit))
+        return results
+
+    def lookup_cached(self, giscode, plot_nos):
+        """
+        Looks up plots of one village in the cache without hitting upstream.
+        Returns (found_records, missing_plot_nos).
+        """
+        village = self.plot_cache.get_many(f"{giscode}_{p}" for p in plot_nos)
+        found = []
+        missing = []
+        for plot_no in plot_nos:
+            record = village.get(f"{giscode}_{plot_no}")
+            if record is not None:
+                found.append(record)
+            else:
+                missing.append(plot_no)
+        return found, missing
+
+    def iter_cached_plots(self, giscode_prefix=""):
+        """
+        Yields cached plot records of every village whose GIS code starts with
+        giscode_prefix (e.g. a taluka's "RVM0527"), village by village.
+        """
+        for giscode in self.plot_cache.giscodes(giscode_prefix):
+            yield from self.plot_cache.village(giscode)
+
+    def save_cache(self):
+        """Writes plots fetched since the last save to the plot store."""
+        try:
+            self.plot_cache.save()
+        except Exception as e:
+            print(f"Error saving cache: {e}")
 
     def _post(self, url, data, headers=None, timeout=15):
         """
         Helper to handle the 302 cookie dance and ensure POST method is preserved.
+        Every call holds a slot of the shared adaptive limiter, at the calling
+        context's priority class, and reports its outcome to it.
         """
+        priority = rate_control.current_priority()
+        self.limiter.acquire(priority=priority)
+        start = time.monotonic()
+        outcome = rate_control.SERVER_ERROR
         try:
             # We don't allow automatic redirects because they often turn POST into GET (causing 405)
             response = self.session.post(url, data=data, headers=headers, timeout=timeout, allow_redirects=False)
+            challenged = response.status_code == 302
             
             # Handle the 302 cookie dance if necessary
-            if response.status_code == 302:
+            if challenged:
                 print(f"Cookie challenge (302) on {url.split('/')[-1]} detected, retrying...", flush=True)
                 response = self.session.post(url, data=data, headers=headers, timeout=timeout)
                 
+            outcome = rate_control.classify_status(response.status_code, challenged)
             response.raise_for_status()
             return response
+        except requests.exceptions.Timeout as e:
+            outcome = rate_control.TIMEOUT
+            print(f"POST Error to {url}: {e}", flush=True)
+            raise
         except Exception as e:
             print(f"POST Error to {url}: {e}", flush=True)
             raise
+        finally:
+            self.limiter.release(outcome, time.monotonic() - start, priority)
+
+    def _cached_list(self, key, fetch, refresh=False):
+        """
+        Serves a list from the TTL cache, fetching it upstream when missing or expired.
+        Stale entries are returned at once and refreshed in the background.
+        Concurrent fetches of the same key share one upstream request.
+        """
+        if not refresh:
+            value, state = self.list_cache.lookup(key)
+            if state == ttl_cache.FRESH:
+                return value
+            if state == ttl_cache.STALE:
+                self._revalidate_in_background(key, fetch)
+                return value
+        else:
+            value = None
+
+        fresh = self.inflight.do(key, fetch)
+        # Upstream errors come back as empty lists; never cache those
+        if fresh:
+            self.list_cache.set(key, fresh)
+            return fresh
+        return value if value is not None else fresh
+
+    def _revalidate_in_background(self, key, fetch):
+        call, is_leader = self.inflight.begin(key)
+        if not is_leader:
+            return  # a refresh (or foreground fetch) is already running
 
-    def _fetch_level(self, level, codes):
+        def refresh():
+            rate_control.set_priority(rate_control.PREFETCH)
+            result = None
+            try:
+                result = fetch()
+                if result:
+                    self.list_cache.set(key, result)
+            except Exception as e:
+                print(f"Background refresh of {key} failed: {e}", flush=True)
+            finally:
+                self.inflight.finish(key, call, result=result)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def _fetch_level(self, level, codes, refresh=False):
         """
         Generic method to fetch dropdown levels with 302 cookie handling.
+        Results are served from the persistent list cache when possible.
         """
+        return self._cached_list(f"level:{level}:{codes}",
+                                 lambda: self._request_level(level, codes), refresh)
+
+    def _request_level(self, level, codes):
         url = f"{self.BASE_URL}/VillageMapService/ListsAfterLevelGeoref"
         payload = {
             "state": "27",
@@ -102,7 +326,7 @@ class MahabhumiScraper:
             print(f"Error fetching level {level}: {e}", flush=True)
             return []
 
-    def fetch_districts(self, category='R'):
+    def fetch_districts(self, category='R', refresh=False):
         """
         Fetches the list of districts for a given category.
         Category: 'R' (Rural) or 'U' (Urban)
@@ -110,48 +334,121 @@ class MahabhumiScraper:
         print(f"Fetching Districts for Category: {category}...")
         # Level 1 request requires just the category code
         codes = f"{category}," 
-        data = self._fetch_level(1, codes)
+        data = self._fetch_level(1, codes, refresh)
         
         # The response is a list of lists. The first list contains the districts.
         if data and len(data) > 0:
             return data[0]
         return []
 
-    def fetch_talukas(self, district_code, category='R'):
+    def fetch_talukas(self, district_code, category='R', refresh=False):
         """
         Fetches talukas for a specific district.
         """
         print(f"Fetching Talukas for District: {district_code}...")
         # Level 2 requires "Category,DistrictCode,"
         codes = f"{category},{district_code},"
-        data = self._fetch_level(2, codes)
+        data = self._fetch_level(2, codes, refresh)
         
         if data and len(data) > 0:
             return data[0] # The API returns the list in the first element
         return []
 
-    def fetch_villages(self, district_code, taluka_code, category='R'):
+    def fetch_villages(self, district_code, taluka_code, category='R', refresh=False):
         """
         Fetches villages for a specific taluka.
         """
         print(f"Fetching Villages for Taluka: {taluka_code}...")
         # Level 3 requires "Category,DistrictCode,TalukaCode,"
         codes = f"{category},{district_code},{taluka_code},"
-        data = self._fetch_level(3, codes)
+        data = self._fetch_level(3, codes, refresh)
         
         if data and len(data) > 0:
             return data[0]
         return []
 
-    def get_plot_coordinates(self, giscode, plot_number):
+    def _process_plot_response(self, data):
+        """
+        Parses owner records and the report link out of a raw getPlotInfo response (in place).
+        """
+        if "the_geom" in data:
+            # Parse the 'info' string which contains Owner Name, Area, etc.
+            # Example format:
+            # Survey No. : 100\nTotal Area : 1.01\n...
+            data['parsed_records'] = parse_info(data.get("info"))
+
+        # Extract Report URL from infoLinks
+        if "infoLinks" in data and data["infoLinks"]:
+            # Example: <br><a target="bhumap" href="/api/report?..." >Map Report</a><br/>
+            # We want to extract the href value
+            match = re.search(r'href=["\']([^"\']+)["\']', data["infoLinks"])
+            if match:
+                raw_url = match.group(1)
+                # Ensure it points to our proxy
+                if "signplotreport" in raw_url:
+                    # Replace legacy paths with our API proxy
+                    raw_url = raw_url.replace("../signplotreport.jsp", "/api/report")
+                    raw_url = raw_url.replace("signplotreport.jsp", "/api/report")
+                    raw_url = raw_url.replace("signplotreportpublic.jsp", "/api/report")
+                data['report_url'] = raw_url
+
+            # Remove the raw HTML field to clean up cache
+            del data['infoLinks']
+        return data
+
+    def _cache_plot(self, giscode, plot_number, data):
+        """Adds a fetched plot to the cache and the indexes."""
+        # Add keys for cache reconstruction
+        data['giscode'] = giscode
+        data['plotno'] = plot_number
+
+        # Persist this plot immediately only if auto_save is True,
+        # otherwise keep it in memory for the next save_cache()
+        self.plot_cache.add(data, save=self.auto_save)
+        with self.cache_lock:
+            self._index_plot(data)
+            if not self.auto_save:
+                # Saved plots reach the search index through the store
+                self._unsearchable_keys.add(f"{giscode}_{plot_number}")
+
+    def _known_missing(self, giscode, plot_number):
+        """Returns the negative cache entry for a plot ('not_found' or 'failed'), or None."""
+        entry = self.store.get_missing(f"{giscode}_{plot_number}")
+        if entry:
+            print(f"Skipping plot {plot_number}: cached as {entry['kind']}", flush=True)
+        return entry
+
+    def _record_missing(self, giscode, plot_number, kind, error=None):
+        ttl = self.NOT_FOUND_TTL if kind == 'not_found' else self.FAILURE_TTL
+        try:
+            self.store.mark_missing(giscode, plot_number, kind, ttl, error)
+        except Exception as e:
+            print(f"Error recording missing plot {plot_number}: {e}", flush=True)
+
+    def get_plot_coordinates(self, giscode, plot_number, force=False):
         """
         Fetches geometry for a specific plot with local caching.
+        Plots recently found to have no geometry, or that kept failing, are
+        skipped until their negative cache entry expires, unless force is set.
         """
-        # Check memory cache first
+        # Check the cache first
         cache_key = f"{giscode}_{plot_number}"
-        if cache_key in self.plot_cache:
+        cached = self.plot_cache.get(cache_key)
+        if cached is not None:
             print(f"Loading plot {plot_number} from cache...", flush=True)
-            return self.plot_cache[cache_key]
+            return cached
+
+        if not force and self._known_missing(giscode, plot_number):
+            return None
+
+        # Concurrent callers for the same plot wait on one upstream request
+        return self.inflight.do(f"plot:{cache_key}", self._request_plot, giscode, plot_number)
+
+    def _request_plot(self, giscode, plot_number):
+        # A flight that finished between our cache check and now may have filled it
+        cached = self.plot_cache.get(f"{giscode}_{plot_number}")
+        if cached is not None:
+            return cached
 
         url = f"{self.BASE_URL}/MapInfo/getPlotInfo"
         params = {
@@ -162,6 +459,7 @@ class MahabhumiScraper:
         print(f"Fetching Plot Coordinates: {giscode} - {plot_number}...", flush=True)
         
         max_retries = 3
+        last_error = None
         for attempt in range(max_retries):
             try:
                 # Send POST request to fetch plot details
@@ -171,89 +469,46 @@ class MahabhumiScraper:
                 data = response.json()
                 if "the_geom" in data:
                     print(f"Plot {plot_number} Found!")
-                    # Parse the 'info' string which contains Owner Name, Area, etc.
-                    # Example format:
-                    # Survey No. : 100\nTotal Area : 1.01\n...
-                    if "info" in data and data["info"]:
-                        info_text = data["info"]
-                        parsed_records = []
-                    
-                    # Split by the separator line
-                    # Split by the separator line
-                    chunks = info_text.split('---------------------------------')
-                    
-                    for chunk in chunks:
-                        if not chunk.strip():
-                            continue
-                            
-                        record = {}
-                        lines = chunk.strip().split('\n')
-                        for line in lines:
-                            if ':' in line:
-                                key, val = line.split(':', 1)
-                                record[key.strip()] = val.strip()
-                        
-                        if record:
-                            parsed_records.append(record)
-                    
-                    data['parsed_records'] = parsed_records
-
-                # Extract Report URL from infoLinks
-                if "infoLinks" in data and data["infoLinks"]:
-                    # Example: <br><a target="bhumap" href="/api/report?..." >Map Report</a><br/>
-                    # We want to extract the href value
-                    import re
-                    match = re.search(r'href=["\']([^"\']+)["\']', data["infoLinks"])
-                    if match:
-                        raw_url = match.group(1)
-                        # Ensure it points to our proxy
-                        if "signplotreport" in raw_url:
-                             # Replace legacy paths with our API proxy
-                             raw_url = raw_url.replace("../signplotreport.jsp", "/api/report")
-                             raw_url = raw_url.replace("signplotreport.jsp", "/api/report")
-                             raw_url = raw_url.replace("signplotreportpublic.jsp", "/api/report")
-                        data['report_url'] = raw_url
-                    
-                    # Remove the raw HTML field to clean up cache
-                    del data['infoLinks']
-                    
+                self._process_plot_response(data)
+
                 # Save to cache if plot found
                 if data and "the_geom" in data:
-                    # Add keys for cache reconstruction
-                    data['giscode'] = giscode
-                    data['plotno'] = plot_number
-                    
-                    # Update memory cache
-                    with self.cache_lock:
-                        self.plot_cache[cache_key] = data
-                    
-                    # Persist to disk only if auto_save is True
-                    if self.auto_save:
-                        self.save_cache()
+                    self._cache_plot(giscode, plot_number, data)
+                else:
+                    self._record_missing(giscode, plot_number, 'not_found')
 
                 return data
             
-            except requests.exceptions.ReadTimeout:
+            except requests.exceptions.ReadTimeout as e:
                 print(f"Timeout fetching plot {plot_number} (Attempt {attempt+1}/{max_retries})", flush=True)
-                time.sleep(2) # Wait a bit before retrying
+                last_error = e
+                time.sleep(self.limiter.backoff_delay(attempt)) # Wait a bit before retrying
             except Exception as e:
                 print(f"Error fetching plot {plot_number} (Attempt {attempt+1}/{max_retries}): {e}", flush=True)
-                time.sleep(1)
+                last_error = e
+                time.sleep(self.limiter.backoff_delay(attempt))
             
         print(f"Failed to fetch plot {plot_number} after {max_retries} attempts.")
+        self._record_missing(giscode, plot_number, 'failed', repr(last_error))
         return None
 
-    def fetch_plot_list(self, district_code, taluka_code, village_code, category='R'):
+    def fetch_plot_list(self, district_code, taluka_code, village_code, category='R', refresh=False):
         """
         Fetches the list of available plot numbers for a village.
         """
-        url = f"{self.BASE_URL}/VillageMapService/kidelistFromGisCodeMH"
-        
         # Construct logedLevels (GIS Code for Village)
         # Format: RVM/UVM (3) + District(2) + Taluka(2) + VillageCode(18)
         prefix = "RVM" if category == 'R' else "UVM"
         gis_code = f"{prefix}{district_code}{taluka_code}{village_code}"
         
+        # Served from the list cache; every caller gets its own copy
+        # because callers sort the list in place
+        return list(self._cached_list(f"plots:{gis_code}",
+                                      lambda: self._request_plot_list(gis_code), refresh))
+
+    def _request_plot_list(self, gis_code):
+        url = f"{self.BASE_URL}/VillageMapService/kidelistFromGisCodeMH"
+        
         params = {
             "state": "27",
             "logedLevels": gis_code
@@ -276,56 +531,224 @@ class MahabhumiScraper:
             print(f"Error fetching plot list: {e}")
             return []
 
-    def fetch_village_boundaries(self, giscode, max_plots=9999, max_workers=20):
+    def prewarm_hierarchy(self, category='R', include_plot_lists=False, refresh=True, max_workers=8):
         """
-        Fetches geometries for all plots in a village (limited to max_plots for performance).
-        Returns a list of dicts with plot_no and geometry.
+        Snapshots the full district -> taluka -> village hierarchy (and optionally
+        every village's plot list) into the list cache.
+        With refresh=False only missing or expired entries are fetched.
+        Returns counts of what was cached.
+        """
+        counts = {'districts': 0, 'talukas': 0, 'villages': 0, 'plot_lists': 0}
+        start = time.time()
+
+        with rate_control.priority(rate_control.PREFETCH):
+            districts = self.fetch_districts(category, refresh)
+        counts['districts'] = len(districts)
+
+        with ThreadPoolExecutor(max_workers=max_workers, initializer=rate_control.set_priority,
+                                initargs=(rate_control.PREFETCH,)) as executor:
+            taluka_lists = list(executor.map(
+                lambda d: (d['code'], self.fetch_talukas(d['code'], category, refresh)), districts))
+
+            taluka_keys = [(d_code, t['code']) for d_code, talukas in taluka_lists for t in talukas]
+            counts['talukas'] = len(taluka_keys)
+
+            village_lists = list(executor.map(
+                lambda k: (k, self.fetch_villages(k[0], k[1], category, refresh)), taluka_keys))
+
+            village_keys = [(d_code, t_code, v['code'])
+                            for (d_code, t_code), villages in village_lists for v in villages]
+            counts['villages'] = len(village_keys)
+            print(f"Cached {counts['districts']} districts, {counts['talukas']} talukas, "
+                  f"{counts['villages']} villages ({time.time() - start:.1f}s)", flush=True)
+
+            if include_plot_lists:
+                plot_lists = executor.map(
+                    lambda k: self.fetch_plot_list(k[0], k[1], k[2], category, refresh), village_keys)
+                counts['plot_lists'] = sum(1 for plots in plot_lists if plots)
+                print(f"Cached {counts['plot_lists']} plot lists ({time.time() - start:.1f}s)", flush=True)
+
+        return counts
+
+    @staticmethod
+    def split_giscode(giscode):
+        """
+        Splits a village GIS code into (district, taluka, village, category).
+        Format: RVM2502272500020303690000 -> prefix(3) + district(2) + taluka(2) + village(18)
         """
-        print(f"Fetching village boundaries for {giscode}...", flush=True)
-        
-        # Extract components from giscode
-        # Format: RVM2502272500020303690000 -> prefix(3) + district(2) + taluka(2) + village(18)
         prefix = giscode[:3]
         district = giscode[3:5]
         taluka = giscode[5:7]
         village = giscode[7:]
         category = 'R' if prefix == 'RVM' else 'V'
-        
+        return district, taluka, village, category
+
+    @staticmethod
+    def boundary_from_plot(plot_no, plot_data):
+        """Converts a cached plot into the boundary dict returned by fetch_village_boundaries."""
+        if plot_data and 'the_geom' in plot_data:
+            return {
+                'plot_no': plot_no,
+                'geometry': plot_data['the_geom'],
+                'owner_info': plot_data.get('parsed_records', [])
+            }
+        return None
+
+    def fetch_village_boundaries(self, giscode, max_plots=9999, max_workers=None, force=False):
+        """
+        Fetches geometries for all plots in a village (limited to max_plots for performance).
+        Returns a list of dicts with plot_no and geometry.
+        See fetch_village_plots for how plots are fetched.
+        """
+        plots = self.fetch_village_plots(giscode, max_plots, max_workers, force)
+        return [self.boundary_from_plot(plot_no, plot_data) for plot_no, plot_data in plots]
+
+    def fetch_village_plots(self, giscode, max_plots=9999, max_workers=None, force=False, plot_nos=None):
+        """
+        Returns [(plot_no, plot_record)] for every plot of a village that has
+        geometry, in plot list order (or for just the plots in plot_nos).
+        Cached plots are used as is; only the others are requested upstream.
+        By default the adaptive limiter decides how many requests actually run at
+        once; max_workers only caps the number of threads.
+        Plots in the negative cache are skipped unless force is set; the outcome
+        is printed and kept in last_crawl_summary (for one-crawl-at-a-time
+        callers such as the CLI; concurrent crawls use VillageCrawl.summary).
+        """
+        plots_to_fetch = self.village_plot_list(giscode, max_plots, plot_nos)
+        found = {}
+        crawl = VillageCrawl(self.iter_village_plots(giscode, plots_to_fetch, max_workers, force))
+        for batch in crawl:
+            found.update(batch)
+        self.last_crawl_summary = crawl.summary
+        return [(p, found[p]) for p in plots_to_fetch if p in found]
+
+    def village_plot_list(self, giscode, max_plots=9999, plot_nos=None):
+        """The plot numbers a village crawl covers: plot_nos, or the village's plot list, up to max_plots."""
+        print(f"Fetching village boundaries for {giscode}...", flush=True)
+
         # Get list of all plots
-        plot_list = self.fetch_plot_list(district, taluka, village, category)
-        
+        plot_list = list(plot_nos) if plot_nos is not None else self.fetch_plot_list(*self.split_giscode(giscode))
+
         if not plot_list:
             print("No plots found in village", flush=True)
             return []
-        
+
         # Limit to max_plots to avoid timeout
-        plots_to_fetch = plot_list[:max_plots]
-        print(f"Fetching geometries for {len(plots_to_fetch)} plots in parallel (Workers: {max_workers})...", flush=True)
-        
-        boundaries = []
-        
+        return plot_list[:max_plots]
+
+    def iter_village_plots(self, giscode, plot_nos, max_workers=None, force=False, on_complete=None):
+        """
+        Yields lists of (plot_no, plot_record) for the plots in plot_nos that
+        have geometry: first every cached plot at once, then each fetched plot
+        as its request completes. If given, on_complete(plot_no, record) is
+        also called for every upstream request as it completes, with None as
+        the record when the plot had no geometry or failed.
+        Returns the crawl summary when exhausted (the generator's return
+        value, kept by VillageCrawl); closing the generator early cancels
+        the requests not started yet.
+        """
+        if max_workers is None:
+            max_workers = self.POOL_MAXSIZE
+        if not plot_nos:
+            return
+
+        # Don't spend the retry budget on plots already known to be dead
+        skipped = self._skipped_missing(giscode, plot_nos, force)
+        records = self.plot_cache.get_many(f"{giscode}_{p}" for p in plot_nos if p not in skipped)
+        cached = [(p, records[f"{giscode}_{p}"]) for p in plot_nos if f"{giscode}_{p}" in records]
+        cached_nos = {p for p, _ in cached}
+        to_request = [p for p in plot_nos if p not in skipped and p not in cached_nos]
+        print(f"Fetching geometries for {len(to_request)} plots in parallel (Workers: {max_workers}, "
+              f"{len(cached)} cached, skipping {len(skipped)} known missing)...", flush=True)
+
+        found = [p for p, data in cached if 'the_geom' in data]
+        if found:
+            yield [(p, data) for p, data in cached if 'the_geom' in data]
+
         def fetch_single_plot(plot_no):
             try:
-                plot_data = self.get_plot_coordinates(giscode, plot_no)
+                plot_data = self.get_plot_coordinates(giscode, plot_no, force=force)
                 if plot_data and 'the_geom' in plot_data:
-                    return {
-                        'plot_no': plot_no,
-                        'geometry': plot_data['the_geom'],
-                        'owner_info': plot_data.get('parsed_records', [])
-                    }
+                    return plot_no, plot_data
             except Exception as e:
                 print(f"Error fetching plot {plot_no}: {e}", flush=True)
-            return None
+            return plot_no, None
 
-        # Use ThreadPoolExecutor for parallel fetching
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            results = list(executor.map(fetch_single_plot, plots_to_fetch))
-        
-        # Filter out None results
-        boundaries = [r for r in results if r]
-        
-        print(f"Successfully fetched {len(boundaries)} plot boundaries", flush=True)
-        return boundaries
+        if to_request:
+            # A village's worth of requests is never interactive, so single
+            # plot lookups get ahead of it; a crawl job's bulk class is kept
+            crawl_priority = rate_control.less_urgent(rate_control.current_priority(), rate_control.PREFETCH)
+            executor = ThreadPoolExecutor(max_workers=max_workers, initializer=rate_control.set_priority,
+                                          initargs=(crawl_priority,))
+            try:
+                futures = [executor.submit(fetch_single_plot, p) for p in to_request]
+                for future in as_completed(futures):
+                    plot_no, plot_data = future.result()
+                    if on_complete is not None:
+                        on_complete(plot_no, plot_data)
+                    if plot_data is not None:
+                        found.append(plot_no)
+                        yield [(plot_no, plot_data)]
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+        print(f"Successfully fetched {len(found)} plot boundaries", flush=True)
+        summary = self._crawl_summary(giscode, plot_nos, found, skipped)
+        print(f"Upstream limiter: {self.limiter.stats()}", flush=True)
+        return summary
+
+    def _skipped_missing(self, giscode, plot_nos, force=False):
+        """Returns {plot_no: kind} for requested plots that the negative cache says to skip."""
+        if force:
+            return {}
+        known_missing = self.store.missing_in_village(giscode)
+        return {p: known_missing[str(p)] for p in plot_nos
+                if str(p) in known_missing and f"{giscode}_{p}" not in self.plot_cache}
+
+    def _crawl_summary(self, giscode, plot_nos, found_plot_nos, skipped):
+        """Counts found, skipped and newly missing plots of a crawl and prints them."""
+        found = {str(p) for p in found_plot_nos}
+        missing_now = self.store.missing_in_village(giscode)
+        summary = {
+            'giscode': giscode,
+            'requested': len(plot_nos),
+            'found': len(found),
+            'not_found': 0,
+            'failed': 0,
+            'skipped_not_found': 0,
+            'skipped_failed': 0,
+        }
+        for plot_no in plot_nos:
+            if str(plot_no) in found:
+                continue
+            if plot_no in skipped:
+                summary[f"skipped_{skipped[plot_no]}"] += 1
+            elif missing_now.get(str(plot_no)) == 'not_found':
+                summary['not_found'] += 1
+            else:
+                summary['failed'] += 1
+        print(f"Crawl summary for {giscode}: {summary['found']}/{summary['requested']} found, "
+              f"{summary['not_found']} not found, {summary['failed']} failed, "
+              f"skipped {summary['skipped_not_found']} not found and "
+              f"{summary['skipped_failed']} failed from the negative cache", flush=True)
+        return summary
+
+class VillageCrawl:
+    """
+    Iterates the batches of an iter_village_plots generator and keeps what
+    it returns, the crawl's summary, in .summary once it is exhausted (None
+    before, or if the crawl was closed early).
+    """
+
+    def __init__(self, plots):
+        self._plots = plots
+        self.summary = None
+
+    def __iter__(self):
+        self.summary = yield from self._plots
+
+    def close(self):
+        self._plots.close()
 
 def save_metadata(data, filename="metadata.json"):
     with open(filename, 'w', encoding='utf-8') as f:
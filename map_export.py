@@ -0,0 +1,262 @@
+import io
+import math
+import os
+import struct
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+import geometry
+
+WMS_URL = "https://mahabhunakasha.mahabhumi.gov.in/WMS"
+DEFAULT_SRS = "EPSG:32643"  # UTM Zone 43N
+TILE_SIZE = 1024
+# Refuse mosaics larger than this (about 1.6 GB as raw RGBA on the client side)
+MAX_PIXELS = 400 * 1000 * 1000
+TILE_RETRIES = 3
+
+
+class PNGStreamWriter:
+    """
+    Writes an 8-bit RGBA PNG row by row, so the full image never has to be
+    held in memory. Rows are deflated as they arrive and flushed to the file
+    in IDAT chunks.
+    """
+
+    CHUNK_BYTES = 1024 * 1024
+
+    def __init__(self, f, width, height):
+        self.f = f
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self._compressor = zlib.compressobj(6)
+        self._pending = []
+        self._pending_size = 0
+        f.write(b"\x89PNG\r\n\x1a\n")
+        # 8 bits per channel, colour type 6 (RGBA), no interlacing
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+
+    def _chunk(self, kind, data):
+        self.f.write(struct.pack(">I", len(data)))
+        self.f.write(kind)
+        self.f.write(data)
+        self.f.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind)) & 0xFFFFFFFF))
+
+    def _emit(self, data):
+        if data:
+            self._pending.append(data)
+            self._pending_size += len(data)
+        if self._pending_size >= self.CHUNK_BYTES:
+            self._flush()
+
+    def _flush(self):
+        if self._pending:
+            self._chunk(b"IDAT", b"".join(self._pending))
+            self._pending = []
+            self._pending_size = 0
+
+    def write_rows(self, image):
+        """Appends the rows of an RGBA image exactly `width` pixels wide."""
+        if image.mode != 'RGBA' or image.width != self.width:
+            raise ValueError("strip must be RGBA and as wide as the PNG")
+        stride = self.width * 4
+        # Convert in bands to avoid a second full copy of a wide strip
+        for band_top in range(0, image.height, 64):
+            band = image.crop((0, band_top, self.width, min(band_top + 64, image.height)))
+            raw = band.tobytes()
+            for y in range(band.height):
+                # Filter type 0 (None) per scanline
+                self._emit(self._compressor.compress(b"\x00" + raw[y * stride:(y + 1) * stride]))
+        self.rows_written += image.height
+
+    def close(self):
+        if self.rows_written != self.height:
+            raise ValueError(f"wrote {self.rows_written} of {self.height} rows")
+        self._emit(self._compressor.flush())
+        self._flush()
+        self._chunk(b"IEND", b"")
+
+
+def cached_extent(store, giscode):
+    """Bounding box of every cached plot of a village, or None if none are cached."""
+    return geometry.union_bounds(geometry.plot_geometry(p) for p in store.iter_plots(giscode))
+
+
+def plan_grid(extent, resolution, tile_size=TILE_SIZE, padding=0.02, max_pixels=MAX_PIXELS):
+    """
+    Lays a pixel grid of `resolution` map units per pixel over the padded
+    extent and splits it into tiles. Returns a dict with the mosaic size,
+    its snapped bbox and a list of rows of (bbox, width, height) tiles.
+    """
+    min_x, min_y, max_x, max_y = extent
+    pad = max(max_x - min_x, max_y - min_y) * padding
+    min_x, min_y, max_x, max_y = min_x - pad, min_y - pad, max_x + pad, max_y + pad
+
+    width = max(1, math.ceil((max_x - min_x) / resolution))
+    height = max(1, math.ceil((max_y - min_y) / resolution))
+    if width * height > max_pixels:
+        raise ValueError(f"{width}x{height} px at {resolution} units/px is too large; use a coarser resolution")
+    # Snap to whole pixels, anchored at the top-left corner
+    top = min_y + height * resolution
+
+    rows = []
+    for r in range(math.ceil(height / tile_size)):
+        tile_h = min(tile_size, height - r * tile_size)
+        y1 = top - r * tile_size * resolution
+        y0 = y1 - tile_h * resolution
+        row = []
+        for c in range(math.ceil(width / tile_size)):
+            tile_w = min(tile_size, width - c * tile_size)
+            x0 = min_x + c * tile_size * resolution
+            row.append(((x0, y0, x0 + tile_w * resolution, y1), tile_w, tile_h))
+        rows.append(row)
+
+    return {
+        'width': width,
+        'height': height,
+        'bbox': (min_x, top - height * resolution, min_x + width * resolution, top),
+        'resolution': resolution,
+        'rows': rows,
+    }
+
+
+def world_file(grid):
+    """
+    Contents of the .pgw world file: pixel size, rotation terms and the map
+    coordinates of the centre of the top-left pixel.
+    """
+    res = grid['resolution']
+    min_x, _, _, max_y = grid['bbox']
+    lines = [res, 0.0, 0.0, -res, min_x + res / 2, max_y - res / 2]
+    return "\n".join(f"{v:.10f}" for v in lines) + "\n"
+
+
+def tile_params(giscode, bbox, width, height, srs=DEFAULT_SRS):
+    """GetMap parameters for one tile, matching the single-image village download."""
+    return {
+        'SERVICE': 'WMS',
+        'VERSION': '1.1.1',
+        'REQUEST': 'GetMap',
+        'LAYERS': 'VILLAGE_MAP',
+        'STYLES': 'VILLAGE_MAP',
+        'FORMAT': 'image/png',
+        'TRANSPARENT': 'TRUE',
+        'WIDTH': str(width),
+        'HEIGHT': str(height),
+        'SRS': srs,
+        'BBOX': ",".join(f"{v:.6f}" for v in bbox),
+        'gis_code': giscode,
+        'state': '27',
+    }
+
+
+def fetch_tile(session, params, tile_cache=None, wms_url=WMS_URL, retries=TILE_RETRIES):
+    """Returns one GetMap tile as an RGBA image, from the tile cache when possible."""
+    cached = tile_cache.get(params) if tile_cache is not None else None
+    if cached is not None:
+        return Image.open(io.BytesIO(cached[0])).convert('RGBA')
+
+    for attempt in range(retries):
+        try:
+            resp = session.get(wms_url, params=params, timeout=60)
+            resp.raise_for_status()
+            content_type = resp.headers.get('Content-Type', '')
+            if not content_type.startswith('image/'):
+                raise ValueError(f"WMS returned {content_type}: {resp.text[:200]}")
+            image = Image.open(io.BytesIO(resp.content)).convert('RGBA')
+            if tile_cache is not None:
+                tile_cache.put(params, resp.content, content_type)
+            return image
+        except Exception as e:
+            print(f"Tile {params['BBOX']} attempt {attempt + 1} failed: {e}", flush=True)
+            if attempt < retries - 1:
+                time.sleep(2 ** attempt)
+    return None
+
+
+def _write_mosaic(session, giscode, grid, path, max_workers, tile_cache, srs, wms_url):
+    """Fetches and writes the tiles of a grid row by row. Returns the number of failed tiles."""
+    rows = grid['rows']
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool, open(path, 'wb') as f:
+        writer = PNGStreamWriter(f, grid['width'], grid['height'])
+
+        def submit_row(row):
+            return [pool.submit(fetch_tile, session, tile_params(giscode, bbox, w, h, srs), tile_cache, wms_url)
+                    for bbox, w, h in row]
+
+        # Keep enough rows in flight to occupy every worker
+        lookahead = max(2, math.ceil(max_workers / len(rows[0])) + 1)
+        queued = deque(submit_row(row) for row in rows[:lookahead])
+        next_row = len(queued)
+
+        for row in rows:
+            futures = queued.popleft()
+            if next_row < len(rows):
+                queued.append(submit_row(rows[next_row]))
+                next_row += 1
+
+            strip = Image.new('RGBA', (grid['width'], row[0][2]), (0, 0, 0, 0))
+            x = 0
+            for (bbox, w, h), future in zip(row, futures):
+                image = future.result()
+                if image is None:
+                    failed += 1
+                else:
+                    if image.size != (w, h):
+                        image = image.resize((w, h))
+                    strip.paste(image, (x, 0))
+                x += w
+            writer.write_rows(strip)
+        writer.close()
+
+    return failed
+
+
+def export_village_map(session, giscode, extent, out_path, resolution=0.5, tile_size=TILE_SIZE,
+                       max_workers=8, tile_cache=None, srs=DEFAULT_SRS, wms_url=WMS_URL):
+    """
+    Fetches the village raster as a grid of GetMap tiles and stitches it into
+    one PNG at out_path, with a .pgw world file next to it.
+
+    Tiles are fetched concurrently, a couple of tile rows ahead of the row
+    being written; each finished row is pasted into a one-row strip and
+    streamed to the PNG, so memory stays at a few strips regardless of the
+    mosaic size. Tiles that still fail after retries are left transparent.
+    Returns a summary dict.
+    """
+    grid = plan_grid(extent, resolution, tile_size)
+    rows = grid['rows']
+    print(f"Exporting {giscode}: {grid['width']}x{grid['height']} px, "
+          f"{len(rows)}x{len(rows[0])} tiles at {resolution} units/px", flush=True)
+
+    start = time.time()
+    tmp_path = out_path + ".part"
+    try:
+        failed = _write_mosaic(session, giscode, grid, tmp_path, max_workers, tile_cache, srs, wms_url)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, out_path)
+    world_path = os.path.splitext(out_path)[0] + ".pgw"
+    with open(world_path, 'w') as f:
+        f.write(world_file(grid))
+
+    tiles = sum(len(r) for r in rows)
+    print(f"Export done: {tiles - failed}/{tiles} tiles in {time.time() - start:.1f}s -> {out_path}", flush=True)
+    return {
+        'path': out_path,
+        'world_file': world_path,
+        'width': grid['width'],
+        'height': grid['height'],
+        'bbox': grid['bbox'],
+        'resolution': resolution,
+        'srs': srs,
+        'tiles': tiles,
+        'failed_tiles': failed,
+    }
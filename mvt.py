@@ -0,0 +1,228 @@
+import hashlib
+import math
+
+import numpy as np
+
+import geometry
+import reproject
+
+# Mapbox Vector Tile 2.1 encoding of cached plots, cut from the plot store in
+# Web Mercator (EPSG:3857) on the usual z/x/y tile grid.
+MIMETYPE = "application/vnd.mapbox-vector-tile"
+LAYER_NAME = "plots"
+EXTENT = 4096
+# Tile units of geometry drawn around each tile so outlines continue across tile seams
+BUFFER = 64
+# Douglas-Peucker tolerance in tile units; 4096 units span 256 screen pixels,
+# so this keeps vertices to within about 1/4 px at every zoom
+SIMPLIFY_TOLERANCE = 4.0
+# Below this zoom a tile would cover too many plots to be useful
+MIN_ZOOM = 13
+MAX_ZOOM = 22
+
+_WORLD = math.pi * 6378137.0  # half the Mercator world width in metres
+
+_MOVE_TO, _LINE_TO, _CLOSE_PATH = 1, 2, 7
+_POLYGON = 3
+
+
+def tile_bounds(z, x, y):
+    """Web Mercator (min_x, min_y, max_x, max_y) of tile z/x/y (y counted from the top)."""
+    size = 2 * _WORLD / (1 << z)
+    min_x = -_WORLD + x * size
+    max_y = _WORLD - y * size
+    return min_x, max_y - size, min_x + size, max_y
+
+
+def cache_key(params):
+    """Tile cache key of a vector tile request dict (prefix, SRS, z/x/y and data version)."""
+    canonical = "&".join(f"{k}={v}" for k, v in sorted(params.items()))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def simplify(points, tolerance):
+    """
+    Douglas-Peucker simplification of an (n, 2) polyline; the first and last
+    points are always kept. Returns the kept points.
+    """
+    n = len(points)
+    if n < 3:
+        return points
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        a = points[first]
+        seg = points[last] - a
+        rel = points[first + 1:last] - a
+        length = math.hypot(seg[0], seg[1])
+        if length == 0:
+            dist = np.hypot(rel[:, 0], rel[:, 1])
+        else:
+            dist = np.abs(seg[0] * rel[:, 1] - seg[1] * rel[:, 0]) / length
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            mid = first + 1 + i
+            keep[mid] = True
+            stack.append((first, mid))
+            stack.append((mid, last))
+    return points[keep]
+
+
+def _ring_area(ring):
+    """Surveyor's formula, positive for clockwise rings in (y-down) tile coordinates."""
+    x, y = ring[:, 0], ring[:, 1]
+    return float(np.dot(x[:-1], y[1:]) - np.dot(x[1:], y[:-1]) + x[-1] * y[0] - x[0] * y[-1]) / 2
+
+
+def _tile_ring(ring, tolerance):
+    """
+    (integer tile coordinates of one ring without its closing point, its
+    area), or None if the ring degenerates.
+    """
+    ring = np.round(simplify(ring, tolerance) if len(ring) > 4 else ring).astype(np.int64)
+    keep = np.ones(len(ring), dtype=bool)
+    keep[1:] = np.any(ring[1:] != ring[:-1], axis=1)
+    ring = ring[keep]
+    if len(ring) > 1 and np.array_equal(ring[0], ring[-1]):
+        ring = ring[:-1]
+    if len(ring) < 3:
+        return None
+    area = _ring_area(ring)
+    return (ring, area) if area else None
+
+
+def _zigzag(n):
+    return (n << 1) ^ (n >> 63)
+
+
+def polygon_geometry(geom, transform, tolerance=SIMPLIFY_TOLERANCE):
+    """
+    MVT geometry commands of a Geometry. transform maps (n, 2) coordinates to
+    tile units. Exterior rings are written clockwise and holes
+    counter-clockwise (in tile coordinates), as the spec requires; parts
+    whose exterior collapses below a tile unit are dropped.
+    """
+    coords = transform(geom.coords)
+    commands = []
+    cursor = (0, 0)
+    for p in range(len(geom.part_offsets) - 1):
+        for r in range(geom.part_offsets[p], geom.part_offsets[p + 1]):
+            tiled = _tile_ring(coords[geom.ring_offsets[r]:geom.ring_offsets[r + 1]], tolerance)
+            exterior = r == geom.part_offsets[p]
+            if tiled is None:
+                if exterior:
+                    break
+                continue
+            ring, area = tiled
+            if (area > 0) != exterior:
+                ring = ring[::-1]
+            deltas = np.diff(np.vstack([cursor, ring]), axis=0).tolist()
+            commands.append((1 << 3) | _MOVE_TO)
+            commands.extend((_zigzag(deltas[0][0]), _zigzag(deltas[0][1])))
+            commands.append(((len(ring) - 1) << 3) | _LINE_TO)
+            for dx, dy in deltas[1:]:
+                commands.extend((_zigzag(dx), _zigzag(dy)))
+            commands.append((1 << 3) | _CLOSE_PATH)
+            cursor = tuple(ring[-1].tolist())
+    return commands
+
+
+# Protocol buffer encoding (only what vector_tile.proto needs)
+def _varint(n):
+    if n < 0x80:
+        return bytes((n,))
+    out = bytearray()
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _field(number, wire_type):
+    return _varint((number << 3) | wire_type)
+
+
+def _bytes_field(number, data):
+    return _field(number, 2) + _varint(len(data)) + data
+
+
+def _packed(number, values):
+    return _bytes_field(number, b"".join(_varint(v) for v in values))
+
+
+def encode_layer(name, features, extent=EXTENT):
+    """
+    Encodes one layer. features is a list of (id, commands, properties) with
+    string property values; keys and values are deduplicated into the
+    layer's tables.
+    """
+    keys, values = {}, {}
+    body = [_field(15, 0) + _varint(2), _bytes_field(1, name.encode('utf-8'))]
+    for feature_id, commands, properties in features:
+        tags = []
+        for k, v in properties.items():
+            tags.append(keys.setdefault(k, len(keys)))
+            tags.append(values.setdefault(str(v), len(values)))
+        feature = (_field(1, 0) + _varint(feature_id) + _packed(2, tags)
+                   + _field(3, 0) + _varint(_POLYGON) + _packed(4, commands))
+        body.append(_bytes_field(2, feature))
+    body.extend(_bytes_field(3, k.encode('utf-8')) for k in keys)
+    body.extend(_bytes_field(4, _bytes_field(1, v.encode('utf-8'))) for v in values)
+    body.append(_field(5, 0) + _varint(extent))
+    return _bytes_field(3, b"".join(body))
+
+
+class PlotTileSource:
+    """
+    The cached plots of one GIS code prefix (a village or a taluka) in Web
+    Mercator, with their bounding boxes in arrays so the plots of a tile are
+    found with one vectorized comparison.
+    """
+
+    def __init__(self, records, src):
+        labels, geoms = [], []
+        for record in records:
+            if 'the_geom' not in record:
+                continue
+            labels.append((str(record['plotno']), record['giscode']))
+            geoms.append(geometry.plot_geometry(record))
+        self.labels = labels
+        self.geoms = reproject.transform_geometries(geoms, src, reproject.WEB_MERCATOR)
+        self.bounds = np.array([geometry.bounds(g) or (np.inf, np.inf, -np.inf, -np.inf) for g in self.geoms],
+                               dtype=np.float64).reshape(-1, 4)
+
+    def __len__(self):
+        return len(self.geoms)
+
+    def query(self, bbox):
+        """Indices of plots whose bounding box intersects bbox."""
+        b = self.bounds
+        hit = (b[:, 0] <= bbox[2]) & (b[:, 2] >= bbox[0]) & (b[:, 1] <= bbox[3]) & (b[:, 3] >= bbox[1])
+        return np.flatnonzero(hit)
+
+    def render(self, z, x, y):
+        """The MVT bytes of tile z/x/y: one 'plots' layer with plot_no and giscode attributes."""
+        min_x, min_y, max_x, max_y = tile_bounds(z, x, y)
+        scale = EXTENT / (max_x - min_x)
+        pad = BUFFER / scale
+
+        def to_tile(coords):
+            return np.column_stack([(coords[:, 0] - min_x) * scale, (max_y - coords[:, 1]) * scale])
+
+        features = []
+        for i in self.query((min_x - pad, min_y - pad, max_x + pad, max_y + pad)).tolist():
+            commands = polygon_geometry(self.geoms[i], to_tile)
+            if commands:
+                plot_no, giscode = self.labels[i]
+                features.append((i + 1, commands, {'plot_no': plot_no, 'giscode': giscode}))
+        if not features:
+            return b""
+        return encode_layer(LAYER_NAME, features)
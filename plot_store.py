@@ -0,0 +1,604 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import geometry
+
+DEFAULT_STORE_FILE = "cache/plots.db"
+LEGACY_CACHE_FILE = "cache/all_plots.json"
+
+
+# Separates the owner records in a getPlotInfo 'info' text
+INFO_SEPARATOR = '---------------------------------'
+
+# Record fields held in PlotRecord slots rather than in the dict itself
+SLOT_FIELDS = ('info', 'report_url')
+
+# PlotRecord._parsed when parsed_records is exactly parse_info(info)
+_FROM_INFO = object()
+_MISSING = object()
+
+
+def parse_info(text):
+    """Splits a getPlotInfo 'info' text into owner records of its 'Key : value' lines."""
+    records = []
+    for chunk in (text or "").split(INFO_SEPARATOR):
+        if not chunk.strip():
+            continue
+        record = {}
+        for line in chunk.strip().split('\n'):
+            if ':' in line:
+                key, val = line.split(':', 1)
+                record[key.strip()] = val.strip()
+        if record:
+            records.append(record)
+    return records
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+def _pack_wkt(wkt):
+    """The packed geometry of a WKT string, or None if it is empty or does not parse."""
+    try:
+        geom = geometry.parse_wkt(wkt) if wkt else None
+    except ValueError:
+        return None
+    return geometry.pack(geom) if geom is not None and len(geom.coords) else None
+
+
+class PlotRecord(dict):
+    """
+    A cached plot, held compactly but read like the plot's JSON dict.
+
+    Only giscode, plotno and any uncommon keys are entries of the dict
+    itself, which keeps it at the smallest table size; json.dumps needs it
+    non-empty to look at items(). The info text and report_url live in
+    slots, and the GIS code is interned. The geometry is kept packed
+    (geom_blob) and only serialized to a WKT the_geom the first time it is
+    read; geometry.plot_geometry() uses the blob directly. parsed_records that
+    merely repeat the info text are not kept but parsed again when read.
+    """
+
+    __slots__ = ('info', 'report_url', 'geom_blob', '_wkt', '_parsed')
+
+    def __init__(self, data, geom_blob=None):
+        super().__init__()
+        self.info = self.report_url = self._wkt = self._parsed = None
+        self.geom_blob = geom_blob
+        if isinstance(data, PlotRecord):
+            for name in PlotRecord.__slots__:
+                setattr(self, name, getattr(data, name))
+            dict.update(self, dict.items(data))
+            return
+        data = dict(data)
+        parsed = data.pop('parsed_records', _MISSING)
+        wkt = data.pop('the_geom', None)
+        for key in SLOT_FIELDS:
+            if data.get(key) is not None:
+                setattr(self, key, data.pop(key))
+        if 'giscode' in data:
+            data['giscode'] = _intern(data['giscode'])
+        dict.update(self, data)
+        if wkt is not None:
+            self['the_geom'] = wkt
+        if parsed is not _MISSING:
+            self['parsed_records'] = parsed
+
+    def __setitem__(self, key, value):
+        if key in SLOT_FIELDS and value is not None:
+            if key == 'info' and self._parsed is _FROM_INFO:
+                self._parsed = parse_info(self.info)
+            setattr(self, key, value)
+            dict.pop(self, key, None)
+        elif key == 'the_geom':
+            self._wkt = None
+            self.geom_blob = _pack_wkt(value)
+            if self.geom_blob is None:
+                dict.__setitem__(self, key, value)
+            else:
+                dict.pop(self, key, None)
+        elif key == 'parsed_records' and isinstance(value, list):
+            self._parsed = _FROM_INFO if value == parse_info(self.info) else value
+        else:
+            dict.__setitem__(self, key, _intern(value) if key == 'giscode' else value)
+
+    def _get(self, key):
+        if key in SLOT_FIELDS:
+            value = getattr(self, key)
+            if value is not None:
+                return value
+        elif key == 'the_geom' and self.geom_blob is not None:
+            if self._wkt is None:
+                self._wkt = geometry.to_wkt(geometry.unpack_cached(self.geom_blob))
+            return self._wkt
+        elif key == 'parsed_records' and self._parsed is not None:
+            if self._parsed is _FROM_INFO:
+                return parse_info(self.info)
+            return self._parsed
+        return dict.get(self, key, _MISSING)
+
+    def __getitem__(self, key):
+        value = self._get(key)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        value = self._get(key)
+        return default if value is _MISSING else value
+
+    def __contains__(self, key):
+        if key in SLOT_FIELDS and getattr(self, key) is not None:
+            return True
+        if (key == 'the_geom' and self.geom_blob is not None) or (key == 'parsed_records' and self._parsed is not None):
+            return True
+        return dict.__contains__(self, key)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        if key in SLOT_FIELDS:
+            setattr(self, key, None)
+        elif key == 'the_geom':
+            self.geom_blob = self._wkt = None
+        elif key == 'parsed_records':
+            self._parsed = None
+        dict.pop(self, key, None)
+
+    def to_dict(self, geometry=True):
+        """The plot as a plain dict, e.g. the /api/plot response; without the_geom if geometry is False."""
+        data = dict(dict.items(self))
+        for key in SLOT_FIELDS:
+            value = getattr(self, key)
+            if value is not None:
+                data[key] = value
+        if geometry and self.geom_blob is not None:
+            data['the_geom'] = self['the_geom']
+        if self._parsed is not None:
+            data['parsed_records'] = self['parsed_records']
+        if not geometry:
+            data.pop('the_geom', None)
+        return data
+
+    def _keys(self):
+        keys = list(dict.keys(self))
+        keys.extend(key for key in SLOT_FIELDS if getattr(self, key) is not None)
+        if self.geom_blob is not None:
+            keys.append('the_geom')
+        if self._parsed is not None:
+            keys.append('parsed_records')
+        return keys
+
+    # A plot always has its giscode and plotno
+    def __bool__(self):
+        return True
+
+    # Whole-record views (json.dumps, dict(), iteration) see every field
+    def keys(self):
+        return dict.fromkeys(self._keys()).keys()
+
+    def values(self):
+        return self.to_dict().values()
+
+    def items(self):
+        return self.to_dict().items()
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    def __len__(self):
+        return len(self._keys())
+
+    def copy(self):
+        return self.to_dict()
+
+    def __eq__(self, other):
+        if isinstance(other, PlotRecord):
+            other = other.to_dict()
+        return isinstance(other, dict) and self.to_dict() == other
+
+    def __repr__(self):
+        return f"PlotRecord({self.to_dict(geometry=False)!r})"
+
+    def __reduce__(self):
+        return PlotRecord, (self.to_dict(geometry=self.geom_blob is None), self.geom_blob)
+
+    __hash__ = None
+
+
+class PlotStore:
+    """
+    Persistent plot store backed by SQLite.
+
+    Each plot is one row keyed by "giscode_plotno", so a fetch only writes
+    that single row instead of rewriting the whole cache. SQLite's journal
+    keeps the file consistent if the process dies mid-write.
+
+    Geometries are kept out of the JSON column and stored packed (see
+    geometry.pack) in the geom column, which is several times smaller than
+    WKT and is decoded lazily by PlotRecord.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_FILE):
+        self.path = path
+        store_dir = os.path.dirname(path)
+        if store_dir and not os.path.exists(store_dir):
+            os.makedirs(store_dir, exist_ok=True)
+
+        # sqlite3 connections must not be shared between threads,
+        # so every worker thread lazily opens its own.
+        self._local = threading.local()
+        self._init_schema()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            # WAL lets readers proceed while a writer commits
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._conn()
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS plots (
+                    key TEXT PRIMARY KEY,
+                    giscode TEXT NOT NULL,
+                    plotno TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    updated_at REAL DEFAULT (strftime('%s', 'now')),
+                    geom BLOB
+                )
+            """)
+            # Stores created before geometries were packed lack the column
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(plots)")]
+            if 'geom' not in columns:
+                conn.execute("ALTER TABLE plots ADD COLUMN geom BLOB")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_plots_giscode ON plots (giscode)")
+            # Negative cache: plots that had no geometry or could not be fetched
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS missing_plots (
+                    key TEXT PRIMARY KEY,
+                    giscode TEXT NOT NULL,
+                    plotno TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    error TEXT,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_missing_giscode ON missing_plots (giscode)")
+
+    @staticmethod
+    def make_key(giscode, plotno):
+        return f"{giscode}_{plotno}"
+
+    def _row(self, record):
+        giscode = record['giscode']
+        plotno = str(record['plotno'])
+        if isinstance(record, PlotRecord):
+            # Without the WKT, so a packed blob is reused as is
+            data = record.to_dict(geometry=False)
+        else:
+            data = {k: v for k, v in record.items() if k != 'the_geom'}
+        blob = getattr(record, 'geom_blob', None)
+        if blob is None and 'the_geom' in record:
+            blob = _pack_wkt(record['the_geom'])
+            if blob is None:
+                # Kept as the text upstream sent rather than lost
+                data['the_geom'] = record['the_geom']
+        return (
+            self.make_key(giscode, plotno),
+            giscode,
+            plotno,
+            json.dumps(data, ensure_ascii=False, separators=(',', ':')),
+            blob,
+        )
+
+    @staticmethod
+    def _record(data, blob):
+        return PlotRecord(json.loads(data), blob)
+
+    def upsert(self, record):
+        """Inserts or replaces a single plot record."""
+        self.upsert_many([record])
+
+    def upsert_many(self, records):
+        """Inserts or replaces several plot records in one transaction."""
+        rows = [self._row(r) for r in records if 'giscode' in r and 'plotno' in r]
+        if not rows:
+            return 0
+        conn = self._conn()
+        with conn:
+            # Every write takes a rowid above all existing ones, even when it
+            # replaces the newest row, so iter_changed() sees it
+            conn.executemany(
+                "INSERT OR REPLACE INTO plots (rowid, key, giscode, plotno, data, geom, updated_at) "
+                "VALUES ((SELECT COALESCE(MAX(rowid), 0) + 1 FROM plots), ?, ?, ?, ?, ?, strftime('%s', 'now'))",
+                rows,
+            )
+            # A plot that now has geometry is no longer missing
+            conn.executemany("DELETE FROM missing_plots WHERE key = ?", [(row[0],) for row in rows])
+        return len(rows)
+
+    def get(self, key):
+        """Returns the plot stored under key, or None."""
+        row = self._conn().execute("SELECT data, geom FROM plots WHERE key = ?", (key,)).fetchone()
+        return self._record(*row) if row else None
+
+    def get_many(self, keys, batch_size=500):
+        """Returns {key: record} for the given keys that are stored."""
+        keys = list(keys)
+        found = {}
+        conn = self._conn()
+        for i in range(0, len(keys), batch_size):
+            batch = keys[i:i + batch_size]
+            rows = conn.execute(
+                f"SELECT key, data, geom FROM plots WHERE key IN ({','.join('?' * len(batch))})", batch
+            )
+            found.update((key, self._record(data, blob)) for key, data, blob in rows)
+        return found
+
+    def __contains__(self, key):
+        return self._conn().execute("SELECT 1 FROM plots WHERE key = ?", (key,)).fetchone() is not None
+
+    def keys(self):
+        """Yields the key of every stored plot."""
+        for (key,) in self._conn().execute("SELECT key FROM plots"):
+            yield key
+
+    def last_change(self):
+        """The rowid of the latest write; pass it to iter_changed() later to see what changed since."""
+        return self._conn().execute("SELECT COALESCE(MAX(rowid), 0) FROM plots").fetchone()[0]
+
+    def iter_changed(self, since):
+        """Yields (rowid, record) for plots written after last_change() returned since, oldest first."""
+        rows = self._conn().execute("SELECT rowid, data, geom FROM plots WHERE rowid > ? ORDER BY rowid", (since,))
+        for rowid, data, blob in rows:
+            yield rowid, self._record(data, blob)
+
+    def iter_plots(self, giscode=None):
+        """Yields stored plot records, optionally only those of one village."""
+        if giscode is None:
+            cursor = self._conn().execute("SELECT data, geom FROM plots")
+        else:
+            cursor = self._conn().execute("SELECT data, geom FROM plots WHERE giscode = ?", (giscode,))
+        for data, blob in cursor:
+            yield self._record(data, blob)
+
+    def giscodes(self, prefix=""):
+        """Returns the sorted GIS codes of all stored villages starting with prefix."""
+        rows = self._conn().execute(
+            "SELECT DISTINCT giscode FROM plots WHERE substr(giscode, 1, ?) = ? ORDER BY giscode",
+            (len(prefix), prefix),
+        )
+        return [giscode for (giscode,) in rows]
+
+    def version(self, prefix=""):
+        """
+        A value that changes whenever plots of villages starting with prefix
+        are added or updated: (count, rowid of the latest write). Every write
+        takes a new highest rowid (see upsert_many), so unlike a timestamp
+        this changes even for two writes within the same second.
+        """
+        return self._conn().execute(
+            "SELECT COUNT(*), COALESCE(MAX(rowid), 0) FROM plots WHERE substr(giscode, 1, ?) = ?",
+            (len(prefix), prefix),
+        ).fetchone()
+
+    def load_all(self):
+        """Loads every stored plot into a dict keyed by giscode_plotno."""
+        return {self.make_key(p['giscode'], p['plotno']): p for p in self.iter_plots()}
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM plots").fetchone()[0]
+
+    def pack_geometries(self, batch_size=500):
+        """
+        Moves WKT geometries of rows written before geometries were packed
+        into the geom column. Returns the number of rows rewritten.
+        """
+        conn = self._conn()
+        keys = [key for (key,) in conn.execute(
+            "SELECT key FROM plots WHERE geom IS NULL AND data LIKE '%\"the_geom\"%'"
+        )]
+        if not keys:
+            return 0
+        print(f"Packing {len(keys)} plot geometries in {self.path}...", flush=True)
+        for i in range(0, len(keys), batch_size):
+            batch = keys[i:i + batch_size]
+            rows = conn.execute(
+                f"SELECT key, data FROM plots WHERE key IN ({','.join('?' * len(batch))})", batch
+            ).fetchall()
+            updates = []
+            for key, data in rows:
+                _, _, _, new_data, blob = self._row(json.loads(data))
+                updates.append((new_data, blob, key))
+            # UPDATE rather than upsert so updated_at keeps the fetch time
+            with conn:
+                conn.executemany("UPDATE plots SET data = ?, geom = ? WHERE key = ?", updates)
+        # Reclaim the space the WKT strings used
+        try:
+            conn.execute("VACUUM")
+        except sqlite3.OperationalError as e:
+            # Another process sharing the store has it open
+            print(f"Skipping VACUUM of {self.path}: {e}", flush=True)
+        return len(keys)
+
+    def mark_missing(self, giscode, plotno, kind, ttl, error=None):
+        """Records that a plot is missing (kind 'not_found' or 'failed') for ttl seconds."""
+        plotno = str(plotno)
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO missing_plots (key, giscode, plotno, kind, error, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (self.make_key(giscode, plotno), giscode, plotno, kind, error, time.time() + ttl),
+            )
+
+    def clear_missing(self, key):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM missing_plots WHERE key = ?", (key,))
+
+    def get_missing(self, key):
+        """Returns the unexpired negative entry for key as a dict, or None."""
+        row = self._conn().execute(
+            "SELECT kind, error, expires_at FROM missing_plots WHERE key = ? AND expires_at > ?",
+            (key, time.time()),
+        ).fetchone()
+        if row is None:
+            return None
+        return {'kind': row[0], 'error': row[1], 'expires_at': row[2]}
+
+    def missing_in_village(self, giscode):
+        """Returns {plotno: kind} for every unexpired negative entry of a village."""
+        rows = self._conn().execute(
+            "SELECT plotno, kind FROM missing_plots WHERE giscode = ? AND expires_at > ?",
+            (giscode, time.time()),
+        )
+        return dict(rows)
+
+    def migrate_json(self, json_path=LEGACY_CACHE_FILE):
+        """
+        One-time import of the legacy all_plots.json array into the store.
+        The JSON file is renamed afterwards so the import does not run again.
+        Returns the number of plots imported.
+        """
+        if not os.path.exists(json_path):
+            return 0
+
+        print(f"Migrating legacy cache {json_path} into {self.path}...", flush=True)
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"Error reading legacy cache, skipping migration: {e}", flush=True)
+            return 0
+
+        count = self.upsert_many(data)
+        try:
+            os.replace(json_path, json_path + ".migrated")
+        except FileNotFoundError:
+            # Another process sharing the store migrated it at the same time
+            pass
+        print(f"Migrated {count} plots.", flush=True)
+        return count
+
+
+class PlotCache:
+    """
+    Dict-like view of the plots in a PlotStore, keyed by "giscode_plotno".
+
+    Nothing is loaded up front: every lookup reads the store, so all
+    processes sharing the file (e.g. gunicorn workers) see each other's
+    plots as soon as they are written, and none of them keeps its own copy
+    of the whole cache. SQLite's WAL lets them read concurrently while
+    writes are serialized.
+
+    Plots added with save=False are kept in memory, and served ahead of the
+    store, until save() writes them.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def add(self, record, save=True):
+        """Caches a plot record, writing it to the store now or at the next save()."""
+        if save:
+            self.store.upsert(record)
+            return
+        # Held until save(), so kept compact
+        record = PlotRecord(record)
+        with self._lock:
+            self._pending[PlotStore.make_key(record['giscode'], record['plotno'])] = record
+
+    def save(self):
+        """Writes the plots added with save=False to the store. Returns how many."""
+        with self._lock:
+            pending = dict(self._pending)
+        self.store.upsert_many(pending.values())
+        with self._lock:
+            for key, record in pending.items():
+                # Unless it was replaced while we were writing
+                if self._pending.get(key) is record:
+                    del self._pending[key]
+        return len(pending)
+
+    def get(self, key, default=None):
+        record = self._pending.get(key)
+        if record is None:
+            record = self.store.get(key)
+        return default if record is None else record
+
+    def get_many(self, keys):
+        """Returns {key: record} for the given keys that are cached."""
+        keys = list(keys)
+        with self._lock:
+            found = {key: self._pending[key] for key in keys if key in self._pending}
+        found.update(self.store.get_many(key for key in keys if key not in found))
+        return found
+
+    def __getitem__(self, key):
+        record = self.get(key)
+        if record is None:
+            raise KeyError(key)
+        return record
+
+    def __contains__(self, key):
+        return key in self._pending or key in self.store
+
+    def __len__(self):
+        with self._lock:
+            unsaved = list(self._pending)
+        return len(self.store) + sum(1 for key in unsaved if key not in self.store)
+
+    def __iter__(self):
+        return self.keys()
+
+    def keys(self):
+        with self._lock:
+            pending = set(self._pending)
+        yield from pending
+        for key in self.store.keys():
+            if key not in pending:
+                yield key
+
+    def values(self):
+        for _, record in self.items():
+            yield record
+
+    def items(self):
+        """Yields (key, record) for every cached plot, streamed from the store."""
+        with self._lock:
+            pending = dict(self._pending)
+        yield from pending.items()
+        for record in self.store.iter_plots():
+            key = PlotStore.make_key(record['giscode'], record['plotno'])
+            if key not in pending:
+                yield key, record
+
+    def giscodes(self, prefix=""):
+        """Sorted GIS codes of the villages with cached plots starting with prefix."""
+        with self._lock:
+            pending = {r['giscode'] for r in self._pending.values() if r['giscode'].startswith(prefix)}
+        return sorted(pending.union(self.store.giscodes(prefix)))
+
+    def village(self, giscode):
+        """Cached plot records of one village."""
+        with self._lock:
+            pending = {key: r for key, r in self._pending.items() if r['giscode'] == giscode}
+        records = []
+        for record in self.store.iter_plots(giscode):
+            key = PlotStore.make_key(giscode, record['plotno'])
+            records.append(pending.pop(key, record))
+        return records + list(pending.values())
@@ -0,0 +1,29 @@
+import argparse
+
+from mahabhumi_scraper import MahabhumiScraper
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Snapshot the Mahabhumi district/taluka/village hierarchy into the local list cache.")
+    parser.add_argument("--category", default="R", help="R (Rural) or U (Urban). Default: R")
+    parser.add_argument("--plots", action="store_true",
+                        help="Also cache the plot list of every village (slow)")
+    parser.add_argument("--missing-only", action="store_true",
+                        help="Only fetch entries that are missing or expired instead of refreshing all")
+    parser.add_argument("--workers", type=int, default=8, help="Parallel requests. Default: 8")
+    args = parser.parse_args()
+
+    scraper = MahabhumiScraper()
+    counts = scraper.prewarm_hierarchy(
+        category=args.category,
+        include_plot_lists=args.plots,
+        refresh=not args.missing_only,
+        max_workers=args.workers,
+    )
+    print(f"Done! {counts}")
+    print(f"Hierarchy is cached in {scraper.LISTS_FILE}")
+
+
+if __name__ == "__main__":
+    main()
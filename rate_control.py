@@ -0,0 +1,327 @@
+import asyncio
+import collections
+import contextlib
+import contextvars
+import random
+import threading
+import time
+
+# Outcomes reported back to the limiter for each upstream call
+OK = 'ok'
+TIMEOUT = 'timeout'
+SERVER_ERROR = 'server_error'
+CHALLENGE = 'challenge'
+CLIENT_ERROR = 'client_error'
+
+# Priority classes of upstream calls, most urgent first: a user waiting on
+# one answer, background refreshes and village streams, crawl jobs
+INTERACTIVE = 'interactive'
+PREFETCH = 'prefetch'
+BULK = 'bulk'
+PRIORITIES = (INTERACTIVE, PREFETCH, BULK)
+# A call of each class may only start while fewer than this fraction of the
+# limit is in flight (all classes counted), so a crawl leaves headroom for
+# interactive lookups
+DEFAULT_SHARES = {INTERACTIVE: 1.0, PREFETCH: 0.9, BULK: 0.75}
+
+_priority = contextvars.ContextVar('upstream_priority', default=INTERACTIVE)
+
+
+def current_priority():
+    """Priority class of upstream calls made from the current thread or task (INTERACTIVE by default)."""
+    return _priority.get()
+
+
+def set_priority(name):
+    """Sets the priority class for the rest of the current thread or task (e.g. as a pool initializer)."""
+    if name not in PRIORITIES:
+        raise ValueError(f"unknown priority {name!r}")
+    _priority.set(name)
+
+
+@contextlib.contextmanager
+def priority(name):
+    """Runs the body's upstream calls at priority class name."""
+    if name not in PRIORITIES:
+        raise ValueError(f"unknown priority {name!r}")
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def less_urgent(a, b):
+    """The less urgent of two priority classes."""
+    return max(a, b, key=PRIORITIES.index)
+
+
+class _AsyncWaiter:
+    """Queue ticket of a coroutine waiting in AdaptiveLimiter.acquire_async()."""
+
+    __slots__ = ('loop', 'future', 'start', 'admitted')
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.future = loop.create_future()
+        self.start = time.monotonic()
+        self.admitted = False
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(True)
+
+
+def classify_status(status_code, challenged=False):
+    """Maps a final HTTP status (and whether a 302 challenge preceded it) to an outcome."""
+    if status_code >= 500:
+        return SERVER_ERROR
+    if status_code >= 400:
+        return CLIENT_ERROR
+    if challenged:
+        return CHALLENGE
+    return OK
+
+
+class AdaptiveLimiter:
+    """
+    AIMD (additive increase, multiplicative decrease) concurrency limit for
+    upstream Mahabhumi calls.
+
+    Every successful, reasonably fast response grows the limit by about one
+    slot per round trip. Timeouts, 5xx responses and runs of 302 cookie
+    challenges cut it by `decrease`. Cuts are rate limited to one per
+    cooldown so a single burst of failures only halves the limit once.
+
+    Slots are handed out by priority class (see PRIORITIES): a call only
+    starts while the calls in flight are below its class's share of the
+    limit, and never ahead of a more urgent waiting call that could start.
+    Within a class, waiting calls start in arrival order; a thread that just
+    released a slot can't take it straight back from them. Coroutines wait in
+    the same queues (acquire_async()) and are handed their slot by whoever
+    frees it. Calls default to the class of the calling context (see priority()).
+    """
+
+    def __init__(self, initial=8, min_limit=1, max_limit=64, decrease=0.5,
+                 latency_tolerance=3.0, challenge_threshold=3, cooldown=2.0,
+                 base_backoff=0.5, max_backoff=30.0, shares=None):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease = decrease
+        # Stop growing once latency exceeds this multiple of the best seen
+        self.latency_tolerance = latency_tolerance
+        self.challenge_threshold = challenge_threshold
+        self.cooldown = cooldown
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.shares = dict(DEFAULT_SHARES, **(shares or {}))
+
+        self._limit = float(initial)
+        # Highest limit reached so far; backoff grows as we fall below it
+        self._peak = float(initial)
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._class_in_flight = dict.fromkeys(PRIORITIES, 0)
+        # Waiting calls of each class, in arrival order
+        self._queues = {p: collections.deque() for p in PRIORITIES}
+        self._admitted = dict.fromkeys(PRIORITIES, 0)
+        self._wait_ewma = dict.fromkeys(PRIORITIES, 0.0)
+        self._max_wait = dict.fromkeys(PRIORITIES, 0.0)
+        self._last_decrease = 0.0
+        self._consecutive_challenges = 0
+
+        self.latency_ewma = None
+        self.latency_min = None
+        self.counts = {OK: 0, TIMEOUT: 0, SERVER_ERROR: 0, CHALLENGE: 0, CLIENT_ERROR: 0}
+        self.decreases = 0
+
+    @property
+    def limit(self):
+        """Current number of upstream calls allowed in flight."""
+        return max(self.min_limit, int(self._limit))
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def class_limit(self, priority):
+        """How many calls may be in flight for a call of this class to start."""
+        return max(1, int(self.limit * self.shares[priority]))
+
+    def _can_start(self, priority, ticket=None):
+        if self._in_flight >= self.class_limit(priority):
+            return False
+        queue = self._queues[priority]
+        if queue and queue[0] is not ticket:
+            return False
+        for urgent in PRIORITIES[:PRIORITIES.index(priority)]:
+            if self._queues[urgent] and self._in_flight < self.class_limit(urgent):
+                return False
+        return True
+
+    def _admit(self, priority, waited):
+        self._in_flight += 1
+        self._class_in_flight[priority] += 1
+        self._admitted[priority] += 1
+        self._wait_ewma[priority] = 0.9 * self._wait_ewma[priority] + 0.1 * waited
+        self._max_wait[priority] = max(self._max_wait[priority], waited)
+
+    def try_acquire(self, priority=None):
+        """Takes a slot if one is free. Returns False without blocking otherwise."""
+        priority = priority or current_priority()
+        with self._cond:
+            if self._can_start(priority):
+                self._admit(priority, 0.0)
+                return True
+            return False
+
+    def acquire(self, timeout=None, priority=None):
+        """Blocks until a slot is free. Returns False if timeout expires first."""
+        priority = priority or current_priority()
+        start = time.monotonic()
+        ticket = object()
+        with self._cond:
+            queue = self._queues[priority]
+            queue.append(ticket)
+            try:
+                admitted = self._cond.wait_for(lambda: self._can_start(priority, ticket), timeout)
+            finally:
+                queue.remove(ticket)
+                # The next in line, or less urgent waiters holding back for us
+                self._cond.notify_all()
+            if not admitted:
+                self._wake_async()
+                return False
+            self._admit(priority, time.monotonic() - start)
+            self._wake_async()
+            return True
+
+    async def acquire_async(self, priority=None):
+        """Waits for a slot like acquire(), without blocking the event loop."""
+        priority = priority or current_priority()
+        waiter = _AsyncWaiter(asyncio.get_running_loop())
+        with self._cond:
+            self._queues[priority].append(waiter)
+            self._wake_async()
+        try:
+            await waiter.future
+        except BaseException:
+            with self._cond:
+                if waiter.admitted:
+                    # Handed a slot just as we were cancelled; give it back
+                    self._in_flight = max(0, self._in_flight - 1)
+                    self._class_in_flight[priority] = max(0, self._class_in_flight[priority] - 1)
+                elif waiter in self._queues[priority]:
+                    self._queues[priority].remove(waiter)
+                self._cond.notify_all()
+                self._wake_async()
+            raise
+        return True
+
+    def _wake_async(self):
+        """Admits coroutines at the head of their queue that may start; called with the lock held."""
+        woke = False
+        # Most urgent first, so a freed slot goes to the most urgent waiter
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            while queue and isinstance(queue[0], _AsyncWaiter) and self._can_start(priority, queue[0]):
+                waiter = queue.popleft()
+                waiter.admitted = True
+                self._admit(priority, time.monotonic() - waiter.start)
+                try:
+                    waiter.loop.call_soon_threadsafe(_wake, waiter.future)
+                except RuntimeError:
+                    # Its loop is gone, and the waiter with it
+                    self._in_flight -= 1
+                    self._class_in_flight[priority] -= 1
+                    continue
+                woke = True
+        if woke:
+            # Sync waiters queued behind them may be at the head now
+            self._cond.notify_all()
+
+    def release(self, outcome, latency=None, priority=None):
+        """Returns a slot and feeds the call's outcome and latency into the controller."""
+        priority = priority or current_priority()
+        with self._cond:
+            self._in_flight = max(0, self._in_flight - 1)
+            self._class_in_flight[priority] = max(0, self._class_in_flight[priority] - 1)
+            self.counts[outcome] = self.counts.get(outcome, 0) + 1
+
+            if latency is not None and outcome in (OK, CHALLENGE, CLIENT_ERROR):
+                self._observe_latency(latency)
+
+            if outcome == OK:
+                self._consecutive_challenges = 0
+                if self._latency_healthy():
+                    # +1/limit per success is roughly +1 per full window
+                    self._limit = min(self.max_limit, self._limit + 1.0 / self._limit)
+                    self._peak = max(self._peak, self._limit)
+            elif outcome == CHALLENGE:
+                self._consecutive_challenges += 1
+                if self._consecutive_challenges >= self.challenge_threshold:
+                    self._consecutive_challenges = 0
+                    self._decrease()
+            elif outcome in (TIMEOUT, SERVER_ERROR):
+                self._decrease()
+            # 4xx answers say nothing about upstream load
+
+            self._wake_async()
+            self._cond.notify_all()
+
+    def _observe_latency(self, latency):
+        if self.latency_ewma is None:
+            self.latency_ewma = latency
+        else:
+            self.latency_ewma = 0.8 * self.latency_ewma + 0.2 * latency
+        if self.latency_min is None or latency < self.latency_min:
+            self.latency_min = latency
+
+    def _latency_healthy(self):
+        if self.latency_ewma is None or not self.latency_min:
+            return True
+        return self.latency_ewma <= self.latency_min * self.latency_tolerance
+
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self._limit = max(float(self.min_limit), self._limit * self.decrease)
+        self.decreases += 1
+
+    def backoff_delay(self, attempt):
+        """
+        Seconds to wait before retry number `attempt` (0-based). Exponential
+        with jitter, and stretched while the limit is pressed down, so retries
+        stay short against a healthy upstream and long against a throttling one.
+        """
+        pressure = self._peak / float(max(self.limit, 1))
+        delay = self.base_backoff * (2 ** attempt) * (pressure ** 0.5)
+        return min(self.max_backoff, delay) * random.uniform(0.5, 1.0)
+
+    def stats(self):
+        """Snapshot of the controller state for logging and /api/upstream/stats."""
+        with self._cond:
+            return {
+                'limit': self.limit,
+                'in_flight': self._in_flight,
+                'min_limit': self.min_limit,
+                'max_limit': self.max_limit,
+                'latency_ewma': round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+                'latency_min': round(self.latency_min, 3) if self.latency_min is not None else None,
+                'decreases': self.decreases,
+                'outcomes': dict(self.counts),
+                'classes': {
+                    p: {
+                        'limit': self.class_limit(p),
+                        'in_flight': self._class_in_flight[p],
+                        'waiting': len(self._queues[p]),
+                        'admitted': self._admitted[p],
+                        'wait_ewma': round(self._wait_ewma[p], 3),
+                        'max_wait': round(self._max_wait[p], 3),
+                    }
+                    for p in PRIORITIES
+                },
+            }
@@ -0,0 +1,206 @@
+from collections import OrderedDict
+import threading
+
+import numpy as np
+
+import geometry
+
+# WGS84 ellipsoid
+_A = 6378137.0
+_F = 1 / 298.257223563
+_N = _F / (2 - _F)
+_K0 = 0.9996
+_FALSE_EASTING = 500000.0
+# Rectifying radius and the Krüger series coefficients (to n^4, well under 1 mm)
+_RECT = _A / (1 + _N) * (1 + _N ** 2 / 4 + _N ** 4 / 64)
+_ALPHA = np.array([
+    _N / 2 - 2 * _N ** 2 / 3 + 5 * _N ** 3 / 16 + 41 * _N ** 4 / 180,
+    13 * _N ** 2 / 48 - 3 * _N ** 3 / 5 + 557 * _N ** 4 / 1440,
+    61 * _N ** 3 / 240 - 103 * _N ** 4 / 140,
+    49561 * _N ** 4 / 161280,
+])
+_BETA = np.array([
+    _N / 2 - 2 * _N ** 2 / 3 + 37 * _N ** 3 / 96 - _N ** 4 / 360,
+    _N ** 2 / 48 + _N ** 3 / 15 - 437 * _N ** 4 / 1440,
+    17 * _N ** 3 / 480 - 37 * _N ** 4 / 840,
+    4397 * _N ** 4 / 161280,
+])
+_DELTA = np.array([
+    2 * _N - 2 * _N ** 2 / 3 - 2 * _N ** 3 + 116 * _N ** 4 / 45,
+    7 * _N ** 2 / 3 - 8 * _N ** 3 / 5 - 227 * _N ** 4 / 45,
+    56 * _N ** 3 / 15 - 136 * _N ** 4 / 35,
+    4279 * _N ** 4 / 630,
+])
+_E2N = 2 * np.sqrt(_N) / (1 + _N)  # the ellipsoid's first eccentricity
+_J2 = 2 * np.arange(1, 5).reshape(-1, 1)
+
+WGS84 = "EPSG:4326"
+WEB_MERCATOR = "EPSG:3857"
+# Spatial references that can be converted between: WGS84, the two UTM
+# zones covering Maharashtra (northern hemisphere) and web map tiles' Mercator
+UTM_ZONES = {"EPSG:32643": 43, "EPSG:32644": 44}
+SUPPORTED_SRS = (WGS84,) + tuple(UTM_ZONES) + (WEB_MERCATOR,)
+
+
+def normalize_srs(srs):
+    """'epsg:32643', '32643' or 'WGS84' -> 'EPSG:32643' / 'EPSG:4326'. Raises ValueError if unsupported."""
+    name = str(srs).strip().upper()
+    if name in ("WGS84", "CRS:84"):
+        name = WGS84
+    elif not name.startswith("EPSG:"):
+        name = "EPSG:" + name
+    if name not in SUPPORTED_SRS:
+        raise ValueError(f"unsupported SRS {srs}; use one of {', '.join(SUPPORTED_SRS)}")
+    return name
+
+
+def _central_meridian(zone):
+    return np.radians(zone * 6 - 183)
+
+
+def utm_to_lonlat(coords, zone):
+    """(n, 2) UTM easting/northing (northern hemisphere) -> (n, 2) longitude/latitude in degrees."""
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    xi = coords[:, 1] / (_K0 * _RECT)
+    eta = (coords[:, 0] - _FALSE_EASTING) / (_K0 * _RECT)
+
+    xi_p = xi - np.sum(_BETA[:, None] * np.sin(_J2 * xi) * np.cosh(_J2 * eta), axis=0)
+    eta_p = eta - np.sum(_BETA[:, None] * np.cos(_J2 * xi) * np.sinh(_J2 * eta), axis=0)
+    chi = np.arcsin(np.sin(xi_p) / np.cosh(eta_p))
+    lat = chi + np.sum(_DELTA[:, None] * np.sin(_J2 * chi), axis=0)
+    lon = _central_meridian(zone) + np.arctan2(np.sinh(eta_p), np.cos(xi_p))
+    return np.column_stack([np.degrees(lon), np.degrees(lat)])
+
+
+def lonlat_to_utm(coords, zone):
+    """(n, 2) longitude/latitude in degrees -> (n, 2) UTM easting/northing (northern hemisphere)."""
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    lon = np.radians(coords[:, 0]) - _central_meridian(zone)
+    sin_lat = np.sin(np.radians(coords[:, 1]))
+
+    t = np.sinh(np.arctanh(sin_lat) - _E2N * np.arctanh(_E2N * sin_lat))
+    xi_p = np.arctan2(t, np.cos(lon))
+    eta_p = np.arctanh(np.sin(lon) / np.sqrt(1 + t * t))
+    easting = eta_p + np.sum(_ALPHA[:, None] * np.cos(_J2 * xi_p) * np.sinh(_J2 * eta_p), axis=0)
+    northing = xi_p + np.sum(_ALPHA[:, None] * np.sin(_J2 * xi_p) * np.cosh(_J2 * eta_p), axis=0)
+    return np.column_stack([_FALSE_EASTING + _K0 * _RECT * easting, _K0 * _RECT * northing])
+
+
+def lonlat_to_mercator(coords):
+    """(n, 2) longitude/latitude in degrees -> (n, 2) spherical (web) Mercator metres."""
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    x = _A * np.radians(coords[:, 0])
+    y = _A * np.log(np.tan(np.pi / 4 + np.radians(coords[:, 1]) / 2))
+    return np.column_stack([x, y])
+
+
+def mercator_to_lonlat(coords):
+    """(n, 2) spherical (web) Mercator metres -> (n, 2) longitude/latitude in degrees."""
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    lon = np.degrees(coords[:, 0] / _A)
+    lat = np.degrees(2 * np.arctan(np.exp(coords[:, 1] / _A)) - np.pi / 2)
+    return np.column_stack([lon, lat])
+
+
+def _to_lonlat(coords, src):
+    if src == WGS84:
+        return coords
+    if src == WEB_MERCATOR:
+        return mercator_to_lonlat(coords)
+    return utm_to_lonlat(coords, UTM_ZONES[src])
+
+
+def _from_lonlat(lonlat, dst):
+    if dst == WGS84:
+        return lonlat
+    if dst == WEB_MERCATOR:
+        return lonlat_to_mercator(lonlat)
+    return lonlat_to_utm(lonlat, UTM_ZONES[dst])
+
+
+def transform(coords, src, dst):
+    """Transforms an (n, 2) coordinate array from SRS src to dst in one vectorized pass."""
+    src, dst = normalize_srs(src), normalize_srs(dst)
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    if src == dst or len(coords) == 0:
+        return coords.copy()
+    return _from_lonlat(_to_lonlat(coords, src), dst)
+
+
+def transform_geometries(geoms, src, dst):
+    """
+    Transforms a list of Geometry with a single transform() call over all
+    their coordinates, returning new Geometry with the same offsets.
+    """
+    geoms = list(geoms)
+    if not geoms:
+        return []
+    out = transform(np.concatenate([g.coords for g in geoms]), src, dst)
+    splits = np.cumsum([len(g.coords) for g in geoms])[:-1]
+    return [g._replace(coords=c) for g, c in zip(geoms, np.split(out, splits))]
+
+
+def to_geojson(geom, decimals=None):
+    """GeoJSON geometry dict (Polygon or MultiPolygon) of a Geometry."""
+    coords = geom.coords if decimals is None else np.round(geom.coords, decimals)
+    polygons = []
+    for p in range(len(geom.part_offsets) - 1):
+        polygon = []
+        for r in range(geom.part_offsets[p], geom.part_offsets[p + 1]):
+            polygon.append(coords[geom.ring_offsets[r]:geom.ring_offsets[r + 1]].tolist())
+        polygons.append(polygon)
+    if len(polygons) == 1:
+        return {'type': 'Polygon', 'coordinates': polygons[0]}
+    return {'type': 'MultiPolygon', 'coordinates': polygons}
+
+
+class ProjectedCache:
+    """
+    Bounded LRU of transformed plot geometries, keyed by the plot's geometry
+    (its packed blob or WKT) and the SRS pair, so an updated plot never hits
+    a stale entry. Misses of one batch are transformed together.
+    """
+
+    def __init__(self, max_entries=50000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(plot, src, dst):
+        blob = getattr(plot, 'geom_blob', None)
+        return (blob if blob is not None else plot['the_geom'], src, dst)
+
+    def geometries(self, plots, src, dst):
+        """Returns the geometries of plot records, transformed from src to dst."""
+        src, dst = normalize_srs(src), normalize_srs(dst)
+        keys = [self._key(p, src, dst) for p in plots]
+        result = [None] * len(keys)
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                geom = self._entries.get(key)
+                if geom is None:
+                    missing.append(i)
+                else:
+                    self._entries.move_to_end(key)
+                    result[i] = geom
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            projected = transform_geometries([geometry.plot_geometry(plots[i]) for i in missing], src, dst)
+            with self._lock:
+                for i, geom in zip(missing, projected):
+                    result[i] = geom
+                    self._entries[keys[i]] = geom
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'max_entries': self.max_entries,
+                    'hits': self.hits, 'misses': self.misses}
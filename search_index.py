@@ -0,0 +1,303 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+
+import numpy as np
+
+DEFAULT_SEARCH_FILE = "cache/search.db"
+
+# Query tokens this long also match longer tokens they start with ...
+PREFIX_MIN_LENGTH = 2
+# ... and tokens this long also match tokens one edit away
+FUZZY_MIN_LENGTH = 4
+# Most index tokens one query token may expand to by prefix or fuzzy match
+MAX_EXPANSIONS = 200
+
+EXACT, PREFIX, FUZZY = 3, 2, 1
+
+_DOC_ID = np.dtype('<u4')
+
+# Letters and digits of any script, plus Devanagari vowel signs and virama
+# (combining marks, which \w does not match and which would split words)
+_CHAR = r"(?:[^\W_]|[\u0900-\u0963\u0966-\u097f])"
+_TOKEN = re.compile(rf"{_CHAR}+(?:[./-]{_CHAR}+)*")
+_JOINERS = re.compile(r"[./-]")
+# Zero-width (non-)joiners are used inconsistently in typed Marathi
+_INVISIBLE = dict.fromkeys(map(ord, "\u200b\u200c\u200d\ufeff"))
+# Devanagari digits fold to ASCII so "१२३" and "123" are the same survey number
+_DIGITS = {0x0966 + i: str(i) for i in range(10)}
+
+
+def normalize(text):
+    """NFC, case-folded text with zero-width joiners dropped and Devanagari digits as ASCII."""
+    text = unicodedata.normalize('NFC', str(text)).translate(_INVISIBLE).translate(_DIGITS)
+    return text.casefold()
+
+
+def tokenize(text, parts=True):
+    """
+    Tokens of text. Punctuation inside a token ("12/3", "1.01") keeps it
+    whole; with parts, the pieces between the punctuation are tokens too.
+    """
+    tokens = []
+    for token in _TOKEN.findall(normalize(text)):
+        tokens.append(token)
+        if parts and _JOINERS.search(token):
+            tokens.extend(_JOINERS.split(token))
+    return tokens
+
+
+def deletes(token):
+    """token and every string one character deletion away from it."""
+    return {token} | {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+def within_one_edit(a, b):
+    """True if a and b differ by at most one insertion, deletion, substitution or adjacent transposition."""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return (a[i + 1:] == b[i + 1:]
+                or (i + 1 < len(a) and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:]))
+    return a[i:] == b[i + 1:]
+
+
+def document_tokens(record):
+    """{(token, field)} of a plot record: its plot number and every parsed owner record value."""
+    postings = {(token, 'plot_no') for token in tokenize(record['plotno'])}
+    for parsed in record.get('parsed_records') or []:
+        for field, value in parsed.items():
+            postings.update((token, field) for token in tokenize(value))
+    return postings
+
+
+class SearchIndex:
+    """
+    Persistent inverted index over cached plots, in SQLite.
+
+    Each plot gets an integer doc id; each token's posting list is the
+    sorted array of doc ids containing it, stored as one uint32 blob, so a
+    query term costs one row read and terms are combined with NumPy set
+    operations however common they are. docs also keeps every plot's own
+    (token, field) pairs, to update posting lists when it is re-indexed and
+    to report which fields matched.
+
+    Prefix matches are range scans over the token primary key. For fuzzy
+    matching every token of FUZZY_MIN_LENGTH or more is also stored under
+    its one-deletion variants (symmetric delete), so the tokens one edit
+    away from a query token are found with one indexed lookup of the
+    query's own deletions and then checked exactly.
+    """
+
+    def __init__(self, path=DEFAULT_SEARCH_FILE):
+        self.path = path
+        index_dir = os.path.dirname(path)
+        if index_dir and not os.path.exists(index_dir):
+            os.makedirs(index_dir, exist_ok=True)
+
+        self._local = threading.local()
+        # Posting list updates are read-modify-write; the lock serializes
+        # this process's threads, BEGIN IMMEDIATE other processes
+        self._write_lock = threading.Lock()
+        with self._conn() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS docs (
+                    id INTEGER PRIMARY KEY,
+                    key TEXT NOT NULL UNIQUE,
+                    tokens TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE TABLE IF NOT EXISTS postings (token TEXT PRIMARY KEY, docs BLOB NOT NULL)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS variants (
+                    variant TEXT NOT NULL,
+                    token TEXT NOT NULL,
+                    PRIMARY KEY (variant, token)
+                ) WITHOUT ROWID
+            """)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def keys(self):
+        """Keys ("giscode_plotno") of every indexed plot."""
+        return {key for (key,) in self._conn().execute("SELECT key FROM docs")}
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def _update(self, documents):
+        """
+        Applies {key: set of (token, field), or None to remove the plot} in
+        one transaction, editing only the posting lists whose membership
+        changed.
+        """
+        added, removed, variants = {}, {}, set()
+        conn = self._conn()
+        with self._write_lock, conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for key, postings in documents.items():
+                row = conn.execute("SELECT id, tokens FROM docs WHERE key = ?", (key,)).fetchone()
+                old = {token for token, _ in json.loads(row[1])} if row else set()
+                if postings is None:
+                    if row:
+                        conn.execute("DELETE FROM docs WHERE id = ?", (row[0],))
+                    new = set()
+                else:
+                    tokens = json.dumps(sorted(postings), ensure_ascii=False)
+                    if row:
+                        conn.execute("UPDATE docs SET tokens = ? WHERE id = ?", (tokens, row[0]))
+                    else:
+                        row = (conn.execute("INSERT INTO docs (key, tokens) VALUES (?, ?)", (key, tokens)).lastrowid,)
+                    new = {token for token, _ in postings}
+                for token in new - old:
+                    added.setdefault(token, []).append(row[0])
+                for token in old - new:
+                    removed.setdefault(token, []).append(row[0])
+
+            for token in added.keys() | removed.keys():
+                found = conn.execute("SELECT docs FROM postings WHERE token = ?", (token,)).fetchone()
+                ids = np.frombuffer(found[0], dtype=_DOC_ID) if found else np.empty(0, dtype=_DOC_ID)
+                if token in removed:
+                    ids = ids[~np.isin(ids, removed[token])]
+                if token in added:
+                    ids = np.union1d(ids, np.array(added[token], dtype=_DOC_ID))
+                if len(ids):
+                    conn.execute("INSERT OR REPLACE INTO postings (token, docs) VALUES (?, ?)",
+                                 (token, ids.astype(_DOC_ID).tobytes()))
+                else:
+                    conn.execute("DELETE FROM postings WHERE token = ?", (token,))
+                if not found and len(token) >= FUZZY_MIN_LENGTH:
+                    variants.update((variant, token) for variant in deletes(token))
+            conn.executemany("INSERT OR IGNORE INTO variants (variant, token) VALUES (?, ?)", variants)
+
+    def add_many(self, records):
+        """Indexes (or re-indexes) plot records in one transaction. Returns the number indexed."""
+        documents = {f"{r['giscode']}_{r['plotno']}": document_tokens(r) for r in records}
+        if documents:
+            self._update(documents)
+        return len(documents)
+
+    def remove(self, keys):
+        documents = dict.fromkeys(keys)
+        if documents:
+            self._update(documents)
+
+    def _expand(self, token):
+        """{index token: match kind} of the index tokens a query token matches."""
+        conn = self._conn()
+        matches = {}
+        if len(token) >= FUZZY_MIN_LENGTH:
+            candidates = list(deletes(token))
+            rows = conn.execute(
+                f"SELECT DISTINCT token FROM variants WHERE variant IN ({','.join('?' * len(candidates))})",
+                candidates,
+            )
+            for (found,) in rows:
+                if within_one_edit(token, found) and len(matches) < MAX_EXPANSIONS:
+                    matches[found] = FUZZY
+        if len(token) >= PREFIX_MIN_LENGTH:
+            rows = conn.execute(
+                "SELECT token FROM postings WHERE token > ? AND token < ? LIMIT ?",
+                (token, token + "\U0010ffff", MAX_EXPANSIONS),
+            )
+            matches.update((found, PREFIX) for (found,) in rows)
+        matches[token] = EXACT
+        return matches
+
+    def _term_scores(self, matches):
+        """(sorted doc ids, score of each) for one expanded query term; a doc scores its best match kind."""
+        conn = self._conn()
+        tokens = list(matches)
+        rows = conn.execute(
+            f"SELECT token, docs FROM postings WHERE token IN ({','.join('?' * len(tokens))})", tokens
+        ).fetchall()
+        if not rows:
+            return np.empty(0, dtype=_DOC_ID), np.empty(0, dtype=np.int64)
+        lists = [np.frombuffer(blob, dtype=_DOC_ID) for _, blob in rows]
+        ids = np.concatenate(lists)
+        kinds = np.repeat([matches[token] for token, _ in rows], [len(docs) for docs in lists])
+        order = np.lexsort((kinds, ids))
+        ids, kinds = ids[order], kinds[order]
+        last = np.append(ids[1:] != ids[:-1], True)
+        return ids[last], kinds[last]
+
+    def _in_prefix(self, ids, giscode_prefix):
+        """The doc ids among ids whose key starts with giscode_prefix."""
+        conn = self._conn()
+        if len(ids) <= 2000:
+            rows = conn.execute(
+                f"SELECT id, key FROM docs WHERE id IN ({','.join('?' * len(ids))})", ids.tolist()
+            )
+            keep = [doc_id for doc_id, key in rows if key.startswith(giscode_prefix)]
+        else:
+            rows = conn.execute("SELECT id FROM docs WHERE key >= ? AND key < ?",
+                                (giscode_prefix, giscode_prefix + "\U0010ffff"))
+            keep = [doc_id for (doc_id,) in rows]
+        return np.isin(ids, np.array(keep, dtype=_DOC_ID))
+
+    def search(self, query, giscode_prefix="", limit=50):
+        """
+        Plots matching every token of query, best first, as dicts with the
+        plot key, a score (3 per exact token match, 2 per prefix match, 1
+        per fuzzy match) and the record fields that matched. Only plots of
+        villages whose GIS code starts with giscode_prefix are considered.
+        Equal scores keep indexing order.
+        """
+        terms = list(dict.fromkeys(tokenize(query, parts=False)))
+        if not terms:
+            return []
+        expansions = [self._expand(term) for term in terms]
+        ids = scores = None
+        for matches in expansions:
+            term_ids, term_scores = self._term_scores(matches)
+            if ids is None:
+                ids, scores = term_ids, term_scores
+            else:
+                # Every term must match
+                ids, left, right = np.intersect1d(ids, term_ids, assume_unique=True, return_indices=True)
+                scores = scores[left] + term_scores[right]
+            if not len(ids):
+                return []
+        if giscode_prefix:
+            keep = self._in_prefix(ids, giscode_prefix)
+            ids, scores = ids[keep], scores[keep]
+        top = np.lexsort((ids, -scores))[:limit]
+        ids, scores = ids[top].tolist(), scores[top].tolist()
+        if not ids:
+            return []
+
+        matched = set().union(*expansions)
+        rows = dict((doc_id, (key, tokens)) for doc_id, key, tokens in self._conn().execute(
+            f"SELECT id, key, tokens FROM docs WHERE id IN ({','.join('?' * len(ids))})", ids
+        ))
+        results = []
+        for doc_id, score in zip(ids, scores):
+            key, tokens = rows[doc_id]
+            fields = sorted({field for token, field in json.loads(tokens) if token in matched})
+            results.append({'key': key, 'score': score, 'fields': fields})
+        return results
+
+    def stats(self):
+        conn = self._conn()
+        return {
+            'plots': len(self),
+            'tokens': conn.execute("SELECT COUNT(*) FROM postings").fetchone()[0],
+            'postings': conn.execute("SELECT COALESCE(SUM(LENGTH(docs)), 0) FROM postings").fetchone()[0] // 4,
+        }
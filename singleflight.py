@@ -0,0 +1,72 @@
+import threading
+
+
+class _Call:
+    """One in-flight call that any number of callers can wait on."""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self, timeout=None):
+        """Blocks until the leader finishes, then returns its result or re-raises its error."""
+        if not self._done.wait(timeout):
+            raise TimeoutError("single-flight call did not finish in time")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls with the same key.
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is still running wait for it and share its result
+    instead of issuing their own upstream request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def begin(self, key):
+        """
+        Registers interest in key. Returns (call, is_leader). The leader must
+        call finish(); everyone else waits with call.wait().
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                return call, False
+            call = _Call()
+            self._calls[key] = call
+            return call, True
+
+    def finish(self, key, call, result=None, error=None):
+        """Publishes the leader's result (or error) and wakes all waiters."""
+        call.result = result
+        call.error = error
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call._done.set()
+
+    def do(self, key, fn, *args, **kwargs):
+        """Runs fn(*args, **kwargs) once per key among concurrent callers."""
+        call, is_leader = self.begin(key)
+        if not is_leader:
+            return call.wait()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self.finish(key, call, error=e)
+            raise
+        self.finish(key, call, result=result)
+        return result
+
+    def in_flight(self):
+        """Number of distinct keys currently being fetched."""
+        with self._lock:
+            return len(self._calls)
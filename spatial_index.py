@@ -0,0 +1,157 @@
+import math
+import threading
+
+import numpy as np
+
+_EMPTY = (np.inf, np.inf, -np.inf, -np.inf)
+
+
+def _overlaps(b, bbox):
+    return (b[:, 0] <= bbox[2]) & (b[:, 2] >= bbox[0]) & (b[:, 1] <= bbox[3]) & (b[:, 3] >= bbox[1])
+
+
+class STRTree:
+    """
+    Static R-tree of bounding boxes packed with Sort-Tile-Recursive.
+
+    Boxes are sorted into vertical slices by x, then by y within a slice, and
+    grouped `capacity` at a time into leaves; each level above groups
+    consecutive nodes of the level below. Every level is one (n, 4) array and node i's
+    children are entries i * capacity .. (i + 1) * capacity - 1 of the level
+    below, so a query is a few vectorized comparisons per level.
+    """
+
+    def __init__(self, bounds, capacity=16):
+        bounds = np.asarray(bounds, dtype=np.float64).reshape(-1, 4)
+        self.capacity = capacity
+        n = len(bounds)
+
+        # Sort-Tile-Recursive order of the boxes
+        n_leaves = max(1, math.ceil(n / capacity))
+        slice_size = math.ceil(math.sqrt(n_leaves)) * capacity
+        cx = (bounds[:, 0] + bounds[:, 2]) / 2
+        cy = (bounds[:, 1] + bounds[:, 3]) / 2
+        by_x = np.argsort(cx, kind='stable')
+        slices = np.split(by_x, range(slice_size, n, slice_size))
+        order = np.concatenate([s[np.argsort(cy[s], kind='stable')] for s in slices])
+
+        self.order = self._pad(order, -1)
+        level = self._pad(bounds[order], _EMPTY)
+        self.levels = [level]
+        while len(level) > capacity:
+            groups = level.reshape(-1, capacity, 4)
+            level = np.column_stack([groups[:, :, 0].min(axis=1), groups[:, :, 1].min(axis=1),
+                                     groups[:, :, 2].max(axis=1), groups[:, :, 3].max(axis=1)])
+            level = self._pad(level, _EMPTY)
+            self.levels.append(level)
+
+    def _pad(self, values, fill):
+        # Whole groups only; an empty tree still gets one (empty) leaf
+        missing = -len(values) % self.capacity if len(values) else self.capacity
+        if not missing:
+            return values
+        return np.concatenate([values, np.full((missing,) + values.shape[1:], fill, dtype=values.dtype)])
+
+    def query(self, bbox):
+        """Indices (into the boxes the tree was built from) of boxes intersecting bbox."""
+        top = self.levels[-1]
+        candidates = np.flatnonzero(_overlaps(top, bbox))
+        steps = np.arange(self.capacity)
+        for level in reversed(self.levels[:-1]):
+            if len(candidates) == 0:
+                break
+            children = (candidates[:, None] * self.capacity + steps).ravel()
+            candidates = children[_overlaps(level[children], bbox)]
+        return self.order[candidates]
+
+
+class SpatialIndex:
+    """
+    Bounding-box index of keyed items that accepts inserts at any time.
+
+    Items live in an STRTree that is rebuilt in bulk; items inserted since
+    the last build go to a small pending list that queries scan linearly.
+    Once the pending list grows past rebuild_ratio of the tree (and at least
+    min_rebuild items) the tree is rebuilt on the next query. Re-inserting a
+    key replaces its box.
+    """
+
+    def __init__(self, capacity=16, rebuild_ratio=0.1, min_rebuild=1024):
+        self.capacity = capacity
+        self.rebuild_ratio = rebuild_ratio
+        self.min_rebuild = min_rebuild
+        self._lock = threading.Lock()
+        self._keys = []
+        self._bounds = []
+        self._alive = []
+        self._slots = {}
+        self._tree = None
+        self._tree_size = 0  # items [0, _tree_size) are in the tree
+        self.rebuilds = 0
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, key):
+        return key in self._slots
+
+    def insert(self, key, bounds):
+        """Adds or replaces the bounding box (min_x, min_y, max_x, max_y) of key."""
+        with self._lock:
+            old = self._slots.get(key)
+            if old is not None:
+                self._alive[old] = False
+            self._slots[key] = len(self._keys)
+            self._keys.append(key)
+            self._bounds.append(tuple(bounds))
+            self._alive.append(True)
+
+    def bulk_insert(self, items):
+        """Adds many (key, bounds) pairs and rebuilds the tree once."""
+        for key, bounds in items:
+            self.insert(key, bounds)
+        with self._lock:
+            self._rebuild()
+
+    def remove(self, key):
+        with self._lock:
+            slot = self._slots.pop(key, None)
+            if slot is not None:
+                self._alive[slot] = False
+
+    def _rebuild(self):
+        # Drop replaced and removed items while rebuilding
+        live = [i for i, alive in enumerate(self._alive) if alive]
+        self._keys = [self._keys[i] for i in live]
+        self._bounds = [self._bounds[i] for i in live]
+        self._alive = [True] * len(live)
+        self._slots = {key: i for i, key in enumerate(self._keys)}
+        self._tree = STRTree(self._bounds, self.capacity)
+        self._tree_size = len(self._keys)
+        self.rebuilds += 1
+
+    def query(self, bbox):
+        """Keys whose bounding box intersects bbox (min_x, min_y, max_x, max_y)."""
+        with self._lock:
+            pending = len(self._keys) - self._tree_size
+            if self._tree is None or pending > max(self.min_rebuild, self.rebuild_ratio * self._tree_size):
+                self._rebuild()
+                pending = 0
+            hits = self._tree.query(bbox).tolist()
+            if pending:
+                tail = np.array(self._bounds[self._tree_size:], dtype=np.float64)
+                hits.extend((np.flatnonzero(_overlaps(tail, bbox)) + self._tree_size).tolist())
+            return [self._keys[i] for i in hits if self._alive[i]]
+
+    def query_point(self, x, y):
+        """Keys whose bounding box contains the point."""
+        return self.query((x, y, x, y))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'items': len(self._slots),
+                'indexed': self._tree_size,
+                'pending': len(self._keys) - self._tree_size,
+                'rebuilds': self.rebuilds,
+            }
@@ -0,0 +1,145 @@
+import asyncio
+import tempfile
+import threading
+import time
+
+from aiohttp import web
+
+import rate_control
+import ttl_cache
+from async_scraper import AsyncMahabhumiScraper
+from test_scraper_cache import make_scraper, seed_store
+
+GEOM = "POLYGON((0 0,10 0,10 10,0 10,0 0))"
+
+
+def make_app(stats):
+    """Fake upstream that demands a cookie (302) before answering."""
+    async def challenge(request):
+        if request.cookies.get("JSESSIONID") != "ok":
+            stats['challenges'] += 1
+            resp = web.Response(status=302, headers={"Location": str(request.url)})
+            resp.set_cookie("JSESSIONID", "ok")
+            return resp
+        return None
+
+    async def plot_list(request):
+        return await challenge(request) or web.json_response(["1", "2", "3", "404"])
+
+    async def plot_info(request):
+        denied = await challenge(request)
+        if denied:
+            return denied
+        form = await request.post()
+        stats['plot_posts'] += 1
+        if form['plotno'] == "404":
+            return web.json_response({})
+        return web.json_response({
+            'the_geom': GEOM,
+            'info': "Survey No. : %s\nTotal Area : 1.01\n" % form['plotno'],
+        })
+
+    app = web.Application()
+    app.router.add_post("/rest/VillageMapService/kidelistFromGisCodeMH", plot_list)
+    app.router.add_post("/rest/MapInfo/getPlotInfo", plot_info)
+    return app
+
+
+async def run_crawl(tmp, stats, prepare=None):
+    runner = web.AppRunner(make_app(stats))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        scraper = make_scraper(tmp)
+        scraper.BASE_URL = f"http://127.0.0.1:{port}/rest"
+        if prepare:
+            prepare(scraper)
+        engine = AsyncMahabhumiScraper(scraper, max_in_flight=8)
+        boundaries = await engine.fetch_village_boundaries_async("RVM0502270500020047510000")
+        return scraper, boundaries
+    finally:
+        await runner.cleanup()
+
+
+def test_async_village_crawl():
+    stats = {'challenges': 0, 'plot_posts': 0}
+    with tempfile.TemporaryDirectory() as tmp:
+        scraper, boundaries = asyncio.run(run_crawl(tmp, stats))
+
+        assert sorted(b['plot_no'] for b in boundaries) == ["1", "2", "3"]
+        assert boundaries[0]['geometry'] == GEOM
+        assert boundaries[0]['owner_info'][0]['Total Area'] == "1.01"
+        assert stats['challenges'] >= 1
+        # Results land in the shared cache and store like the sync engine's
+        assert len(scraper.store) == 3
+        found, missing = scraper.lookup_cached("RVM0502270500020047510000", ["1", "404"])
+        assert len(found) == 1 and missing == ["404"]
+
+
+def test_store_access_runs_off_the_event_loop():
+    stats = {'challenges': 0, 'plot_posts': 0}
+    calls = []
+
+    def prepare(scraper):
+        loop_thread = threading.get_ident()
+        targets = [(scraper, name) for name in ('_cache_plot', '_record_missing', '_known_missing',
+                                                 '_skipped_missing', '_crawl_summary')]
+        targets += [(scraper.plot_cache, 'get'), (scraper.plot_cache, 'get_many'),
+                    (scraper.list_cache, 'lookup'), (scraper.list_cache, 'set')]
+        for owner, name in targets:
+            def recorded(*args, _call=getattr(owner, name), _name=name):
+                calls.append((_name, threading.get_ident() != loop_thread))
+                return _call(*args)
+            setattr(owner, name, recorded)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        seed_store(tmp, "RVM0502270500020047510000", ["2"])
+        scraper, boundaries = asyncio.run(run_crawl(tmp, stats, prepare))
+
+        assert len(boundaries) == 3
+        # Plot 2 came from one batched lookup; 1 and 3 were fetched and
+        # cached, 404 recorded missing, none of it on the loop thread
+        assert stats['plot_posts'] == 3
+        names = [name for name, _ in calls]
+        assert names.count('get_many') == 1 and names.count('_cache_plot') == 2
+        assert names.count('_record_missing') == 1
+        assert all(off_loop for _, off_loop in calls)
+
+
+def test_stale_plot_list_is_revalidated():
+    stats = {'challenges': 0, 'plot_posts': 0}
+    key = "plots:RVM0502270500020047510000"
+    refreshes = []
+
+    def prepare(scraper):
+        # Cached ten days ago: past the list TTL, within the stale window
+        clock = scraper.list_cache.clock
+        scraper.list_cache.clock = lambda: clock() - 10 * 86400
+        scraper.list_cache.set(key, ["1", "2"])
+        scraper.list_cache.clock = clock
+
+        def request_plot_list(gis_code):
+            refreshes.append((gis_code, rate_control.current_priority()))
+            return ["1", "2", "3"]
+        scraper._request_plot_list = request_plot_list
+
+    with tempfile.TemporaryDirectory() as tmp:
+        scraper, boundaries = asyncio.run(run_crawl(tmp, stats, prepare))
+
+        # The stale list is served at once and refreshed in the background
+        assert sorted(b['plot_no'] for b in boundaries) == ["1", "2"]
+        for _ in range(200):
+            if scraper.list_cache.lookup(key)[1] == ttl_cache.FRESH:
+                break
+            time.sleep(0.01)
+        assert scraper.list_cache.lookup(key) == (["1", "2", "3"], ttl_cache.FRESH)
+        assert refreshes == [("RVM0502270500020047510000", rate_control.PREFETCH)]
+
+
+if __name__ == "__main__":
+    test_async_village_crawl()
+    test_store_access_runs_off_the_event_loop()
+    test_stale_plot_list_is_revalidated()
+    print("All tests passed!")
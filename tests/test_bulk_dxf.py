@@ -0,0 +1,50 @@
+import os
+import sys
+import tempfile
+
+import ezdxf
+
+import bulk_dxf
+from plot_store import PlotStore
+
+
+def test_bulk_dxf_per_village_and_merged():
+    with tempfile.TemporaryDirectory() as tmp:
+        store_path = os.path.join(tmp, "plots.db")
+        store = PlotStore(store_path)
+        for village, plot_nos in (("RVM0527000000000000000001", ["1", "2", "10"]),
+                                  ("RVM0527000000000000000002", ["5"]),
+                                  ("RVM0599000000000000000001", ["7"])):
+            store.upsert_many([
+                {'giscode': village, 'plotno': p, 'the_geom': f"POLYGON(({p} 0,{p} 1,0 1,{p} 0))"}
+                for p in plot_nos
+            ])
+        out = os.path.join(tmp, "out")
+
+        argv = sys.argv
+        sys.argv = ["bulk_dxf.py", "--prefix", "RVM0527", "--store", store_path, "--out", out,
+                    "--merge", "--labels", "--workers", "2"]
+        try:
+            bulk_dxf.main()
+        finally:
+            sys.argv = argv
+
+        assert sorted(os.listdir(out)) == ["RVM0527000000000000000001.dxf", "RVM0527000000000000000002.dxf",
+                                           "merged.dxf"]
+        village = ezdxf.readfile(os.path.join(out, "RVM0527000000000000000001.dxf")).modelspace()
+        assert [t.dxf.text for t in village.query('TEXT[layer=="PLOT_NUMBERS"]')] == ["1", "2", "10"]
+        # One label per vertex with --labels
+        assert len(village.query('TEXT[layer=="COORDINATE_LABELS"]')) == 12
+
+        merged = ezdxf.readfile(os.path.join(out, "merged.dxf"))
+        entities = list(merged.modelspace())
+        assert sorted(t.dxf.text for t in merged.modelspace().query('TEXT[layer=="PLOT_NUMBERS"]')) == \
+            ["1", "10", "2", "5"]
+        handles = [e.dxf.handle for e in entities]
+        assert len(set(handles)) == len(handles)
+        assert max(int(h, 16) for h in handles) < int(merged.header['$HANDSEED'], 16)
+
+
+if __name__ == "__main__":
+    test_bulk_dxf_per_village_and_merged()
+    print("Test passed!")
@@ -0,0 +1,201 @@
+import os
+import tempfile
+import threading
+import time
+
+import app as app_module
+import crawl_jobs
+from crawl_jobs import CrawlJobManager, JobStore
+from test_scraper_cache import FakeResponse, make_scraper
+
+VILLAGES = {"RVM0502270500020047510000": ["1", "2", "3"], "RVM0502270500020047520000": ["1", "2"]}
+
+
+class FakeUpstream:
+    """Serves one taluka (05/02) of two villages; plot 3 of the first village has no geometry."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.plot_requests = []
+        self.on_plot = None
+        self.on_plot_list = None
+
+    def __call__(self, url, data, headers=None, timeout=15):
+        if url.endswith("ListsAfterLevelGeoref"):
+            assert data['codes'] == "R,05,02,"
+            return FakeResponse([[{'code': giscode[7:], 'value': giscode[-6:]} for giscode in VILLAGES]])
+        if url.endswith("kidelistFromGisCodeMH"):
+            if self.on_plot_list:
+                self.on_plot_list(data['logedLevels'])
+            return FakeResponse(VILLAGES[data['logedLevels']])
+        key = f"{data['giscode']}_{data['plotno']}"
+        with self.lock:
+            self.plot_requests.append(key)
+        if self.on_plot:
+            self.on_plot(key)
+        if key == "RVM0502270500020047510000_3":
+            return FakeResponse({})
+        return FakeResponse({'the_geom': "POLYGON((0 0,1 0,1 1,0 0))"})
+
+
+def _scraper(tmp, upstream):
+    scraper = make_scraper(tmp)
+    scraper._post = upstream
+    return scraper
+
+
+def test_parse_target():
+    assert crawl_jobs.parse_target("rvm25") == ('R', "25", None, None)
+    assert crawl_jobs.parse_target("UVM2502") == ('U', "25", "02", None)
+    assert crawl_jobs.parse_target("RVM2502272500020303690000")[3] == "272500020303690000"
+    try:
+        crawl_jobs.parse_target("RVM250")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("expected ValueError")
+
+
+def test_job_resumes_after_a_crash_without_refetching():
+    with tempfile.TemporaryDirectory() as tmp:
+        upstream = FakeUpstream()
+        store = JobStore(os.path.join(tmp, "jobs.db"))
+        manager = CrawlJobManager(_scraper(tmp, upstream), store, autostart=False)
+        job_id = manager.submit(["RVM0502"])['id']
+
+        def crash(giscode):
+            if giscode.endswith("520000"):
+                raise KeyboardInterrupt
+        upstream.on_plot_list = crash
+        try:
+            manager.run_pending()
+        except KeyboardInterrupt:
+            pass
+        else:
+            raise AssertionError("expected the crash")
+        # Interrupted, the job goes back to the queue
+        assert store.get(job_id)['status'] == crawl_jobs.QUEUED
+        assert [v['status'] for v in store.villages(job_id)] == [crawl_jobs.DONE, crawl_jobs.PENDING]
+
+        # A process that died holding it leaves it running until the lease expires
+        assert store.claim(job_id, "dead")
+        upstream.on_plot_list = None
+        manager = CrawlJobManager(_scraper(tmp, upstream), store, autostart=False)
+        manager.run_pending()
+        assert store.get(job_id)['status'] == crawl_jobs.RUNNING
+        manager.LEASE_TTL = 0
+
+        # A new process then picks the job up with the second village
+        manager.run_pending()
+        job = manager.job(job_id)
+        assert job['status'] == crawl_jobs.DONE
+        assert job['villages'] == {'total': 2, 'done': 2, 'failed': 0}
+        plots = job['plots']
+        assert (plots['total'], plots['processed'], plots['found'], plots['not_found']) == (5, 5, 4, 1)
+        assert sorted(upstream.plot_requests) == sorted(f"{g}_{p}" for g, nos in VILLAGES.items() for p in nos)
+
+
+def test_jobs_api_pause_and_resume():
+    with tempfile.TemporaryDirectory() as tmp:
+        upstream = FakeUpstream()
+        scraper = _scraper(tmp, upstream)
+        app_module._scraper = scraper
+        app_module._job_manager = manager = CrawlJobManager(scraper, JobStore(os.path.join(tmp, "jobs.db")),
+                                                            autostart=False)
+        try:
+            client = app_module.app.test_client()
+            assert client.post("/api/jobs", json={'targets': ["Pune"]}).status_code == 400
+            resp = client.post("/api/jobs", json={'targets': list(VILLAGES)})
+            assert resp.status_code == 201
+            job_id = resp.get_json()['id']
+
+            # Paused through the API while its first village is being crawled
+            upstream.on_plot = lambda key: client.post(f"/api/jobs/{job_id}/pause") if key.endswith("_1") else None
+            manager.run_pending()
+            job = client.get(f"/api/jobs/{job_id}").get_json()
+            assert job['status'] == crawl_jobs.PAUSED
+            assert job['village_list'][0]['status'] == crawl_jobs.PENDING
+
+            upstream.on_plot = None
+            assert client.post(f"/api/jobs/{job_id}/resume").get_json()['status'] == crawl_jobs.QUEUED
+            manager.run_pending()
+            job = client.get("/api/jobs").get_json()[0]
+            assert job['status'] == crawl_jobs.DONE
+            assert job['plots']['found'] == 4 and job['errors'] == []
+            # Nothing was fetched twice
+            assert len(upstream.plot_requests) == len(set(upstream.plot_requests)) == 5
+
+            assert client.get("/api/jobs/99").status_code == 404
+            assert client.post(f"/api/jobs/{job_id}/restart").status_code == 400
+        finally:
+            app_module._scraper = None
+            app_module._job_manager = None
+
+
+def test_running_jobs_are_leased_to_one_process():
+    with tempfile.TemporaryDirectory() as tmp:
+        upstream = FakeUpstream()
+        store = JobStore(os.path.join(tmp, "jobs.db"))
+        job_id = store.create(list(VILLAGES))
+        # Another server worker holds the job and is still renewing it
+        assert store.claim(job_id, "other")
+        assert not store.claim(job_id, "third")
+
+        manager = CrawlJobManager(_scraper(tmp, upstream), store, autostart=False)
+        manager.run_pending()
+        assert store.get(job_id)['owner'] == "other" and upstream.plot_requests == []
+
+        # Pausing it here is passed on to its owner at the next heartbeat
+        assert manager.pause(job_id)['status'] == crawl_jobs.RUNNING
+        assert store.renew(job_id, "other") == (True, crawl_jobs.PAUSED)
+        store.release(job_id, "other", crawl_jobs.PAUSED)
+        assert store.get(job_id)['status'] == crawl_jobs.PAUSED
+        assert store.get(job_id)['stop_requested'] is None
+        # Only the lease holder ends a run
+        store.release(job_id, "third", crawl_jobs.DONE)
+        assert store.get(job_id)['status'] == crawl_jobs.PAUSED
+
+
+def test_worker_picks_up_jobs_queued_by_other_processes():
+    with tempfile.TemporaryDirectory() as tmp:
+        upstream = FakeUpstream()
+        path = os.path.join(tmp, "jobs.db")
+        manager = CrawlJobManager(_scraper(tmp, upstream), JobStore(path), autostart=False)
+        manager.POLL_INTERVAL = manager.HEARTBEAT_INTERVAL = 0.05
+        paused = threading.Event()
+
+        def pause_from_cli(key):
+            # The CLI's pause, from its own process, while the job runs
+            if key.endswith("_1") and not paused.is_set():
+                paused.set()
+                CrawlJobManager(None, JobStore(path), autostart=False).pause(job_id)
+                time.sleep(0.2)
+        upstream.on_plot = pause_from_cli
+        manager.start()
+        try:
+            # As `crawl_jobs.py submit` does: a row in jobs.db, no wake-up
+            job_id = CrawlJobManager(None, JobStore(path), autostart=False).submit(list(VILLAGES))['id']
+            for _ in range(200):
+                if manager.store.get(job_id)['status'] == crawl_jobs.PAUSED:
+                    break
+                time.sleep(0.01)
+            assert manager.store.get(job_id)['status'] == crawl_jobs.PAUSED
+
+            CrawlJobManager(None, JobStore(path), autostart=False).resume(job_id)
+            for _ in range(200):
+                if manager.store.get(job_id)['status'] == crawl_jobs.DONE:
+                    break
+                time.sleep(0.01)
+            assert manager.job(job_id)['plots']['found'] == 4
+        finally:
+            manager.close()
+            manager._thread.join(2)
+
+
+if __name__ == "__main__":
+    test_parse_target()
+    test_job_resumes_after_a_crash_without_refetching()
+    test_jobs_api_pause_and_resume()
+    test_running_jobs_are_leased_to_one_process()
+    test_worker_picks_up_jobs_queued_by_other_processes()
+    print("All tests passed!")
@@ -0,0 +1,80 @@
+import numpy as np
+
+import geometry
+from generate_sample_dxf import parse_wkt_rings
+
+POLYGON = "POLYGON((373000.5 2068000.25,373010 2068000.25,373010 2068010,373000.5 2068000.25))"
+MULTI = ("MULTIPOLYGON(((0 0,10 0,10 10,0 10,0 0),(2 2,4 2,4 4,2 2)),"
+         "((20 20,30 20,30 30,20 20)))")
+
+
+def test_parse_polygon():
+    geom = geometry.parse_wkt(POLYGON)
+    assert geom.coords.shape == (4, 2)
+    assert geom.coords.flags['C_CONTIGUOUS']
+    assert list(geom.ring_offsets) == [0, 4]
+    assert list(geom.part_offsets) == [0, 1]
+    assert geometry.bounds(geom) == (373000.5, 2068000.25, 373010.0, 2068010.0)
+
+
+def test_parse_multipolygon_with_hole():
+    geom = geometry.parse_wkt(MULTI)
+    assert list(geom.ring_offsets) == [0, 5, 9, 13]
+    # First polygon has an outer ring and a hole, second a single ring
+    assert list(geom.part_offsets) == [0, 2, 3]
+    ring_list = geometry.rings(geom)
+    assert len(ring_list) == 3
+    np.testing.assert_array_equal(ring_list[1][0], [2, 2])
+
+    # Round trip through WKT keeps structure and values
+    again = geometry.parse_wkt(geometry.to_wkt(geom))
+    np.testing.assert_array_equal(again.coords, geom.coords)
+    np.testing.assert_array_equal(again.part_offsets, geom.part_offsets)
+
+
+def test_z_values_and_empty_input():
+    geom = geometry.parse_wkt("POLYGON Z((0 0 5,1 0 5,1 1 5,0 0 5))")
+    assert geom.coords.shape == (4, 2)
+    assert geometry.parse_wkt("") is geometry.EMPTY
+    assert geometry.bounds(geometry.EMPTY) is None
+    assert geometry.union_bounds([geometry.EMPTY, geometry.parse_wkt(POLYGON)])[0] == 373000.5
+
+
+def test_cached_per_plot_and_legacy_rings():
+    plot = {'the_geom': MULTI}
+    assert geometry.plot_geometry(plot) is geometry.plot_geometry(dict(plot))
+    rings = parse_wkt_rings(MULTI)
+    assert rings[2] == [(20.0, 20.0), (30.0, 20.0), (30.0, 30.0), (20.0, 20.0)]
+
+
+def test_pack_round_trip_is_exact():
+    lonlat = "POLYGON((73.123456789012345 18.5,73.2 18.6,73.1 18.7,73.123456789012345 18.5))"
+    for wkt in (POLYGON, MULTI, lonlat, ""):
+        geom = geometry.parse_wkt(wkt)
+        blob = geometry.pack(geom)
+        again = geometry.unpack(blob)
+        np.testing.assert_array_equal(again.coords, geom.coords)
+        np.testing.assert_array_equal(again.ring_offsets, geom.ring_offsets)
+        np.testing.assert_array_equal(again.part_offsets, geom.part_offsets)
+    # Fixed-point deltas make survey coordinates much smaller than their WKT
+    assert len(geometry.pack(geometry.parse_wkt(MULTI))) < len(MULTI)
+
+
+def test_packed_wkt_keeps_type_and_digits():
+    single_part_multi = "MULTIPOLYGON(((373000.123456789 2068000.98765432,373010.5 2068000.1,373000.123456789 2068000.98765432)))"
+    precise = "POLYGON((73.12345678901234 18.123456789012344,73.2 18.6,73.12345678901234 18.123456789012344))"
+    for wkt in (POLYGON, MULTI, single_part_multi, precise):
+        assert geometry.to_wkt(geometry.unpack(geometry.pack(geometry.parse_wkt(wkt)))) == wkt
+    # Spaces after commas are not kept, the numbers are
+    spaced = "POLYGON((0 0, 1.5 0, 1 1, 0 0))"
+    assert geometry.to_wkt(geometry.parse_wkt(spaced)) == "POLYGON((0 0,1.5 0,1 1,0 0))"
+
+
+if __name__ == "__main__":
+    test_parse_polygon()
+    test_parse_multipolygon_with_hole()
+    test_z_values_and_empty_input()
+    test_cached_per_plot_and_legacy_rings()
+    test_pack_round_trip_is_exact()
+    test_packed_wkt_keeps_type_and_digits()
+    print("Test passed!")
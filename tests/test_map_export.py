@@ -0,0 +1,113 @@
+import io
+import os
+import tempfile
+import threading
+import zipfile
+
+from PIL import Image
+
+import app as app_module
+import map_export
+from test_scraper_cache import make_scraper, seed_store
+from tile_cache import TileCache
+
+
+class FakeResponse:
+    def __init__(self, content):
+        self.content = content
+        self.headers = {'Content-Type': 'image/png'}
+        self.text = ""
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeWMS:
+    """Answers GetMap with a tile whose colour encodes its column and row."""
+
+    def __init__(self, grid):
+        self.origin_x, _, _, self.top = grid['bbox']
+        self.span = map_export.TILE_SIZE * grid['resolution']
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def get(self, url, params, timeout):
+        with self.lock:
+            self.calls += 1
+        x0, _, _, y1 = (float(v) for v in params['BBOX'].split(','))
+        col = round((x0 - self.origin_x) / self.span)
+        row = round((self.top - y1) / self.span)
+        image = Image.new('RGBA', (int(params['WIDTH']), int(params['HEIGHT'])), (col * 50, row * 50, 7, 255))
+        buf = io.BytesIO()
+        image.save(buf, format='PNG')
+        return FakeResponse(buf.getvalue())
+
+
+def test_plan_grid_covers_extent_exactly():
+    grid = map_export.plan_grid((1000, 2000, 3000, 2500), resolution=1.0, tile_size=1024, padding=0)
+    assert (grid['width'], grid['height']) == (2000, 500)
+    assert [len(row) for row in grid['rows']] == [2]
+    (bbox0, w0, h0), (bbox1, w1, h1) = grid['rows'][0]
+    assert (w0, w1, h0) == (1024, 976, 500)
+    assert bbox0 == (1000, 2000, 2024, 2500) and bbox1[2] == 3000
+    # Top-left pixel centre in the world file
+    assert map_export.world_file(grid).split() == [
+        "1.0000000000", "0.0000000000", "0.0000000000", "-1.0000000000", "1000.5000000000", "2499.5000000000"]
+
+
+def test_export_stitches_tiles_into_georeferenced_png():
+    extent = (370000.0, 2060000.0, 370900.0, 2061300.0)
+    grid = map_export.plan_grid(extent, resolution=0.5)
+    wms = FakeWMS(grid)
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, "village.png")
+        summary = map_export.export_village_map(wms, "RVM01", extent, out, resolution=0.5, max_workers=4)
+        assert summary['failed_tiles'] == 0
+        assert wms.calls == summary['tiles'] == 3 * 2
+        assert os.path.exists(os.path.join(tmp, "village.pgw"))
+        assert not os.path.exists(out + ".part")
+
+        with Image.open(out) as image:
+            assert image.size == (grid['width'], grid['height'])
+            image.load()
+            t = map_export.TILE_SIZE
+            assert image.getpixel((0, 0)) == (0, 0, 7, 255)
+            assert image.getpixel((t + 5, 2 * t + 5)) == (50, 100, 7, 255)
+            assert image.getpixel((grid['width'] - 1, grid['height'] - 1)) == (50, 100, 7, 255)
+
+
+def test_tiled_download_builds_each_export_in_its_own_directory():
+    with tempfile.TemporaryDirectory() as tmp:
+        giscode = "RVM0502270500020047510000"
+        seed_store(tmp, giscode, ["100"])
+        saved = app_module.EXPORT_DIR, app_module._wms_session, app_module._tile_cache
+        app_module.EXPORT_DIR = os.path.join(tmp, "exports")
+        app_module._scraper = make_scraper(tmp)
+        app_module._wms_session = FakeWMS({'bbox': (0, 0, 0, 0), 'resolution': 1.0})
+        app_module._tile_cache = TileCache(os.path.join(tmp, "tiles.db"))
+        try:
+            client = app_module.app.test_client()
+            url = f"/api/download_village_map/{giscode}?mode=tiled&resolution=0.5"
+            # Two identical downloads in flight at once
+            first, second = client.get(url), client.get(url)
+            assert len(os.listdir(app_module.EXPORT_DIR)) == 2
+            for resp in (first, second):
+                assert resp.status_code == 200 and resp.headers['X-Failed-Tiles'] == "0"
+                with zipfile.ZipFile(io.BytesIO(resp.get_data())) as zf:
+                    name = f"village_map_{giscode}_0.5m"
+                    assert zf.namelist() == [name + ".png", name + ".pgw"]
+                    with Image.open(io.BytesIO(zf.read(name + ".png"))) as image:
+                        assert image.size[0] > 200
+                resp.close()
+            # Nothing is left behind once the responses are sent
+            assert os.listdir(app_module.EXPORT_DIR) == []
+        finally:
+            app_module.EXPORT_DIR, app_module._wms_session, app_module._tile_cache = saved
+            app_module._scraper = None
+
+
+if __name__ == "__main__":
+    test_plan_grid_covers_extent_exactly()
+    test_export_stitches_tiles_into_georeferenced_png()
+    test_tiled_download_builds_each_export_in_its_own_directory()
+    print("Test passed!")
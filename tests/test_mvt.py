@@ -0,0 +1,202 @@
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+import app as app_module
+import mvt
+import reproject
+from plot_store import PlotStore
+from test_scraper_cache import make_scraper
+
+GISCODE = "RVM0527000000000000000001"
+# A 100 m plot with a 20 m hole, in UTM 43N near Pune
+X0, Y0 = 379320.0, 2048144.0
+WKT = (f"POLYGON(({X0} {Y0},{X0 + 100} {Y0},{X0 + 100} {Y0 + 100},{X0} {Y0 + 100},{X0} {Y0}),"
+       f"({X0 + 40} {Y0 + 40},{X0 + 60} {Y0 + 40},{X0 + 60} {Y0 + 60},{X0 + 40} {Y0 + 60},{X0 + 40} {Y0 + 40}))")
+
+
+def _read_varint(data, pos):
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return result, pos
+
+
+def _fields(data):
+    """Minimal protobuf reader: [(field number, value)] for varint and length-delimited fields."""
+    pos, out = 0, []
+    while pos < len(data):
+        key, pos = _read_varint(data, pos)
+        if key & 7 == 0:
+            value, pos = _read_varint(data, pos)
+        else:
+            length, pos = _read_varint(data, pos)
+            value, pos = data[pos:pos + length], pos + length
+        out.append((key >> 3, value))
+    return out
+
+
+def _packed(data):
+    values, pos = [], 0
+    while pos < len(data):
+        value, pos = _read_varint(data, pos)
+        values.append(value)
+    return values
+
+
+def _decode_rings(commands):
+    """Absolute tile-coordinate rings of a polygon's command stream."""
+    rings, x, y, i = [], 0, 0, 0
+    unzig = lambda n: (n >> 1) ^ -(n & 1)
+    while i < len(commands):
+        cmd, count = commands[i] & 7, commands[i] >> 3
+        i += 1
+        if cmd == 7:
+            continue
+        for _ in range(count):
+            x += unzig(commands[i])
+            y += unzig(commands[i + 1])
+            i += 2
+            if cmd == 1:
+                rings.append([])
+            rings[-1].append((x, y))
+    return rings
+
+
+def _decode_tile(data):
+    layers = {}
+    for number, layer in _fields(data):
+        assert number == 3
+        fields = _fields(layer)
+        name = next(v for n, v in fields if n == 1).decode()
+        keys = [v.decode() for n, v in fields if n == 3]
+        values = [_fields(v)[0][1].decode() for n, v in fields if n == 4]
+        features = []
+        for feature in (v for n, v in fields if n == 2):
+            f = dict(_fields(feature))
+            tags = _packed(f[2])
+            properties = {keys[tags[i]]: values[tags[i + 1]] for i in range(0, len(tags), 2)}
+            features.append((f[1], f[3], properties, _decode_rings(_packed(f[4]))))
+        layers[name] = (dict(fields)[15], dict(fields)[5], features)
+    return layers
+
+
+def _tile_of(z, lonlat):
+    mx, my = reproject.lonlat_to_mercator([lonlat])[0]
+    n = 1 << z
+    return int((mx + mvt._WORLD) / (2 * mvt._WORLD) * n), int((mvt._WORLD - my) / (2 * mvt._WORLD) * n)
+
+
+def test_simplify_drops_only_near_collinear_points():
+    line = np.array([[0, 0], [50, 0.5], [100, 0], [100, 100]], dtype=float)
+    assert mvt.simplify(line, 1.0).tolist() == [[0, 0], [100, 0], [100, 100]]
+    assert len(mvt.simplify(line, 0.1)) == 4
+
+
+def test_render_tile_round_trips():
+    record = {'plotno': "12", 'giscode': GISCODE, 'the_geom': WKT}
+    source = mvt.PlotTileSource([record], "EPSG:32643")
+    lonlat = reproject.transform([[X0 + 50, Y0 + 50]], "EPSG:32643", "EPSG:4326")[0]
+    x, y = _tile_of(17, lonlat)
+
+    version, extent, features = _decode_tile(source.render(17, x, y))["plots"]
+    assert (version, extent) == (2, 4096)
+    assert len(features) == 1
+    feature_id, geom_type, properties, rings = features[0]
+    assert geom_type == 3
+    assert properties == {'plot_no': "12", 'giscode': GISCODE}
+    assert len(rings) == 2
+    area = lambda r: mvt._ring_area(np.array(r))
+    # Exterior clockwise (positive) and hole counter-clockwise in tile coordinates
+    assert area(rings[0]) > 0 > area(rings[1])
+    # 100 m at z17 near 18.5 degrees north is about 1450 tile units
+    width = max(p[0] for p in rings[0]) - min(p[0] for p in rings[0])
+    assert 1400 < width < 1500
+
+    assert source.render(17, x + 5, y) == b""
+
+
+def test_vector_tile_endpoint_caches_until_plots_change():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = PlotStore(os.path.join(tmp, "plots.db"))
+        store.upsert({'giscode': GISCODE, 'plotno': "12", 'the_geom': WKT})
+        app_module._scraper = make_scraper(tmp)
+        app_module._vector_tile_cache = mvt_cache = app_module.TileCache(
+            os.path.join(tmp, "vt.db"), key=mvt.cache_key)
+        app_module._tile_sources.clear()
+        try:
+            lonlat = reproject.transform([[X0 + 50, Y0 + 50]], "EPSG:32643", "EPSG:4326")[0]
+            x, y = _tile_of(16, lonlat)
+            client = app_module.app.test_client()
+            url = f"/tiles/16/{x}/{y}.mvt?giscode=RVM0527"
+            first = client.get(url)
+            assert first.mimetype == mvt.MIMETYPE
+            assert first.headers['X-Tile-Cache'] == "MISS"
+            assert client.get(url).headers['X-Tile-Cache'] == "HIT"
+
+            # A newly cached plot invalidates the prefix's tiles
+            far = f"POLYGON(({X0 + 5000} {Y0},{X0 + 5100} {Y0},{X0 + 5100} {Y0 + 100},{X0 + 5000} {Y0}))"
+            app_module._scraper._cache_plot(GISCODE, "13", {'the_geom': far})
+            again = client.get(url)
+            assert again.headers['X-Tile-Cache'] == "MISS"
+            plot_nos = sorted(p['plot_no'] for _, _, p, _ in _decode_tile(again.data)["plots"][2])
+            assert plot_nos == ["12"]
+            assert mvt_cache.stats()['tiles'] == 2
+
+            # Re-fetching a plot within the same second still invalidates them
+            assert client.get(url).headers['X-Tile-Cache'] == "HIT"
+            app_module._scraper._cache_plot(GISCODE, "12", {'the_geom': far})
+            assert client.get(url).headers['X-Tile-Cache'] == "MISS"
+
+            assert client.get(f"/tiles/16/{x}/{y}.mvt?giscode=RVM").status_code == 400
+            assert client.get(f"/tiles/5/0/0.mvt?giscode=RVM0527").data == b""
+        finally:
+            app_module._scraper = None
+            app_module._vector_tile_cache = None
+            app_module._tile_sources.clear()
+
+
+def test_concurrent_requests_share_one_tile_source_build():
+    builds = []
+    real = mvt.PlotTileSource
+
+    def slow_source(plots, src):
+        builds.append(src)
+        time.sleep(0.2)
+        return real(plots, src)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        PlotStore(os.path.join(tmp, "plots.db")).upsert({'giscode': GISCODE, 'plotno': "12", 'the_geom': WKT})
+        app_module._scraper = make_scraper(tmp)
+        app_module._tile_sources.clear()
+        mvt.PlotTileSource = slow_source
+        try:
+            version = app_module._scraper.store.version("RVM0527")
+            sources = []
+            threads = [threading.Thread(target=lambda: sources.append(
+                app_module.get_plot_tile_source("RVM0527", "EPSG:32643", version))) for _ in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            assert len(builds) == 1 and len(sources) == 4
+            assert all(source is sources[0] for source in sources)
+        finally:
+            mvt.PlotTileSource = real
+            app_module._scraper = None
+            app_module._tile_sources.clear()
+
+
+if __name__ == "__main__":
+    test_simplify_drops_only_near_collinear_points()
+    test_render_tile_round_trips()
+    test_vector_tile_endpoint_caches_until_plots_change()
+    test_concurrent_requests_share_one_tile_source_build()
+    print("All tests passed!")
@@ -0,0 +1,198 @@
+import json
+import os
+import sqlite3
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from plot_store import PlotCache, PlotRecord, PlotStore, parse_info
+
+
+def make_plot(giscode, plotno, geom="POLYGON((0 0,1 0,1 1,0 0))"):
+    return {
+        'giscode': giscode,
+        'plotno': plotno,
+        'the_geom': geom,
+        'parsed_records': [{'Survey No.': plotno}],
+    }
+
+
+def test_upsert_and_reload():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "plots.db")
+        store = PlotStore(path)
+        store.upsert(make_plot("RVM01", "1"))
+        store.upsert_many([make_plot("RVM01", "2"), make_plot("RVM02", "1")])
+
+        # Re-upserting the same key replaces the row
+        store.upsert(make_plot("RVM01", "1", geom="POLYGON((5 5,6 5,6 6,5 5))"))
+        assert len(store) == 3
+
+        reopened = PlotStore(path)
+        assert reopened.get("RVM01_1")['the_geom'].startswith("POLYGON((5 5")
+        assert reopened.get("RVM99_1") is None
+        assert sorted(p['plotno'] for p in reopened.iter_plots("RVM01")) == ["1", "2"]
+        assert set(reopened.load_all()) == {"RVM01_1", "RVM01_2", "RVM02_1"}
+
+
+def test_migrate_legacy_json():
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "all_plots.json")
+        legacy = [make_plot("RVM01", str(i)) for i in range(5)]
+        # Entries without keys cannot be addressed and are skipped
+        legacy.append({'the_geom': "POLYGON((0 0,1 0,1 1,0 0))"})
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(legacy, f, indent=2)
+
+        store = PlotStore(os.path.join(tmp, "plots.db"))
+        assert store.migrate_json(json_path) == 5
+        assert len(store) == 5
+        assert not os.path.exists(json_path)
+        assert os.path.exists(json_path + ".migrated")
+
+        # Second run is a no-op
+        assert store.migrate_json(json_path) == 0
+
+
+def test_geometry_is_packed_and_decoded_lazily():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "plots.db")
+        store = PlotStore(path)
+        store.upsert(make_plot("RVM01", "1", geom="POLYGON((5 5,6.25 5,6 6,5 5))"))
+
+        conn = sqlite3.connect(path)
+        data, blob = conn.execute("SELECT data, geom FROM plots").fetchone()
+        assert 'the_geom' not in json.loads(data) and blob
+
+        record = store.get("RVM01_1")
+        assert 'the_geom' in record and not dict.__contains__(record, 'the_geom')
+        assert record['the_geom'] == "POLYGON((5 5,6.25 5,6 6,5 5))"
+        assert json.loads(json.dumps(store.get("RVM01_1")))['the_geom'] == record['the_geom']
+
+        # Re-saving a loaded record reuses its blob
+        store.upsert(store.get("RVM01_1"))
+        assert conn.execute("SELECT geom FROM plots").fetchone()[0] == blob
+
+
+def test_unparseable_geometry_is_kept_as_text():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "plots.db")
+        store = PlotStore(path)
+        # One bad geometry must not abort the rest of the batch
+        assert store.upsert_many([
+            make_plot("RVM01", "1", geom=""),
+            make_plot("RVM01", "2", geom="POLYGON((0 0,1 x,1 1,0 0))"),
+            make_plot("RVM01", "3"),
+        ]) == 3
+
+        conn = sqlite3.connect(path)
+        rows = dict(conn.execute("SELECT plotno, geom FROM plots").fetchall())
+        assert rows['1'] is None and rows['2'] is None and rows['3']
+        assert store.get("RVM01_1")['the_geom'] == ""
+        assert store.get("RVM01_2")['the_geom'] == "POLYGON((0 0,1 x,1 1,0 0))"
+
+        # A loaded record keeps its text when saved again
+        store.upsert(store.get("RVM01_2"))
+        assert store.get("RVM01_2")['the_geom'] == "POLYGON((0 0,1 x,1 1,0 0))"
+
+
+def test_pack_geometries_converts_old_rows():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "plots.db")
+        # Schema and row layout from before geometries were packed
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE plots (key TEXT PRIMARY KEY, giscode TEXT NOT NULL, "
+                     "plotno TEXT NOT NULL, data TEXT NOT NULL, updated_at REAL)")
+        conn.execute("INSERT INTO plots VALUES (?, ?, ?, ?, 1)",
+                     ("RVM01_1", "RVM01", "1", json.dumps(make_plot("RVM01", "1"))))
+        conn.commit()
+
+        store = PlotStore(path)
+        assert store.get("RVM01_1")['the_geom'] == "POLYGON((0 0,1 0,1 1,0 0))"
+        assert store.pack_geometries() == 1
+        assert store.pack_geometries() == 0
+        data, blob, updated_at = conn.execute("SELECT data, geom, updated_at FROM plots").fetchone()
+        assert 'the_geom' not in json.loads(data) and blob and updated_at == 1
+        assert store.get("RVM01_1")['the_geom'] == "POLYGON((0 0,1 0,1 1,0 0))"
+
+
+def _write_plots(path, giscode, count):
+    store = PlotStore(path)
+    for i in range(count):
+        store.upsert(make_plot(giscode, str(i)))
+    return len(store)
+
+
+def test_compact_record_serves_the_plot_json():
+    info = "Survey No. : 7\nOwner Name : सुनीता पवार\n---------------------------------\nSurvey No. : 7\nOwner Name : Anil"
+    plot = dict(make_plot("RVM01", "7", geom="POLYGON((5 5,6.25 5,6 6,5 5))"),
+                info=info, parsed_records=parse_info(info), report_url="/api/report?plotno=7", area=1.5)
+    record = PlotRecord(plot)
+
+    # Only the plot's keys and uncommon fields are dict entries; the rest is derived on read
+    assert dict(dict.items(record)) == {'giscode': "RVM01", 'plotno': "7", 'area': 1.5}
+    assert record.geom_blob and record['parsed_records'][1] == {'Survey No.': "7", 'Owner Name': "Anil"}
+    assert json.loads(json.dumps(record)) == plot and record == plot and dict(record) == plot
+    assert sorted(record) == sorted(plot) and len(record) == len(plot)
+    assert PlotRecord(record) == plot
+
+    # Truth tests, len() and key checks don't serialize the geometry; reading it does, once
+    record = PlotRecord(plot)
+    assert record and len(record) == len(plot) and 'the_geom' in record and record._wkt is None
+    assert record['the_geom'] is record['the_geom'] == plot['the_geom']
+
+    # parsed_records that don't match the info text are kept as given
+    record['parsed_records'] = [{'Owner Name': "Ramesh"}]
+    record['info'] = "Owner Name : Sunil"
+    assert record['parsed_records'] == [{'Owner Name': "Ramesh"}]
+    del record['report_url']
+    assert 'report_url' not in record and record.get('report_url') is None
+
+
+def test_processes_share_the_store():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "plots.db")
+        cache = PlotCache(PlotStore(path))
+        mark = cache.store.last_change()
+        with ProcessPoolExecutor(max_workers=4) as pool:
+            list(pool.map(_write_plots, [path] * 4, [f"RVM0{i}" for i in range(4)], [50] * 4))
+
+        # Every process's writes are kept and visible here without reloading
+        assert len(cache) == 200 and "RVM03_49" in cache
+        assert cache["RVM02_7"]['the_geom'] == "POLYGON((0 0,1 0,1 1,0 0))"
+        assert len(list(cache.store.iter_changed(mark))) == 200
+
+        # A replaced plot shows up as changed again
+        mark = cache.store.last_change()
+        cache.add(make_plot("RVM00", "3"))
+        assert [r['plotno'] for _, r in cache.store.iter_changed(mark)] == ["3"]
+
+
+def test_unsaved_plots_are_served_until_saved():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = PlotCache(PlotStore(os.path.join(tmp, "plots.db")))
+        cache.add(make_plot("RVM01", "1"))
+        cache.add(make_plot("RVM01", "2", geom="POLYGON((5 5,6 5,6 6,5 5))"), save=False)
+        cache.add(make_plot("RVM02", "1"), save=False)
+
+        other = PlotStore(os.path.join(tmp, "plots.db"))
+        assert len(other) == 1 and len(cache) == 3
+        assert sorted(cache) == ["RVM01_1", "RVM01_2", "RVM02_1"]
+        assert cache.giscodes("RVM01") == ["RVM01"]
+        assert [r['plotno'] for r in cache.village("RVM01")] == ["1", "2"]
+        assert set(cache.get_many(["RVM01_2", "RVM02_1", "RVM09_1"])) == {"RVM01_2", "RVM02_1"}
+
+        assert cache.save() == 2
+        assert len(other) == 3 and other.get("RVM01_2")['the_geom'].startswith("POLYGON((5 5")
+        assert cache.save() == 0
+
+
+if __name__ == "__main__":
+    test_upsert_and_reload()
+    test_migrate_legacy_json()
+    test_geometry_is_packed_and_decoded_lazily()
+    test_unparseable_geometry_is_kept_as_text()
+    test_pack_geometries_converts_old_rows()
+    test_compact_record_serves_the_plot_json()
+    test_processes_share_the_store()
+    test_unsaved_plots_are_served_until_saved()
+    print("Test passed!")
@@ -0,0 +1,208 @@
+import asyncio
+import tempfile
+import threading
+import time
+
+import rate_control
+from rate_control import AdaptiveLimiter, classify_status
+from test_scraper_cache import FakeResponse, make_scraper
+
+
+def test_additive_increase():
+    limiter = AdaptiveLimiter(initial=4, max_limit=10)
+    for _ in range(200):
+        assert limiter.acquire(timeout=1)
+        limiter.release(rate_control.OK, 0.5)
+    assert limiter.limit == 10
+    assert limiter.stats()['latency_ewma'] == 0.5
+
+
+def test_multiplicative_decrease_once_per_cooldown():
+    limiter = AdaptiveLimiter(initial=32, cooldown=60)
+    for _ in range(5):
+        limiter.acquire()
+        limiter.release(rate_control.TIMEOUT, 30)
+    # A burst of timeouts only halves the limit once
+    assert limiter.limit == 16
+    assert limiter.decreases == 1
+
+
+def test_repeated_challenges_back_off():
+    limiter = AdaptiveLimiter(initial=20, challenge_threshold=3, cooldown=0)
+    for _ in range(2):
+        limiter.acquire()
+        limiter.release(rate_control.CHALLENGE, 0.2)
+    assert limiter.limit == 20
+    limiter.acquire()
+    limiter.release(rate_control.CHALLENGE, 0.2)
+    assert limiter.limit == 10
+
+
+def test_slow_responses_hold_the_limit():
+    limiter = AdaptiveLimiter(initial=4, latency_tolerance=2.0)
+    limiter.acquire()
+    limiter.release(rate_control.OK, 0.1)
+    grown = limiter._limit
+    for _ in range(20):
+        limiter.acquire()
+        limiter.release(rate_control.OK, 5.0)
+    assert limiter._limit - grown < 0.5
+
+
+def test_acquire_blocks_at_limit():
+    limiter = AdaptiveLimiter(initial=2)
+    assert limiter.try_acquire() and limiter.try_acquire()
+    assert not limiter.try_acquire()
+    assert not limiter.acquire(timeout=0.05)
+
+    threading.Timer(0.05, limiter.release, args=(rate_control.OK, 0.1)).start()
+    assert limiter.acquire(timeout=2)
+    assert limiter.in_flight == 2
+
+
+def _wait_until_waiting(limiter, priority):
+    for _ in range(200):
+        if limiter.stats()['classes'][priority]['waiting']:
+            return
+        time.sleep(0.005)
+    raise AssertionError(f"no {priority} waiter")
+
+
+def test_bulk_leaves_headroom_for_interactive():
+    limiter = AdaptiveLimiter(initial=8)
+    assert limiter.class_limit(rate_control.BULK) == 6
+    for _ in range(6):
+        assert limiter.try_acquire(rate_control.BULK)
+    assert not limiter.try_acquire(rate_control.BULK)
+    assert limiter.try_acquire(rate_control.INTERACTIVE) and limiter.try_acquire(rate_control.INTERACTIVE)
+    assert not limiter.try_acquire(rate_control.INTERACTIVE)
+    assert limiter.stats()['classes'][rate_control.BULK]['in_flight'] == 6
+
+
+def test_waiting_interactive_call_goes_first():
+    limiter = AdaptiveLimiter(initial=2, shares={rate_control.BULK: 1.0})
+    assert limiter.try_acquire() and limiter.try_acquire()
+    order = []
+
+    def call(priority):
+        with rate_control.priority(priority):
+            assert limiter.acquire(timeout=2)
+            order.append(priority)
+
+    bulk = threading.Thread(target=call, args=(rate_control.BULK,))
+    bulk.start()
+    _wait_until_waiting(limiter, rate_control.BULK)
+    interactive = threading.Thread(target=call, args=(rate_control.INTERACTIVE,))
+    interactive.start()
+    _wait_until_waiting(limiter, rate_control.INTERACTIVE)
+
+    # The bulk call was waiting first, but the freed slot goes to the interactive one
+    limiter.release(rate_control.OK, 0.1)
+    interactive.join(2)
+    assert order == [rate_control.INTERACTIVE]
+    limiter.release(rate_control.OK, 0.1)
+    bulk.join(2)
+    assert order == [rate_control.INTERACTIVE, rate_control.BULK]
+
+
+def test_coroutines_wait_in_the_priority_queues():
+    limiter = AdaptiveLimiter(initial=2, shares={rate_control.BULK: 1.0})
+    assert limiter.try_acquire() and limiter.try_acquire()
+    order = []
+
+    def sync_call():
+        assert limiter.acquire(timeout=2, priority=rate_control.INTERACTIVE)
+        order.append('sync interactive')
+
+    async def crawl():
+        bulk = asyncio.ensure_future(limiter.acquire_async(rate_control.BULK))
+        cancelled = asyncio.ensure_future(limiter.acquire_async(rate_control.BULK))
+        await asyncio.sleep(0)
+        assert limiter.stats()['classes'][rate_control.BULK]['waiting'] == 2
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        assert limiter.stats()['classes'][rate_control.BULK]['waiting'] == 1
+
+        interactive = threading.Thread(target=sync_call)
+        interactive.start()
+        await asyncio.to_thread(_wait_until_waiting, limiter, rate_control.INTERACTIVE)
+        # A queued coroutine doesn't poll past the interactive caller
+        assert not limiter.try_acquire(rate_control.BULK)
+
+        limiter.release(rate_control.OK, 0.1)
+        await asyncio.to_thread(interactive.join, 2)
+        assert order == ['sync interactive'] and not bulk.done()
+
+        # The slot is handed to the coroutine by the thread that frees it
+        threading.Thread(target=limiter.release, args=(rate_control.OK, 0.1)).start()
+        assert await asyncio.wait_for(bulk, 2)
+        assert limiter.in_flight == 2
+        assert limiter.stats()['classes'][rate_control.BULK]['waiting'] == 0
+
+    asyncio.run(crawl())
+
+
+def test_cancelled_coroutine_returns_its_slot():
+    limiter = AdaptiveLimiter(initial=1)
+    assert limiter.try_acquire()
+
+    async def cancelled_just_as_admitted():
+        waiter = asyncio.ensure_future(limiter.acquire_async())
+        await asyncio.sleep(0)
+        # Admitted, but cancelled before it runs again
+        limiter.release(rate_control.OK, 0.1)
+        assert limiter.in_flight == 1
+        waiter.cancel()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            pass
+        assert limiter.in_flight == 0
+
+    asyncio.run(cancelled_just_as_admitted())
+    assert limiter.try_acquire()
+
+
+def test_village_crawls_run_below_interactive_priority():
+    with tempfile.TemporaryDirectory() as tmp:
+        scraper = make_scraper(tmp)
+        seen = []
+
+        def fake_post(url, data, headers=None, timeout=15):
+            if url.endswith("kidelistFromGisCodeMH"):
+                return FakeResponse(["1", "2", "3"])
+            seen.append((data['plotno'], rate_control.current_priority()))
+            return FakeResponse({'the_geom': "POLYGON((0 0,1 0,1 1,0 0))"})
+
+        scraper._post = fake_post
+        scraper.get_plot_coordinates("RVM01", "9")
+        scraper.fetch_village_boundaries("RVM0502270500020047510000")
+        assert seen[0] == ("9", rate_control.INTERACTIVE)
+        assert {p for _, p in seen[1:]} == {rate_control.PREFETCH}
+
+        seen.clear()
+        with rate_control.priority(rate_control.BULK):
+            scraper.fetch_village_boundaries("RVM0502270500020047520000")
+        assert {p for _, p in seen} == {rate_control.BULK}
+
+
+def test_classify_status():
+    assert classify_status(200) == rate_control.OK
+    assert classify_status(200, challenged=True) == rate_control.CHALLENGE
+    assert classify_status(404) == rate_control.CLIENT_ERROR
+    assert classify_status(503) == rate_control.SERVER_ERROR
+
+
+if __name__ == "__main__":
+    test_additive_increase()
+    test_multiplicative_decrease_once_per_cooldown()
+    test_repeated_challenges_back_off()
+    test_slow_responses_hold_the_limit()
+    test_acquire_blocks_at_limit()
+    test_bulk_leaves_headroom_for_interactive()
+    test_waiting_interactive_call_goes_first()
+    test_coroutines_wait_in_the_priority_queues()
+    test_cancelled_coroutine_returns_its_slot()
+    test_village_crawls_run_below_interactive_priority()
+    test_classify_status()
+    print("Test passed!")
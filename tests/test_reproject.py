@@ -0,0 +1,87 @@
+import tempfile
+
+import numpy as np
+
+import app as app_module
+import geometry
+import reproject
+from test_scraper_cache import FakeResponse, make_scraper, seed_store
+
+GISCODE = "RVM0502270500020047510000"
+
+# Reference values from PROJ (pyproj 3.7)
+PUNE = (73.8567, 18.5204), (379320.8175238202, 2048144.6233660013)        # EPSG:32643
+NAGPUR = (79.0882, 21.1458), (301475.0488984406, 2339478.989242826)       # EPSG:32644
+
+
+def test_utm_matches_proj():
+    for (lonlat, utm), srs in ((PUNE, "EPSG:32643"), (NAGPUR, "EPSG:32644")):
+        assert np.allclose(reproject.transform([lonlat], "EPSG:4326", srs), [utm], rtol=0, atol=1e-6)
+        assert np.allclose(reproject.transform([utm], srs, "4326"), [lonlat], rtol=0, atol=1e-10)
+
+
+def test_transform_between_zones_round_trips():
+    rng = np.random.default_rng(0)
+    coords = rng.uniform([350000, 1750000], [650000, 2350000], (1000, 2))
+    other = reproject.transform(coords, "EPSG:32643", "EPSG:32644")
+    assert np.abs(reproject.transform(other, "EPSG:32644", "EPSG:32643") - coords).max() < 1e-5
+
+
+def test_unsupported_srs_is_rejected():
+    try:
+        reproject.normalize_srs("EPSG:27700")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("expected ValueError")
+
+
+def test_projected_cache_reuses_transformed_geometry():
+    cache = reproject.ProjectedCache(max_entries=2)
+    plots = [{'the_geom': f"POLYGON((379320.8175238202 2048144.6233660013,{x} 2048200,{x} 2048300))"}
+             for x in (379400, 379500, 379600)]
+    first = cache.geometries(plots[:2], "EPSG:32643", "EPSG:4326")
+    assert np.allclose(first[0].coords[0], PUNE[0], rtol=0, atol=1e-10)
+    assert cache.geometries(plots[:1], "EPSG:32643", "EPSG:4326")[0] is first[0]
+    cache.geometries(plots[2:], "EPSG:32643", "EPSG:4326")
+    assert cache.stats() == {'entries': 2, 'max_entries': 2, 'hits': 1, 'misses': 3}
+    # The least recently used plot was evicted
+    cache.geometries(plots[1:2], "EPSG:32643", "EPSG:4326")
+    assert cache.stats()['misses'] == 4
+
+
+def test_village_geojson_endpoint():
+    with tempfile.TemporaryDirectory() as tmp:
+        seed_store(tmp, GISCODE, ["1", "2"])
+        scraper = make_scraper(tmp)
+        scraper._post = lambda url, data, headers=None, timeout=15: FakeResponse(["1", "2"])
+        app_module._scraper = scraper
+        app_module._projected_cache = None
+        try:
+            client = app_module.app.test_client()
+            data = client.get(f"/api/village/{GISCODE}/geojson?from=EPSG:4326&srs=EPSG:32643&source=1").get_json()
+            assert client.get(f"/api/village/{GISCODE}/geojson?plots=2&srs=EPSG:27700").status_code == 400
+            only = client.get(f"/api/village/{GISCODE}/geojson?plots=2&from=EPSG:4326&srs=32643").get_json()
+        finally:
+            app_module._scraper = None
+            app_module._projected_cache = None
+
+    assert data['crs']['properties']['name'] == "EPSG:32643"
+    assert [f['properties']['plot_no'] for f in data['features']] == ["1", "2"]
+    feature = data['features'][1]
+    assert feature['geometry']['type'] == "Polygon"
+    source = geometry.parse_wkt("POLYGON((2 0,2 1,0 1,2 0))").coords
+    expected = np.round(reproject.transform(source, "EPSG:4326", "EPSG:32643"), 2)
+    assert np.array_equal(np.array(feature['geometry']['coordinates'][0]), expected)
+    assert feature['properties']['source_geometry']['coordinates'][0] == source.tolist()
+    assert [f['properties']['plot_no'] for f in only['features']] == ["2"]
+    assert only['features'][0]['geometry'] == feature['geometry']
+
+
+if __name__ == "__main__":
+    test_utm_matches_proj()
+    test_transform_between_zones_round_trips()
+    test_unsupported_srs_is_rejected()
+    test_projected_cache_reuses_transformed_geometry()
+    test_village_geojson_endpoint()
+    print("All tests passed!")
@@ -0,0 +1,171 @@
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from mahabhumi_scraper import MahabhumiScraper, VillageCrawl
+from plot_store import PlotStore
+from rate_control import AdaptiveLimiter
+
+
+def make_scraper(tmp, **kwargs):
+    """Builds a scraper whose store lives in a temporary directory."""
+    class TempScraper(MahabhumiScraper):
+        CACHE_FILE = os.path.join(tmp, "all_plots.json")
+        STORE_FILE = os.path.join(tmp, "plots.db")
+        LISTS_FILE = os.path.join(tmp, "lists.db")
+        SEARCH_FILE = os.path.join(tmp, "search.db")
+    return TempScraper(**kwargs)
+
+
+def seed_store(tmp, giscode, plot_nos):
+    store = PlotStore(os.path.join(tmp, "plots.db"))
+    store.upsert_many([
+        {'giscode': giscode, 'plotno': p, 'the_geom': f"POLYGON(({p} 0,{p} 1,0 1,{p} 0))"}
+        for p in plot_nos
+    ])
+
+
+class FakeResponse:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return dict(self.payload) if isinstance(self.payload, dict) else list(self.payload)
+
+
+def test_lookup_cached():
+    with tempfile.TemporaryDirectory() as tmp:
+        seed_store(tmp, "RVM01", [str(i) for i in range(1, 3001)])
+        seed_store(tmp, "RVM02", ["1", "2"])
+        scraper = make_scraper(tmp)
+
+        found, missing = scraper.lookup_cached("RVM01", ["5", "2999", "4000", 17])
+        assert [p['plotno'] for p in found] == ["5", "2999", "17"]
+        assert missing == ["4000"]
+
+        found, missing = scraper.lookup_cached("RVM03", ["1"])
+        assert found == [] and missing == ["1"]
+
+
+def test_concurrent_plot_fetches_are_coalesced():
+    with tempfile.TemporaryDirectory() as tmp:
+        scraper = make_scraper(tmp)
+        posts = []
+        lock = threading.Lock()
+
+        def fake_post(url, data, headers=None, timeout=15):
+            with lock:
+                posts.append(url.split('/')[-1])
+            time.sleep(0.2)
+            if url.endswith("getPlotInfo"):
+                return FakeResponse({'the_geom': "POLYGON((0 0,1 0,1 1,0 0))", 'info': "Survey No. : 7"})
+            return FakeResponse(["7", "8"])
+
+        scraper._post = fake_post
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            plots = list(pool.map(lambda _: scraper.get_plot_coordinates("RVM01", "7"), range(8)))
+            lists = list(pool.map(lambda _: scraper.fetch_plot_list("01", "02", "X"), range(8)))
+
+        assert posts.count("getPlotInfo") == 1
+        assert posts.count("kidelistFromGisCodeMH") == 1
+        assert all(p['plotno'] == "7" for p in plots)
+        # Each caller gets its own list to sort
+        assert lists[0] == ["7", "8"] and lists[0] is not lists[1]
+
+
+def test_negative_cache_skips_dead_plots():
+    with tempfile.TemporaryDirectory() as tmp:
+        scraper = make_scraper(tmp)
+        scraper.limiter = AdaptiveLimiter(base_backoff=0.001)
+        posts = []
+
+        def fake_post(url, data, headers=None, timeout=15):
+            if url.endswith("kidelistFromGisCodeMH"):
+                return FakeResponse(["1", "2", "3"])
+            posts.append(data['plotno'])
+            if data['plotno'] == "2":
+                return FakeResponse({})  # no geometry upstream
+            if data['plotno'] == "3":
+                raise requests.exceptions.ReadTimeout("upstream slow")
+            return FakeResponse({'the_geom': "POLYGON((0 0,1 0,1 1,0 0))"})
+
+        scraper._post = fake_post
+        giscode = "RVM0502270500020047510000"
+        boundaries = scraper.fetch_village_boundaries(giscode, max_workers=4)
+        assert [b['plot_no'] for b in boundaries] == ["1"]
+        assert posts.count("3") == 3
+        summary = scraper.last_crawl_summary
+        assert (summary['found'], summary['not_found'], summary['failed']) == (1, 1, 1)
+        assert scraper.store.get_missing(f"{giscode}_2")['kind'] == 'not_found'
+        assert scraper.store.get_missing(f"{giscode}_3")['kind'] == 'failed'
+
+        # A re-crawl skips both dead plots without any upstream call
+        posts.clear()
+        scraper.fetch_village_boundaries(giscode, max_workers=4)
+        assert posts == []
+        summary = scraper.last_crawl_summary
+        assert (summary['skipped_not_found'], summary['skipped_failed']) == (1, 1)
+
+        # force bypasses the negative cache
+        scraper.fetch_village_boundaries(giscode, max_workers=4, force=True)
+        assert sorted(set(posts)) == ["2", "3"]
+
+
+def test_scrapers_sharing_a_store_see_each_others_plots():
+    with tempfile.TemporaryDirectory() as tmp:
+        giscode = "RVM01"
+        seed_store(tmp, giscode, ["1"])
+        # Two app workers, one of them with a batch crawl that saves at the end
+        web, batch = make_scraper(tmp), make_scraper(tmp, auto_save=False)
+        assert web.plots_in_bbox((0, 0, 2, 2)) and web.search("1")
+
+        def fake_post(url, data, headers=None, timeout=15):
+            return FakeResponse({'the_geom': f"POLYGON((0 {data['plotno']},1 0,1 1,0 {data['plotno']}))"})
+        web._post = batch._post = fake_post
+
+        web.get_plot_coordinates(giscode, "2")
+        batch.get_plot_coordinates(giscode, "3")
+        assert batch.get_plot_coordinates(giscode, "2")['plotno'] == "2"
+        assert web.lookup_cached(giscode, ["2", "3"])[1] == ["3"]
+
+        batch.save_cache()
+        # Saving writes only batch's own plots, and web sees them without reloading
+        found, missing = web.lookup_cached(giscode, ["1", "2", "3"])
+        assert len(found) == 3 and missing == []
+        assert {r['plotno'] for r in web.plots_in_bbox((0, 2.5, 1, 3.5))} == {"3"}
+        assert [r['plotno'] for r, _ in web.search("3")] == ["3"]
+        assert len(PlotStore(os.path.join(tmp, "plots.db"))) == 3
+
+
+def test_overlapping_crawls_keep_their_own_summaries():
+    with tempfile.TemporaryDirectory() as tmp:
+        seed_store(tmp, "RVM01", ["1"])
+        scraper = make_scraper(tmp)
+        scraper._post = lambda url, data, headers=None, timeout=15: FakeResponse({})
+
+        first = VillageCrawl(scraper.iter_village_plots("RVM01", ["1", "2"]))
+        batches = iter(first)
+        assert [p for p, _ in next(batches)] == ["1"]
+        # Another crawl on the same scraper runs to completion in between
+        second = VillageCrawl(scraper.iter_village_plots("RVM02", ["1", "2", "3"]))
+        assert list(second) == []
+        assert list(batches) == []
+
+        assert (first.summary['giscode'], first.summary['found'], first.summary['not_found']) == ("RVM01", 1, 1)
+        assert (second.summary['giscode'], second.summary['not_found']) == ("RVM02", 3)
+
+
+if __name__ == "__main__":
+    test_lookup_cached()
+    test_concurrent_plot_fetches_are_coalesced()
+    test_negative_cache_skips_dead_plots()
+    test_scrapers_sharing_a_store_see_each_others_plots()
+    test_overlapping_crawls_keep_their_own_summaries()
+    print("Test passed!")
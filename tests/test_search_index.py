@@ -0,0 +1,85 @@
+import os
+import tempfile
+
+import app as app_module
+import search_index
+from search_index import SearchIndex
+from test_scraper_cache import make_scraper, seed_store
+
+GISCODE = "RVM0502270500020047510000"
+OTHER = "RVM0502270500020047520000"
+
+
+def _plot(giscode, plotno, *owners):
+    return {'giscode': giscode, 'plotno': plotno,
+            'parsed_records': [{'Survey No.': plotno, 'Owner Name': owner} for owner in owners]}
+
+
+def test_tokenize_handles_devanagari_and_survey_numbers():
+    assert search_index.tokenize("ज्ञानेश्वर पाटील, Ramesh") == ["ज्ञानेश्वर", "पाटील", "ramesh"]
+    assert search_index.tokenize("१२/३अ") == ["12/3अ", "12", "3अ"]
+    # Zero-width joiners don't split or change a word
+    assert search_index.tokenize("पाटी\u200dल") == ["पाटील"]
+    assert search_index.within_one_edit("patil", "paitl")
+    assert search_index.within_one_edit("पाटील", "पाटिल")
+    assert not search_index.within_one_edit("patil", "pawar")
+
+
+def test_search_matches_exact_prefix_and_fuzzy_tokens():
+    with tempfile.TemporaryDirectory() as tmp:
+        index = SearchIndex(os.path.join(tmp, "search.db"))
+        index.add_many([
+            _plot(GISCODE, "12/3", "ज्ञानेश्वर रामचंद्र पाटील"),
+            _plot(GISCODE, "14", "Ramesh Patil", "Sunita Pawar"),
+            _plot(OTHER, "7", "Ramesh Patel"),
+        ])
+        keys = lambda q, prefix="": [hit['key'] for hit in index.search(q, prefix)]
+
+        assert keys("पाटील") == [f"{GISCODE}_12/3"]
+        assert keys("पाटिल") == [f"{GISCODE}_12/3"]  # one vowel sign off
+        assert keys("12/3") == [f"{GISCODE}_12/3"]
+        assert keys("१२") == [f"{GISCODE}_12/3"]
+        # Exact matches outrank fuzzy ones; every word must match
+        assert keys("ramesh patil") == [f"{GISCODE}_14", f"{OTHER}_7"]
+        assert keys("ramesh patil", OTHER) == [f"{OTHER}_7"]
+        assert keys("sunita ramesh") == [f"{GISCODE}_14"]
+        assert keys("sun") == [f"{GISCODE}_14"]
+        assert keys("sunita kulkarni") == []
+        assert index.search("sunita")[0]['fields'] == ["Owner Name"]
+
+        # Re-indexing a plot replaces its tokens
+        index.add_many([_plot(GISCODE, "14", "Anil Jadhav")])
+        assert keys("sunita") == [] and keys("jadhav") == [f"{GISCODE}_14"]
+        index.remove([f"{GISCODE}_14"])
+        assert keys("jadhav") == []
+        assert len(index) == 2
+
+
+def test_search_endpoint_syncs_with_the_plot_cache():
+    with tempfile.TemporaryDirectory() as tmp:
+        seed_store(tmp, GISCODE, ["1", "2"])
+        scraper = make_scraper(tmp)
+        app_module._scraper = scraper
+        try:
+            client = app_module.app.test_client()
+            body = client.get("/api/search?q=2").get_json()
+            assert [r['plot_no'] for r in body['results']] == ["2"]
+
+            # Plots cached after the first search are searchable too
+            scraper._cache_plot(GISCODE, "9", {'the_geom': "POLYGON((0 0,1 0,1 1,0 0))",
+                                               'parsed_records': [{'Owner Name': "सुनीता पवार"}]})
+            body = client.get("/api/search?q=पवार").get_json()
+            assert [r['plot_no'] for r in body['results']] == ["9"]
+            assert body['results'][0]['parsed_records'][0]['Owner Name'] == "सुनीता पवार"
+            assert client.get("/api/search/stats").get_json()['plots'] == 3
+
+            assert client.get("/api/search").status_code == 400
+        finally:
+            app_module._scraper = None
+
+
+if __name__ == "__main__":
+    test_tokenize_handles_devanagari_and_survey_numbers()
+    test_search_matches_exact_prefix_and_fuzzy_tokens()
+    test_search_endpoint_syncs_with_the_plot_cache()
+    print("All tests passed!")
@@ -0,0 +1,63 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_result():
+    flight = SingleFlight()
+    calls = []
+    started = threading.Event()
+
+    def slow_fetch(key):
+        calls.append(key)
+        started.set()
+        time.sleep(0.2)
+        return {'plotno': key}
+
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        futures = [pool.submit(flight.do, "RVM01_5", slow_fetch, "5") for _ in range(10)]
+        results = [f.result() for f in futures]
+
+    assert calls == ["5"]
+    assert all(r is results[0] for r in results)
+    assert flight.in_flight() == 0
+
+    # Once finished, the next call runs again
+    flight.do("RVM01_5", slow_fetch, "5")
+    assert len(calls) == 2
+
+
+def test_errors_propagate_to_waiters():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def failing():
+        release.wait()
+        raise ValueError("upstream down")
+
+    errors = []
+
+    def caller():
+        try:
+            flight.do("k", failing)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=caller) for _ in range(4)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(errors) == 4
+    assert flight.in_flight() == 0
+
+
+if __name__ == "__main__":
+    test_concurrent_calls_share_one_result()
+    test_errors_propagate_to_waiters()
+    print("Test passed!")
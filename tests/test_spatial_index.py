@@ -0,0 +1,84 @@
+import tempfile
+
+import numpy as np
+
+import app as app_module
+import reproject
+from spatial_index import STRTree, SpatialIndex
+from test_scraper_cache import make_scraper, seed_store
+
+GISCODE = "RVM0502270500020047510000"
+
+
+def _brute_force(bounds, bbox):
+    b = bounds
+    return np.flatnonzero((b[:, 0] <= bbox[2]) & (b[:, 2] >= bbox[0]) & (b[:, 1] <= bbox[3]) & (b[:, 3] >= bbox[1]))
+
+
+def test_str_tree_matches_brute_force():
+    rng = np.random.default_rng(0)
+    xy = rng.uniform(0, 10000, (5000, 2))
+    bounds = np.column_stack([xy, xy + rng.uniform(1, 50, (5000, 2))])
+    tree = STRTree(bounds, capacity=8)
+    for _ in range(50):
+        corner = rng.uniform(0, 10000, 2)
+        bbox = (*corner, *(corner + rng.uniform(0, 500, 2)))
+        assert sorted(tree.query(bbox).tolist()) == _brute_force(bounds, bbox).tolist()
+    assert len(STRTree(np.empty((0, 4))).query((0, 0, 1, 1))) == 0
+
+
+def test_index_takes_inserts_replacements_and_removals():
+    index = SpatialIndex(min_rebuild=2)
+    index.bulk_insert([("a", (0, 0, 1, 1)), ("b", (2, 2, 3, 3))])
+    index.insert("c", (0.5, 0.5, 2.5, 2.5))
+    # Inserted after the build, found through the pending list
+    assert sorted(index.query_point(0.7, 0.7)) == ["a", "c"]
+    index.insert("a", (10, 10, 11, 11))
+    index.remove("b")
+    assert index.query((0, 0, 3, 3)) == ["c"]
+    index.insert("d", (20, 20, 21, 21))
+    index.insert("e", (20, 20, 21, 21))
+    assert sorted(index.query((9, 9, 30, 30))) == ["a", "d", "e"]
+    assert index.stats() == {'items': 4, 'indexed': 4, 'pending': 0, 'rebuilds': 2}
+
+
+def test_plots_at_and_in_bbox_endpoints():
+    with tempfile.TemporaryDirectory() as tmp:
+        # Plot p is the triangle (p 0, p 1, 0 1) (see seed_store)
+        seed_store(tmp, GISCODE, ["1", "2"])
+        scraper = make_scraper(tmp)
+        app_module._scraper = scraper
+        try:
+            client = app_module.app.test_client()
+            at = client.get("/api/plots/at?x=0.9&y=0.8&srs=EPSG:32643").get_json()
+            assert sorted(p['plot_no'] for p in at['plots']) == ["1", "2"]
+            at = client.get("/api/plots/at?x=1.5&y=0.9&srs=EPSG:32643&geometry=1").get_json()
+            assert [p['plot_no'] for p in at['plots']] == ["2"]
+            assert at['plots'][0]['geometry']['type'] == "Polygon"
+
+            # Plots cached after the index was built are found too
+            scraper._cache_plot(GISCODE, "7", {'the_geom': "POLYGON((100 100,110 100,110 110,100 100))"})
+            at = client.get("/api/plots/at?x=108&y=101&srs=EPSG:32643").get_json()
+            assert [p['plot_no'] for p in at['plots']] == ["7"]
+
+            # The same point in longitude/latitude
+            lon, lat = reproject.transform([[108, 101]], "EPSG:32643", "EPSG:4326")[0]
+            at = client.get(f"/api/plots/at?x={lon}&y={lat}").get_json()
+            assert [p['plot_no'] for p in at['plots']] == ["7"]
+
+            box = client.get("/api/plots/in_bbox?bbox=-1,-1,1.5,2&srs=EPSG:32643").get_json()
+            assert sorted(p['plot_no'] for p in box['plots']) == ["1", "2"]
+            box = client.get("/api/plots/in_bbox?bbox=-1,-1,200,200&srs=EPSG:32643&limit=1").get_json()
+            assert box['count'] == 3 and box['truncated'] and len(box['plots']) == 1
+
+            assert client.get("/api/plots/at?x=1").status_code == 400
+            assert client.get("/api/plots/in_bbox?bbox=1,2,3").status_code == 400
+        finally:
+            app_module._scraper = None
+
+
+if __name__ == "__main__":
+    test_str_tree_matches_brute_force()
+    test_index_takes_inserts_replacements_and_removals()
+    test_plots_at_and_in_bbox_endpoints()
+    print("All tests passed!")
@@ -0,0 +1,89 @@
+import os
+import tempfile
+
+from tile_cache import TileCache, tile_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def tile(i):
+    return {'LAYERS': 'VILLAGE_MAP', 'BBOX': f"{i},0,{i + 1},1", 'WIDTH': '256', 'HEIGHT': '256'}
+
+
+def test_key_ignores_case_and_irrelevant_params():
+    assert tile_key({'layers': 'A', 'bbox': '1,2,3,4', 'srs': 'EPSG:32643'}) == \
+        tile_key({'LAYERS': 'A', 'BBOX': '1.0,2,3,4.0000000001', 'SRS': 'epsg:32643', 'REQUEST': 'GetMap',
+                  'SERVICE': 'WMS', '_': '12345'})
+    assert tile_key({'LAYERS': 'A', 'gis_code': '1'}) != tile_key({'LAYERS': 'A', 'gis_code': '2'})
+
+
+def test_key_separates_request_types_and_versions():
+    getmap = {'LAYERS': 'A', 'BBOX': '18,73,19,74', 'WIDTH': '256', 'HEIGHT': '256'}
+    assert tile_key(getmap) != tile_key(dict(getmap, REQUEST='GetLegendGraphic'))
+    assert tile_key(dict(getmap, REQUEST='GetMap')) != tile_key(dict(getmap, REQUEST='GetFeatureInfo'))
+    # 1.3.0 EPSG:4326 BBOXes are lat,lon; the same numbers in 1.1.1 are lon,lat
+    assert tile_key(dict(getmap, VERSION='1.1.1', SRS='EPSG:4326')) != \
+        tile_key(dict(getmap, VERSION='1.3.0', CRS='EPSG:4326'))
+
+
+def test_lru_eviction_and_ttl():
+    with tempfile.TemporaryDirectory() as tmp:
+        clock = FakeClock()
+        cache = TileCache(os.path.join(tmp, "tiles.db"), max_bytes=1000, ttl=300, clock=clock)
+        for i in range(3):
+            cache.put(tile(i), b"x" * 300, "image/png")
+            clock.now += 1
+        # Touch tile 0 so tile 1 is the least recently used
+        clock.now += cache.TOUCH_INTERVAL
+        assert cache.get(tile(0))[0] == b"x" * 300
+        clock.now += 1
+        cache.put(tile(3), b"y" * 300, "image/png")
+
+        assert cache.get(tile(1)) is None
+        assert cache.get(tile(0)) is not None and cache.get(tile(3)) is not None
+        stats = cache.stats()
+        assert stats['evictions'] == 1 and stats['bytes'] <= 1000
+
+        # Expired tiles are misses; the size budget survives a reopen
+        clock.now += 301
+        assert cache.get(tile(0)) is None
+        assert TileCache(os.path.join(tmp, "tiles.db"), max_bytes=1000).stats()['bytes'] == stats['bytes']
+
+
+def test_processes_sharing_a_cache_share_its_budget():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tiles.db")
+        clock = FakeClock()
+        # Two server workers, each with its own TileCache on the same file
+        first = TileCache(path, max_bytes=1000, clock=clock)
+        second = TileCache(path, max_bytes=1000, clock=clock)
+        for i in range(3):
+            first.put(tile(i), b"x" * 300, "image/png")
+            clock.now += 1
+        second.put(tile(3), b"y" * 300, "image/png")
+        assert second.stats()['evictions'] == 1 and first.get(tile(0)) is None
+        assert first.stats()['bytes'] == second.stats()['bytes'] == 900
+
+        # A hit on a recently used tile writes nothing
+        def accessed(i):
+            return first._conn().execute("SELECT accessed_at FROM tiles WHERE key = ?",
+                                         (tile_key(tile(i)),)).fetchone()[0]
+        touched = accessed(1)
+        clock.now += 5
+        assert second.get(tile(1)) is not None and accessed(1) == touched
+        clock.now += first.TOUCH_INTERVAL
+        assert second.get(tile(1)) is not None and accessed(1) == clock.now
+
+
+if __name__ == "__main__":
+    test_key_ignores_case_and_irrelevant_params()
+    test_key_separates_request_types_and_versions()
+    test_lru_eviction_and_ttl()
+    test_processes_sharing_a_cache_share_its_budget()
+    print("Test passed!")
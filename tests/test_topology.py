@@ -0,0 +1,113 @@
+import io
+
+import ezdxf
+import numpy as np
+
+import dxf_export
+import geometry
+import topology
+
+
+def _grid_plots(n, noise=0.0, shift=0.0):
+    """n x n unit squares; each plot digitizes its own copy of the shared boundaries."""
+    rng = np.random.default_rng(0)
+    plots = []
+    for i in range(n):
+        for j in range(n):
+            pts = [(i, j), (i + 1, j), (i + 1, j + 1), (i, j + 1), (i, j)]
+            pts = [(x + shift + rng.uniform(-noise, noise), y + shift + rng.uniform(-noise, noise)) for x, y in pts]
+            pts[-1] = pts[0]
+            wkt = "POLYGON((" + ",".join(f"{x!r} {y!r}" for x, y in pts) + "))"
+            plots.append((f"{i * n + j + 1}", geometry.parse_wkt(wkt)))
+    return plots
+
+
+def _same_cycle(a, b):
+    a, b = [tuple(p) for p in a[:-1]], [tuple(p) for p in b[:-1]]
+    return len(a) == len(b) and any(a[k:] + a[:k] == b for k in range(len(a)))
+
+
+def test_shared_edges_are_stored_once():
+    plots = _grid_plots(3)
+    topo = topology.build_topology(plots)
+    summary = topology.stats(topo, plots)
+    assert summary['vertices'] == 45 and summary['edges'] == 36
+    # A 3x3 grid has 16 distinct corners and 24 distinct unit edges
+    assert summary['unique_vertices'] == 16
+    assert summary['unique_edges'] == 24
+    assert sum(len(arc) - 1 for arc in topo.arcs) == 24
+
+
+def test_rings_rebuild_exactly_from_arcs():
+    plots = _grid_plots(4)
+    topo = topology.build_topology(plots)
+    for (label, geom), (topo_label, rings) in zip(plots, topo.plots):
+        assert label == topo_label
+        assert len(rings) == 1
+        assert _same_cycle(geometry.rings(geom)[0], topology.ring_coords(topo, rings[0]))
+
+
+def test_vertices_within_tolerance_are_snapped():
+    plots = _grid_plots(3, noise=0.001)
+    assert topology.stats(topology.build_topology(plots, tolerance=1e-6), plots)['unique_vertices'] > 16
+    assert topology.stats(topology.build_topology(plots, tolerance=0.1), plots)['unique_vertices'] == 16
+
+
+def test_snapping_merges_across_grid_cells():
+    # Every corner sits on the edge between two 0.1 snapping cells, its
+    # copies scattered to both sides of it
+    plots = _grid_plots(3, noise=0.001, shift=0.05)
+    topo = topology.build_topology(plots, tolerance=0.1)
+    assert topology.stats(topo, plots)['unique_vertices'] == 16
+    assert topology.stats(topo, plots)['unique_edges'] == 24
+    # Points further apart than the tolerance stay apart
+    assert topology.stats(topology.build_topology(plots, tolerance=0.0001), plots)['unique_vertices'] > 16
+
+
+def test_topology_dxf_checks_the_handle_limit():
+    topo = topology.build_topology(_grid_plots(3))
+    # 20 arcs, 16 vertices and 9 plot numbers
+    assert len(topo.arcs) == 20
+    assert "".join(dxf_export.topology_chunks(topo, 1.0, "1F", 0x100, limit=45))
+    # Over the limit, the chunk that would overflow is never yielded
+    emitted = []
+    try:
+        for chunk in dxf_export.topology_chunks(topo, 1.0, "1F", 0x100, limit=30):
+            emitted.append(chunk)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("handle limit not enforced")
+    assert len(emitted) == 1 and emitted[0].count("LWPOLYLINE") == 20
+    assert f"\n{0x100 + 30:X}\n" not in emitted[0]
+
+
+def test_topology_dxf_draws_each_edge_once():
+    plots = _grid_plots(3)
+    topo = topology.build_topology(plots)
+    extent = dxf_export.plots_extent(g for _, g in plots)
+    text = "".join(dxf_export.stream_topology_document(topo, extent))
+    msp = ezdxf.read(io.StringIO(text)).modelspace()
+
+    segments = set()
+    for polyline in msp.query('LWPOLYLINE[layer=="PLOT_BOUNDARIES"]'):
+        pts = [tuple(p) for p in polyline.get_points('xy')]
+        for a, b in zip(pts, pts[1:]):
+            segment = tuple(sorted((a, b)))
+            assert segment not in segments
+            segments.add(segment)
+    assert len(segments) == 24
+    assert len(msp.query('POINT[layer=="COORDINATE_LABELS"]')) == 16
+    labels = sorted(msp.query('TEXT[layer=="PLOT_NUMBERS"]'), key=lambda t: int(t.dxf.text))
+    assert [t.dxf.text for t in labels] == [str(i) for i in range(1, 10)]
+    assert tuple(labels[0].dxf.insert)[:2] == (0.5, 0.5)
+
+
+if __name__ == "__main__":
+    test_shared_edges_are_stored_once()
+    test_rings_rebuild_exactly_from_arcs()
+    test_vertices_within_tolerance_are_snapped()
+    test_snapping_merges_across_grid_cells()
+    test_topology_dxf_checks_the_handle_limit()
+    test_topology_dxf_draws_each_edge_once()
+    print("All tests passed!")
@@ -0,0 +1,72 @@
+import os
+import tempfile
+import threading
+import time
+
+import ttl_cache
+from ttl_cache import TTLCache
+from test_scraper_cache import make_scraper
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_fresh_stale_expired():
+    clock = Clock()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "lists.db")
+        cache = TTLCache(path, ttl=60, stale_ttl=600, clock=clock)
+        assert cache.lookup("level:1:R,") == (None, None)
+
+        cache.set("level:1:R,", [[{'code': '05', 'value': 'Akola'}]])
+        assert cache.lookup("level:1:R,")[1] == ttl_cache.FRESH
+
+        clock.now += 120
+        value, state = cache.lookup("level:1:R,")
+        assert state == ttl_cache.STALE and value[0][0]['value'] == 'Akola'
+
+        clock.now += 1000
+        assert TTLCache(path, ttl=60, stale_ttl=600, clock=clock).lookup("level:1:R,")[1] == ttl_cache.EXPIRED
+
+
+def test_scraper_serves_lists_from_cache():
+    with tempfile.TemporaryDirectory() as tmp:
+        scraper = make_scraper(tmp)
+        calls = []
+        refreshed = threading.Event()
+
+        def fake_request_level(level, codes):
+            calls.append(codes)
+            if len(calls) > 1:
+                refreshed.set()
+            return [[{'code': '05', 'value': f'Akola v{len(calls)}'}]]
+
+        scraper._request_level = fake_request_level
+        assert scraper.fetch_districts()[0]['value'] == 'Akola v1'
+        assert scraper.fetch_districts()[0]['value'] == 'Akola v1'
+        assert len(calls) == 1
+
+        # Stale entries are served immediately and refreshed in the background
+        scraper.list_cache.ttl = -1
+        assert scraper.fetch_districts()[0]['value'] == 'Akola v1'
+        assert refreshed.wait(2)
+        while scraper.inflight.in_flight():
+            time.sleep(0.01)
+        scraper.list_cache.ttl = 3600
+        assert scraper.fetch_districts()[0]['value'] == 'Akola v2'
+
+        # Failed fetches (empty lists) are not cached
+        scraper._request_level = lambda level, codes: []
+        assert scraper.fetch_talukas('05') == []
+        assert scraper.list_cache.lookup("level:2:R,05,") == (None, None)
+
+
+if __name__ == "__main__":
+    test_fresh_stale_expired()
+    test_scraper_serves_lists_from_cache()
+    print("Test passed!")
@@ -0,0 +1,136 @@
+import io
+import json
+import os
+import tempfile
+import zipfile
+
+import ezdxf
+
+import app as app_module
+import dxf_export
+import geometry
+from plot_store import PlotStore
+from test_scraper_cache import FakeResponse, make_scraper, seed_store
+
+GISCODE = "RVM0502270500020047510000"
+
+
+def test_village_dxf_exports_cached_plots_and_fetches_on_request():
+    with tempfile.TemporaryDirectory() as tmp:
+        seed_store(tmp, GISCODE, ["1", "2"])
+        scraper = make_scraper(tmp)
+        posts = []
+
+        def fake_post(url, data, headers=None, timeout=15):
+            if url.endswith("kidelistFromGisCodeMH"):
+                return FakeResponse(["1", "2", "3"])
+            posts.append(data['plotno'])
+            return FakeResponse({'the_geom': "MULTIPOLYGON(((0 0,4 0,4 4,0 0),(1 1,2 1,2 2,1 1)))"})
+
+        scraper._post = fake_post
+        app_module._scraper = scraper
+        try:
+            client = app_module.app.test_client()
+            # By default only cached plots are exported, nothing is requested upstream
+            resp = client.get(f"/api/village/{GISCODE}/dxf?image=0")
+            assert resp.headers['X-Plot-Count'] == "2" and posts == []
+            resp.close()
+            resp = client.get(f"/api/village/{GISCODE}/dxf?image=0&limit=1")
+            assert resp.headers['X-Plot-Count'] == "1"
+            resp.close()
+
+            resp = client.get(f"/api/village/{GISCODE}/dxf?image=0&fetch=1")
+            assert resp.status_code == 200
+            assert resp.headers['X-Plot-Count'] == "3"
+            assert posts == ["3"]
+
+            with zipfile.ZipFile(io.BytesIO(resp.get_data())) as zf:
+                assert zf.namelist() == [f"{GISCODE}.dxf"]
+                doc = ezdxf.read(io.StringIO(zf.read(f"{GISCODE}.dxf").decode('utf-8')))
+        finally:
+            app_module._scraper = None
+
+        for layer in ('PLOT_BOUNDARIES', 'COORDINATE_LABELS', 'PLOT_NUMBERS', 'METADATA'):
+            assert doc.layers.has_entry(layer)
+        msp = doc.modelspace()
+        # Plots 1 and 2 have one ring each, plot 3 an outer ring and a hole
+        assert len(msp.query('LWPOLYLINE[layer=="PLOT_BOUNDARIES"]')) == 4
+        assert sorted(t.dxf.text for t in msp.query('TEXT')) == ["1", "2", "3", "3"]
+        assert len(msp.query('POINT')) == 4 + 4 + 4 + 4
+
+
+def test_streamed_dxf_matches_in_memory_document():
+    plots = [(str(i), geometry.parse_wkt(f"POLYGON(({i} 0,{i + 1} 0,{i + 1} 1,{i} 0))")) for i in range(50)]
+    extent = dxf_export.plots_extent(g for _, g in plots)
+    chunks = dxf_export.stream_zip([("a.dxf", dxf_export.stream_document(iter(plots), extent), zipfile.ZIP_DEFLATED)])
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as zf:
+        streamed = ezdxf.read(io.StringIO(zf.read("a.dxf").decode('utf-8')))
+
+    expected, _ = dxf_export.build_document(plots)
+    describe = lambda doc: [(e.dxftype(), e.dxf.layer) for e in doc.modelspace()]
+    assert describe(streamed) == describe(expected)
+    handles = [e.dxf.handle for e in streamed.modelspace()]
+    assert len(set(handles)) == len(handles)
+    # Reserved handles stay below the seed the header announces
+    assert max(int(h, 16) for h in handles) < int(streamed.header['$HANDSEED'], 16)
+    texts = streamed.modelspace().query('TEXT')
+    assert texts[0].dxf.height == expected.modelspace().query('TEXT')[0].dxf.height
+
+    # An export over the handle limit fails before writing the overflowing entity
+    chunks = dxf_export.entity_chunks(iter(plots), 1.0, "1F", 0x100, limit=10)
+    try:
+        next(chunks)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("handle limit not enforced")
+
+
+def test_taluka_dxf_streams_cached_plots():
+    with tempfile.TemporaryDirectory() as tmp:
+        seed_store(tmp, "RVM0527000000000000000001", ["1", "2"])
+        seed_store(tmp, "RVM0527000000000000000002", ["1"])
+        seed_store(tmp, "RVM0528000000000000000001", ["9"])
+        app_module._scraper = make_scraper(tmp)
+        try:
+            resp = app_module.app.test_client().get("/api/taluka/05/27/dxf")
+            assert resp.is_streamed
+            with zipfile.ZipFile(io.BytesIO(resp.get_data())) as zf:
+                doc = ezdxf.read(io.StringIO(zf.read("RVM0527.dxf").decode('utf-8')))
+        finally:
+            app_module._scraper = None
+        assert sorted(t.dxf.text for t in doc.modelspace().query('TEXT')) == ["1", "1", "2"]
+
+
+def test_village_dxf_topology_adds_outline_sidecar():
+    with tempfile.TemporaryDirectory() as tmp:
+        # Plots 1 and 2 share the edge from (1 0) to (1 1)
+        PlotStore(os.path.join(tmp, "plots.db")).upsert_many([
+            {'giscode': GISCODE, 'plotno': "1", 'the_geom': "POLYGON((0 0,1 0,1 1,0 1,0 0))"},
+            {'giscode': GISCODE, 'plotno': "2", 'the_geom': "POLYGON((1 0,2 0,2 1,1 1,1 0))"},
+        ])
+        scraper = make_scraper(tmp)
+        scraper._post = lambda url, data, headers=None, timeout=15: FakeResponse(["1", "2"])
+        app_module._scraper = scraper
+        try:
+            resp = app_module.app.test_client().get(f"/api/village/{GISCODE}/dxf?image=0&topology=1")
+            assert resp.status_code == 200
+            assert resp.headers['X-Unique-Edges'] == "7"
+            with zipfile.ZipFile(io.BytesIO(resp.get_data())) as zf:
+                assert zf.namelist() == [f"{GISCODE}.dxf", "topology.json"]
+                doc = ezdxf.read(io.StringIO(zf.read(f"{GISCODE}.dxf").decode('utf-8')))
+                outlines = json.loads(zf.read("topology.json"))
+        finally:
+            app_module._scraper = None
+
+        assert [p['plot_no'] for p in outlines['plots']] == ["1", "2"]
+        assert len(doc.modelspace().query('POINT')) == 6
+        assert sorted(t.dxf.text for t in doc.modelspace().query('TEXT')) == ["1", "2"]
+
+
+if __name__ == "__main__":
+    test_village_dxf_exports_cached_plots_and_fetches_on_request()
+    test_streamed_dxf_matches_in_memory_document()
+    test_taluka_dxf_streams_cached_plots()
+    test_village_dxf_topology_adds_outline_sidecar()
+    print("Test passed!")
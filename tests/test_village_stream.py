@@ -0,0 +1,77 @@
+import json
+import tempfile
+import threading
+
+import app as app_module
+from test_scraper_cache import FakeResponse, make_scraper, seed_store
+
+GISCODE = "RVM0502270500020047510000"
+
+
+def _serve(tmp, release):
+    seed_store(tmp, GISCODE, ["1", "2"])
+    scraper = make_scraper(tmp)
+
+    def fake_post(url, data, headers=None, timeout=15):
+        if url.endswith("kidelistFromGisCodeMH"):
+            return FakeResponse(["1", "2", "3", "4"])
+        if data['plotno'] == "3":
+            release.wait(5)
+            return FakeResponse({'the_geom': "POLYGON((3 0,3 1,0 1,3 0))"})
+        return FakeResponse({})
+
+    scraper._post = fake_post
+    app_module._scraper = scraper
+    app_module._projected_cache = None
+
+
+def test_cached_plots_stream_before_fetched_ones():
+    release = threading.Event()
+    with tempfile.TemporaryDirectory() as tmp:
+        _serve(tmp, release)
+        try:
+            resp = app_module.app.test_client().get(
+                f"/api/village/{GISCODE}/stream?from=EPSG:32643&srs=EPSG:32643", buffered=False)
+            assert resp.mimetype == "application/x-ndjson"
+            chunks = iter(resp.response)
+            # Plot 3 is still being fetched, but the cached plots are already here
+            first = [json.loads(line) for line in next(chunks).decode().splitlines()]
+            assert [m['properties']['plot_no'] for m in first] == ["1", "2"]
+            release.set()
+            rest = [json.loads(line) for chunk in chunks for line in chunk.decode().splitlines()]
+            resp.close()
+        finally:
+            release.set()
+            app_module._scraper = None
+            app_module._projected_cache = None
+
+    assert [m['properties']['plot_no'] for m in rest if m['type'] == "Feature"] == ["3"]
+    assert rest[-1]['type'] == "done"
+    assert rest[-1]['plots'] == 3 and rest[-1]['requested'] == 4
+    assert rest[-1]['summary']['not_found'] == 1
+    assert first[0]['geometry']['coordinates'] == [[[1, 0], [1, 1], [0, 1], [1, 0]]]
+
+
+def test_stream_as_server_sent_events():
+    release = threading.Event()
+    release.set()
+    with tempfile.TemporaryDirectory() as tmp:
+        _serve(tmp, release)
+        try:
+            resp = app_module.app.test_client().get(f"/api/village/{GISCODE}/stream?plots=2,3&format=sse")
+            body = resp.get_data(as_text=True)
+        finally:
+            app_module._scraper = None
+            app_module._projected_cache = None
+
+    assert resp.mimetype == "text/event-stream"
+    events = [block.split("\n") for block in body.strip().split("\n\n")]
+    assert [e[0] for e in events] == ["event: feature", "event: feature", "event: done"]
+    plot_nos = [json.loads(e[1][len("data: "):])['properties']['plot_no'] for e in events[:2]]
+    assert plot_nos == ["2", "3"]
+
+
+if __name__ == "__main__":
+    test_cached_plots_stream_before_fetched_ones()
+    test_stream_as_server_sent_events()
+    print("All tests passed!")
@@ -0,0 +1,104 @@
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import app as app_module
+from tile_cache import TileCache
+
+TILE = b"\x89PNG\r\n\x1a\n" + os.urandom(300 * 1024)
+
+
+def start_wms(stats):
+    """Keep-alive HTTP server standing in for the government WMS."""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            stats['connections'] += 1
+
+        def do_GET(self):
+            stats['requests'] += 1
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(TILE)))
+            self.send_header("Set-Cookie", "upstream=1")
+            self.end_headers()
+            self.wfile.write(TILE)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_wms_proxy_streams_over_pooled_connection():
+    stats = {'connections': 0, 'requests': 0}
+    server = start_wms(stats)
+    original_url = app_module.WMS_URL
+    app_module.WMS_URL = f"http://127.0.0.1:{server.server_address[1]}/WMS"
+    tmp = tempfile.TemporaryDirectory()
+    app_module._tile_cache = TileCache(os.path.join(tmp.name, "tiles.db"))
+    try:
+        client = app_module.app.test_client()
+        for i in range(5):
+            resp = client.get(f"/api/wms?LAYERS=VILLAGE_MAP&BBOX={i},0,{i + 1},1")
+            assert resp.status_code == 200
+            assert resp.is_streamed
+            assert resp.headers['Content-Type'] == "image/png"
+            assert resp.headers['Content-Length'] == str(len(TILE))
+            # Only content headers are relayed
+            assert 'Set-Cookie' not in resp.headers
+            assert resp.get_data() == TILE
+        assert stats['requests'] == 5
+        # Every tile after the first reuses the pooled connection
+        assert stats['connections'] == 1
+    finally:
+        app_module.WMS_URL = original_url
+        app_module._tile_cache = None
+        server.shutdown()
+        tmp.cleanup()
+
+
+def test_repeat_tiles_are_served_from_cache():
+    stats = {'connections': 0, 'requests': 0}
+    server = start_wms(stats)
+    original_url = app_module.WMS_URL
+    app_module.WMS_URL = f"http://127.0.0.1:{server.server_address[1]}/WMS"
+    tmp = tempfile.TemporaryDirectory()
+    app_module._tile_cache = TileCache(os.path.join(tmp.name, "tiles.db"))
+    try:
+        client = app_module.app.test_client()
+        first = client.get("/api/wms?layers=VILLAGE_MAP&bbox=0,0,1,1&width=256&height=256&_=1")
+        assert first.headers['X-Tile-Cache'] == "MISS" and first.get_data() == TILE
+        # Same tile with different case, float noise and cache buster
+        again = client.get("/api/wms?LAYERS=VILLAGE_MAP&BBOX=0.0000001,0,1,1&WIDTH=256&HEIGHT=256&_=2")
+        assert again.headers['X-Tile-Cache'] == "HIT"
+        assert again.headers['Content-Type'] == "image/png"
+        assert again.get_data() == TILE
+        assert stats['requests'] == 1
+
+        tile_stats = client.get("/api/tiles/stats").get_json()
+        assert (tile_stats['hits'], tile_stats['misses'], tile_stats['tiles']) == (1, 1, 1)
+
+        # A legend for the same layer and size is neither served from nor stored in the tile cache
+        for _ in range(2):
+            legend = client.get("/api/wms?REQUEST=GetLegendGraphic&LAYERS=VILLAGE_MAP&BBOX=0,0,1,1"
+                                "&WIDTH=256&HEIGHT=256")
+            assert legend.headers['X-Tile-Cache'] == "MISS" and legend.get_data() == TILE
+        assert stats['requests'] == 3
+        assert client.get("/api/tiles/stats").get_json()['tiles'] == 1
+    finally:
+        app_module.WMS_URL = original_url
+        app_module._tile_cache = None
+        server.shutdown()
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    test_wms_proxy_streams_over_pooled_connection()
+    test_repeat_tiles_are_served_from_cache()
+    print("Test passed!")
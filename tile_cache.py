@@ -0,0 +1,181 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_TILES_FILE = "cache/tiles.db"
+
+# WMS parameters that determine the image; anything else (cache busters,
+# SERVICE, TRANSPARENT) is ignored in the key. REQUEST keeps GetMap images
+# apart from GetLegendGraphic/GetFeatureInfo answers, and VERSION and CRS
+# keep 1.3.0 requests (whose EPSG:4326 BBOX axis order differs) apart from
+# 1.1.1 ones.
+KEY_PARAMS = ('REQUEST', 'VERSION', 'LAYERS', 'STYLES', 'SRS', 'CRS', 'BBOX', 'WIDTH', 'HEIGHT', 'GIS_CODE',
+              'FORMAT')
+
+
+def normalize_params(params):
+    """
+    Returns the canonical form of a WMS query: upper-cased names, only
+    KEY_PARAMS, REQUEST defaulting to GetMap and BBOX numbers rounded so
+    float noise from the client does not split the cache.
+    """
+    upper = {str(k).upper(): str(v) for k, v in params.items()}
+    upper.setdefault('REQUEST', 'GetMap')
+    normalized = {}
+    for name in KEY_PARAMS:
+        value = upper.get(name)
+        if value is None:
+            continue
+        if name == 'BBOX':
+            try:
+                value = ",".join(f"{float(v):.6f}" for v in value.split(','))
+            except ValueError:
+                pass
+        elif name in ('REQUEST', 'SRS', 'CRS', 'FORMAT'):
+            value = value.lower()
+        normalized[name] = value
+    normalized.setdefault('FORMAT', 'image/png')
+    return normalized
+
+
+def tile_key(params):
+    """Content address of a GetMap request: sha256 of its normalized parameters."""
+    canonical = "&".join(f"{k}={v}" for k, v in sorted(normalize_params(params).items()))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class TileCache:
+    """
+    Size-bounded on-disk cache of WMS GetMap images.
+
+    Tiles are keyed by tile_key() (or by the given key function); once the
+    stored bytes exceed max_bytes the least recently used tiles are evicted.
+    With a ttl, tiles older than ttl seconds count as misses and are replaced
+    on the next fetch.
+
+    Several processes may share the file, so the stored size is summed in
+    the database on every write rather than tracked in memory. A hit only
+    refreshes a tile's access time once it is TOUCH_INTERVAL seconds old,
+    so most hits take no write lock.
+    """
+
+    TOUCH_INTERVAL = 60.0
+
+    def __init__(self, path=DEFAULT_TILES_FILE, max_bytes=512 * 1024 * 1024, ttl=None, clock=time.time,
+                 key=tile_key):
+        self.path = path
+        self.key = key
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        cache_dir = os.path.dirname(path)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir, exist_ok=True)
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        with self._conn() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS tiles (
+                    key TEXT PRIMARY KEY,
+                    content_type TEXT,
+                    content_encoding TEXT,
+                    data BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_tiles_accessed ON tiles (accessed_at)")
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, params):
+        """Returns (data, content_type, content_encoding) for a cached tile, or None."""
+        key = self.key(params)
+        now = self.clock()
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT data, content_type, content_encoding, fetched_at, accessed_at FROM tiles WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or (self.ttl is not None and now - row[3] >= self.ttl):
+            with self._lock:
+                self.misses += 1
+            return None
+        if now - row[4] >= self.TOUCH_INTERVAL:
+            with conn:
+                conn.execute("UPDATE tiles SET accessed_at = ? WHERE key = ?", (now, key))
+        with self._lock:
+            self.hits += 1
+        return bytes(row[0]), row[1], row[2]
+
+    def put(self, params, data, content_type=None, content_encoding=None):
+        """Stores a tile, evicting least recently used tiles if over max_bytes."""
+        if len(data) > self.max_bytes:
+            return
+        key = self.key(params)
+        now = self.clock()
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO tiles "
+                "(key, content_type, content_encoding, data, size, fetched_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, content_type, content_encoding, sqlite3.Binary(data), len(data), now, now),
+            )
+            # Summed inside the write transaction, so it counts every process's tiles
+            total = self._stored_bytes(conn)
+            if total > self.max_bytes:
+                self._evict(conn, total)
+
+    @staticmethod
+    def _stored_bytes(conn):
+        # size is length(data), kept in its own column so the sum reads no blobs
+        return conn.execute("SELECT COALESCE(SUM(size), 0) FROM tiles").fetchone()[0]
+
+    def _evict(self, conn, total):
+        # Oldest access first, until the cache is back under 90% of its budget
+        target = self.max_bytes * 0.9
+        evicted = 0
+        for key, size in conn.execute("SELECT key, size FROM tiles ORDER BY accessed_at").fetchall():
+            if total <= target:
+                break
+            conn.execute("DELETE FROM tiles WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        with self._lock:
+            self.evictions += evicted
+
+    def clear(self):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM tiles")
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM tiles").fetchone()[0]
+
+    def stats(self):
+        stored = self._stored_bytes(self._conn())
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'tiles': len(self),
+                'bytes': stored,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+                'evictions': self.evictions,
+            }
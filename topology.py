@@ -0,0 +1,194 @@
+from collections import namedtuple
+
+import numpy as np
+
+import geometry
+
+DEFAULT_TOLERANCE = 0.01  # map units; 1 cm for the UTM coordinates the cache holds
+
+# A village's plots as a shared vertex/edge graph:
+#   vertices  (V, 2) float64 snapped vertex coordinates
+#   edges     (E, 2) int64 unique undirected edges, lower vertex id first
+#   arcs      list of int64 vertex id arrays; every edge lies on exactly one
+#             arc, and arcs only meet at their end vertices
+#   plots     list of (label, rings); each ring is a list of arc references,
+#             r >= 0 for arcs[r] as stored and ~r for it reversed
+Topology = namedtuple('Topology', ['vertices', 'edges', 'arcs', 'plots'])
+
+
+def _snap(coords, tolerance):
+    """
+    Returns (vertices, ids): one vertex per cluster of coordinates within
+    about tolerance of each other, and each input coordinate's vertex id.
+    """
+    cells = np.round(coords / tolerance).astype(np.int64)
+    _, first, cell_ids = np.unique(cells, axis=0, return_index=True, return_inverse=True)
+    # A coordinate near a cell edge can have its match just across it, so
+    # each cell also looks for a vertex within tolerance in the 8 around it.
+    # Cells go in order of appearance: a vertex is the first coordinate on it.
+    limit = tolerance * tolerance
+    grid = {}
+    vertices = []
+    order = np.argsort(first)
+    cell_vertex = np.empty(len(first), dtype=np.int64)
+    for cell, (x, y), (cx, cy) in zip(order.tolist(), coords[first[order]].tolist(), cells[first[order]].tolist()):
+        vertex = None
+        for neighbour in ((cx + dx, cy + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)):
+            v = grid.get(neighbour)
+            if v is not None and (vertices[v][0] - x) ** 2 + (vertices[v][1] - y) ** 2 <= limit:
+                vertex = v
+                break
+        if vertex is None:
+            vertex = len(vertices)
+            vertices.append((x, y))
+        grid[cx, cy] = vertex
+        cell_vertex[cell] = vertex
+    return np.array(vertices, dtype=np.float64).reshape(-1, 2), cell_vertex[cell_ids.reshape(-1)]
+
+
+def _ring_vertex_ids(ids):
+    """Vertex id cycle of one ring: snapped duplicates and the closing vertex removed."""
+    if len(ids) == 0:
+        return ids
+    keep = np.ones(len(ids), dtype=bool)
+    keep[1:] = ids[1:] != ids[:-1]
+    ring = ids[keep]
+    if len(ring) > 1 and ring[0] == ring[-1]:
+        ring = ring[:-1]
+    return ring
+
+
+def _build_arcs(edges, n_vertices):
+    """Chains unique edges into arcs that break at every vertex not of degree 2."""
+    neighbours = [[] for _ in range(n_vertices)]
+    for e, (a, b) in enumerate(edges.tolist()):
+        neighbours[a].append((b, e))
+        neighbours[b].append((a, e))
+
+    used = np.zeros(len(edges), dtype=bool)
+    arcs = []
+
+    def walk(start, first_next, first_edge):
+        path = [start, first_next]
+        used[first_edge] = True
+        current = first_next
+        while len(neighbours[current]) == 2 and current != start:
+            step = next(((n, e) for n, e in neighbours[current] if not used[e]), None)
+            if step is None:
+                break
+            used[step[1]] = True
+            path.append(step[0])
+            current = step[0]
+        return np.array(path, dtype=np.int64)
+
+    for v in range(n_vertices):
+        if len(neighbours[v]) != 2:
+            for nxt, edge in neighbours[v]:
+                if not used[edge]:
+                    arcs.append(walk(v, nxt, edge))
+    # What is left are closed loops of degree-2 vertices (e.g. an isolated plot)
+    for e in np.flatnonzero(~used):
+        if not used[e]:
+            a, b = edges[e].tolist()
+            arcs.append(walk(a, b, e))
+    return arcs
+
+
+def build_topology(plots, tolerance=DEFAULT_TOLERANCE):
+    """
+    Builds the shared vertex/edge graph of [(label, Geometry)]. Vertices
+    closer than about `tolerance` are snapped together (grid snapping that
+    also checks neighbouring cells), so
+    boundaries digitized twice by neighbouring plots collapse into one
+    edge. Rings that degenerate to fewer than three vertices are dropped.
+    """
+    plots = [(label, geom) for label, geom in plots if len(geom.coords)]
+    if not plots:
+        return Topology(np.empty((0, 2)), np.empty((0, 2), dtype=np.int64), [], [])
+
+    all_coords = np.concatenate([geom.coords for _, geom in plots])
+    vertices, ids = _snap(all_coords, tolerance)
+
+    # Vertex id cycles per ring, per plot
+    plot_rings = []
+    offset = 0
+    for label, geom in plots:
+        rings = []
+        for ring in geometry.rings(geom):
+            cycle = _ring_vertex_ids(ids[offset:offset + len(ring)])
+            offset += len(ring)
+            if len(cycle) >= 3:
+                rings.append(cycle)
+        plot_rings.append((label, rings))
+
+    ring_edges = [np.stack([c, np.roll(c, -1)], axis=1) for _, rings in plot_rings for c in rings]
+    if not ring_edges:
+        return Topology(vertices, np.empty((0, 2), dtype=np.int64), [], [(label, []) for label, _ in plot_rings])
+    edges = np.unique(np.sort(np.concatenate(ring_edges), axis=1), axis=0)
+    arcs = _build_arcs(edges, len(vertices))
+
+    # Which arc (and in which direction) every directed edge belongs to
+    edge_arc = {}
+    for index, arc in enumerate(arcs):
+        for a, b in zip(arc[:-1].tolist(), arc[1:].tolist()):
+            edge_arc[(a, b)] = index
+            edge_arc[(b, a)] = ~index
+    arc_ends = {int(arc[0]) for arc in arcs} | {int(arc[-1]) for arc in arcs}
+
+    topo_plots = []
+    for label, rings in plot_rings:
+        arc_rings = []
+        for cycle in rings:
+            cycle = cycle.tolist()
+            # Start at an arc end so the ring splits into whole arcs
+            start = next((i for i, v in enumerate(cycle) if v in arc_ends), 0)
+            cycle = cycle[start:] + cycle[:start]
+            refs = []
+            for a, b in zip(cycle, cycle[1:] + cycle[:1]):
+                ref = edge_arc[(a, b)]
+                if not refs or refs[-1] != ref:
+                    refs.append(ref)
+            arc_rings.append(refs)
+        topo_plots.append((label, arc_rings))
+
+    return Topology(vertices, edges, arcs, topo_plots)
+
+
+def arc_coords(topo, ref):
+    """Coordinates of an arc reference, reversed for ~r."""
+    if ref >= 0:
+        return topo.vertices[topo.arcs[ref]]
+    return topo.vertices[topo.arcs[~ref][::-1]]
+
+
+def ring_coords(topo, arc_refs):
+    """Rebuilds a closed ring's (n, 2) coordinates from its arc references."""
+    parts = []
+    for ref in arc_refs:
+        coords = arc_coords(topo, ref)
+        parts.append(coords if not parts else coords[1:])
+    return np.concatenate(parts) if parts else np.empty((0, 2))
+
+
+def stats(topo, plots):
+    """Vertex and edge counts before and after deduplication."""
+    raw_vertices = sum(len(geom.coords) for _, geom in plots)
+    raw_edges = sum(len(ring) - 1 for _, geom in plots for ring in geometry.rings(geom))
+    return {
+        'vertices': raw_vertices,
+        'unique_vertices': len(topo.vertices),
+        'edges': raw_edges,
+        'unique_edges': len(topo.edges),
+        'arcs': len(topo.arcs),
+    }
+
+
+def to_json(topo):
+    """
+    TopoJSON-like dict of the graph: shared arcs as coordinate lists and
+    each plot's rings as arc references (~r meaning arcs[r] reversed).
+    """
+    return {
+        'arcs': [topo.vertices[arc].tolist() for arc in topo.arcs],
+        'plots': [{'plot_no': label, 'rings': rings} for label, rings in topo.plots],
+    }
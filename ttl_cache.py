@@ -0,0 +1,81 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_LISTS_FILE = "cache/lists.db"
+
+# Entry states returned by TTLCache.lookup
+FRESH = 'fresh'
+STALE = 'stale'
+EXPIRED = 'expired'
+
+
+class TTLCache:
+    """
+    Persistent JSON key/value cache with a TTL and a stale-while-revalidate window.
+
+    Entries younger than `ttl` are fresh. Entries between `ttl` and
+    `stale_ttl` are stale: callers may serve them immediately while a
+    refresh runs in the background. Older entries are expired and should be
+    refetched, but are still returned so they can serve as a fallback when
+    the upstream is down.
+    """
+
+    def __init__(self, path=DEFAULT_LISTS_FILE, ttl=7 * 86400, stale_ttl=90 * 86400, clock=time.time):
+        self.path = path
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.clock = clock
+        cache_dir = os.path.dirname(path)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir, exist_ok=True)
+
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    fetched_at REAL NOT NULL
+                )
+            """)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def lookup(self, key):
+        """Returns (value, state) where state is FRESH, STALE or EXPIRED; (None, None) on a miss."""
+        row = self._conn().execute(
+            "SELECT value, fetched_at FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None, None
+        age = self.clock() - row[1]
+        if age < self.ttl:
+            state = FRESH
+        elif age < self.stale_ttl:
+            state = STALE
+        else:
+            state = EXPIRED
+        return json.loads(row[0]), state
+
+    def set(self, key, value):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, fetched_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), self.clock()),
+            )
+
+    def delete(self, key):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM entries").fetchone()[0]